@@ -0,0 +1,170 @@
+
+"""Controle de admissão: limita quantas requisições pesadas rodam ao mesmo tempo.
+
+Cada rota pesada pertence a uma classe (ROUTE_CLASSES); o resto é interativo
+(login, dashboard, /new, /record/<id>...) e nunca espera aqui. Como exportações
+e backups só ocupam no máximo ADMIT_<CLASSE>_MAX threads somando todos os
+workers do gunicorn, as demais threads ficam livres para os técnicos.
+
+- export: XLSX/CSV dos relatórios, CSV/Parquet/Arrow gerais e ZIP de fotos.
+- backup: criar, enviar, buscar e restaurar backups.
+
+As vagas são locks de arquivo em DATA_DIR/locks/admit-<classe>-<n>.lock (como
+parallel_zip.export_slot), liberados quando a resposta termina de ser enviada.
+Sem vaga, a requisição espera até ADMIT_<CLASSE>_WAIT s (no máximo ADMIT_QUEUE
+esperando por worker); depois disso recebe 503 com Retry-After.
+"""
+from flask import g, request, Response
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: limite só dentro do processo
+    fcntl = None
+
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "1") == "1"
+CLASS_LIMITS = {
+    "export": (int(os.environ.get("ADMIT_EXPORT_MAX", "2")), float(os.environ.get("ADMIT_EXPORT_WAIT", "10"))),
+    "backup": (int(os.environ.get("ADMIT_BACKUP_MAX", "1")), float(os.environ.get("ADMIT_BACKUP_WAIT", "5"))),
+}
+QUEUE_PER_WORKER = int(os.environ.get("ADMIT_QUEUE", "2"))
+RETRY_AFTER = int(os.environ.get("ADMIT_RETRY_AFTER", "30"))
+
+ROUTE_CLASSES = {
+    "admin_reports_xlsx": "export",
+    "admin_reports_csv": "export",
+    "admin_reports_users_csv": "export",
+    "admin_export_csv": "export",
+    "admin_export_columnar": "export",
+    "admin_photos_zip": "export",
+    "admin_backup": "backup",
+    "backup_bp.create_backup": "backup",
+    "backup_bp.create_full": "backup",
+    "backup_bp.upload": "backup",
+    "backup_bp.fetch": "backup",
+    "backup_bp.restore": "backup",
+}
+
+BUSY_MESSAGES = {
+    "export": "Muitas exportações em andamento; tente novamente em instantes.",
+    "backup": "Outro backup/restauração está em andamento; tente novamente em instantes.",
+}
+
+
+class _Slot:
+    """Vaga ocupada: flock num arquivo (ou um semáforo local sem fcntl)."""
+
+    def __init__(self, f=None, sem=None):
+        self.f = f
+        self.sem = sem
+        self.released = False
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        if self.f is not None:
+            fcntl.flock(self.f, fcntl.LOCK_UN)
+            self.f.close()
+        else:
+            self.sem.release()
+
+
+class Admission:
+    def __init__(self):
+        self.lock_dir = None
+        self.registry = None
+        self.waiting = {cls: 0 for cls in CLASS_LIMITS}
+        self.local = {cls: threading.BoundedSemaphore(max(1, n)) for cls, (n, _) in CLASS_LIMITS.items()}
+        self.mutex = threading.Lock()
+
+    def _try(self, cls):
+        limit = max(1, CLASS_LIMITS[cls][0])
+        if fcntl is None or self.lock_dir is None:
+            return _Slot(sem=self.local[cls]) if self.local[cls].acquire(blocking=False) else None
+        os.makedirs(self.lock_dir, exist_ok=True)
+        for i in range(limit):
+            f = open(os.path.join(self.lock_dir, f"admit-{cls}-{i}.lock"), "a")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                continue
+            return _Slot(f=f)
+        return None
+
+    def acquire(self, cls):
+        """Vaga na classe, esperando até o limite; None se não houver."""
+        slot = self._try(cls)
+        if slot is not None:
+            self._count(cls, "admitted")
+            return slot
+        with self.mutex:
+            if self.waiting[cls] >= QUEUE_PER_WORKER:
+                self._count(cls, "rejected")
+                return None
+            self.waiting[cls] += 1
+        try:
+            deadline = time.monotonic() + CLASS_LIMITS[cls][1]
+            while time.monotonic() < deadline:
+                time.sleep(0.25)
+                slot = self._try(cls)
+                if slot is not None:
+                    self._count(cls, "queued")
+                    return slot
+        finally:
+            with self.mutex:
+                self.waiting[cls] -= 1
+        self._count(cls, "rejected")
+        return None
+
+    def _count(self, cls, result):
+        if self.registry is not None:
+            self.registry.incr("splice_admission_total", cls=cls, result=result)
+
+    def init_app(self, app, data_dir):
+        self.lock_dir = os.path.join(data_dir, "locks")
+        self.registry = app.extensions.get("metrics")
+        app.extensions["admission"] = self
+        if not ADMISSION_ENABLED:
+            return
+
+        @app.before_request
+        def _admit():
+            cls = ROUTE_CLASSES.get(request.endpoint)
+            if cls is None:
+                return None
+            slot = self.acquire(cls)
+            if slot is None:
+                return Response(BUSY_MESSAGES[cls], status=503, mimetype="text/plain",
+                                headers={"Retry-After": str(RETRY_AFTER)})
+            g._admission_slot = slot
+            return None
+
+        @app.after_request
+        def _release_on_close(response):
+            slot = g.pop("_admission_slot", None)
+            if slot is not None:
+                if response.direct_passthrough:
+                    # send_file: o servidor não chama os callbacks de fechamento
+                    slot.release()
+                else:
+                    # Respostas em streaming (ZIP) seguram a vaga até o fim do envio
+                    response.call_on_close(slot.release)
+            return response
+
+        @app.teardown_request
+        def _release_on_error(exc):
+            slot = g.pop("_admission_slot", None)
+            if slot is not None:
+                slot.release()
+
+
+admission = Admission()
+
+
+def init_app(app, data_dir):
+    admission.init_app(app, data_dir)
+    return admission
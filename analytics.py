@@ -0,0 +1,211 @@
+
+"""Produtividade por técnico, calculada em NumPy sobre os registros do filtro.
+
+As colunas necessárias de `records` (usuário, dispositivo, dia, fusões) são
+lidas uma vez, em lotes de ANALYTICS_BATCH_ROWS do cursor, para arrays NumPy;
+todas as estatísticas saem de operações vetorizadas sobre esses arrays
+(bincount/cumsum/percentile), sem laço por registro:
+
+- por técnico: dias ativos, total, média/p50/p90 de fusões por dia, médias
+  móveis de 7 e 30 dias (no último dia do período) e variação da última semana
+  sobre a anterior;
+- equipe: série diária com médias móveis de 7/30 dias e totais por semana com
+  a variação semana a semana;
+- fusões por dispositivo: média, percentis e histograma.
+
+Resultados ficam em memória (por worker, ANALYTICS_CACHE_SIZE entradas) com
+chave = filtro + geração dos dados (último evento de live_events e maior id de
+records), então qualquer escrita invalida o cache sem varrer a tabela.
+
+Requer `numpy` (requirements-analytics.txt).
+"""
+from collections import OrderedDict
+import datetime
+import os
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # análise indisponível
+    np = None
+
+BATCH_ROWS = int(os.environ.get("ANALYTICS_BATCH_ROWS", "50000"))
+CACHE_SIZE = int(os.environ.get("ANALYTICS_CACHE_SIZE", "32"))
+HISTOGRAM_BINS = 10
+_EPOCH = datetime.date(1970, 1, 1)
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def available():
+    return np is not None
+
+
+def data_generation(db):
+    """Muda a cada escrita em records (todas publicam em live_events)."""
+    row = db.execute(
+        "SELECT (SELECT COALESCE(MAX(id), 0) FROM live_events), (SELECT COALESCE(MAX(id), 0) FROM records)"
+    ).fetchone()
+    return tuple(row)
+
+
+def cached(key, generation, compute):
+    """Memoiza `compute()` por (filtro, geração); gerações antigas saem pelo LRU."""
+    k = (key, generation)
+    with _cache_lock:
+        if k in _cache:
+            _cache.move_to_end(k)
+            return _cache[k]
+    result = compute()
+    with _cache_lock:
+        _cache[k] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def load(db, where_sql, params):
+    """Arrays (user_id, device_id, day, fusions); `day` em dias desde 1970-01-01."""
+    cur = db.execute(
+        f"SELECT r.user_id, COALESCE(r.device_id, -1), "
+        f"CAST(julianday(date(r.created_at)) - 2440587.5 AS INTEGER), COALESCE(r.fusion_count, 0) "
+        f"FROM records r {where_sql}",
+        tuple(params),
+    )
+    chunks = []
+    while True:
+        rows = cur.fetchmany(BATCH_ROWS)
+        if not rows:
+            break
+        chunks.append(np.array(rows, dtype=np.int64))
+    data = np.concatenate(chunks) if chunks else np.empty((0, 4), dtype=np.int64)
+    return data[:, 0], data[:, 1], data[:, 2], data[:, 3]
+
+
+def _iso(day):
+    return (_EPOCH + datetime.timedelta(days=int(day))).isoformat()
+
+
+def _moving_average(series, window):
+    """Média móvel simples no último eixo (janela parcial no início), via soma acumulada."""
+    pad = np.zeros(series.shape[:-1] + (1,))
+    csum = np.concatenate((pad, np.cumsum(series, axis=-1)), axis=-1)
+    idx = np.arange(1, series.shape[-1] + 1)
+    lo = np.maximum(idx - window, 0)
+    return (csum[..., idx] - csum[..., lo]) / (idx - lo)
+
+
+def _round(values, ndigits=2):
+    return [round(float(v), ndigits) for v in values]
+
+
+def compute(db, where_sql, params, usernames):
+    user, device, day, fusions = load(db, where_sql, params)
+    if not len(day):
+        return {"records": 0, "users": [], "daily": None, "weekly": None, "devices": None}
+    first, last = int(day.min()), int(day.max())
+    ndays = last - first + 1
+    offset = day - first
+
+    # Equipe: série diária densa (dias sem registro = 0) e médias móveis
+    daily = np.bincount(offset, weights=fusions, minlength=ndays)
+    team = {
+        "labels": [_iso(d) for d in range(first, last + 1)],
+        "sums": daily.astype(np.int64).tolist(),
+        "ma7": _round(_moving_average(daily, 7)),
+        "ma30": _round(_moving_average(daily, 30)),
+    }
+
+    # Semanas começando na segunda-feira (1970-01-01 foi quinta: +3)
+    week = (day + 3) // 7
+    wfirst = int(week.min())
+    weekly = np.bincount(week - wfirst, weights=fusions)
+    delta = np.diff(weekly, prepend=np.nan)
+    prev = np.concatenate(([np.nan], weekly[:-1]))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = np.where(prev > 0, delta / prev * 100, np.nan)
+    weeks = {
+        "labels": [_iso((w + wfirst) * 7 - 3) for w in range(len(weekly))],
+        "sums": weekly.astype(np.int64).tolist(),
+        "delta": [None if np.isnan(v) else int(v) for v in delta],
+        "pct": [None if np.isnan(v) else round(float(v), 1) for v in pct],
+    }
+
+    # Por técnico: matriz usuário x dia (técnicos são poucos; dias <= período)
+    uids, uidx = np.unique(user, return_inverse=True)
+    flat = uidx * ndays + offset
+    per_day = np.bincount(flat, weights=fusions, minlength=len(uids) * ndays).reshape(len(uids), ndays)
+    # Dia ativo = dia com algum registro (mesmo que com 0 fusões)
+    active = np.bincount(flat, minlength=len(uids) * ndays).reshape(len(uids), ndays) > 0
+    ma7 = _moving_average(per_day, 7)[:, -1]
+    ma30 = _moving_average(per_day, 30)[:, -1]
+    last7 = per_day[:, -7:].sum(axis=1)
+    prev7 = per_day[:, -14:-7].sum(axis=1) if ndays > 7 else np.zeros(len(uids))
+    # Dispositivos distintos por técnico: pares (técnico, dispositivo) únicos
+    span = int(device.max()) + 1
+    pairs = np.unique((uidx * span + device)[device >= 0])
+    devices_per_user = np.bincount(pairs // span, minlength=len(uids))
+    users = []
+    for i, uid in enumerate(uids):
+        days_active = per_day[i][active[i]]
+        users.append({
+            "user_id": int(uid),
+            "username": usernames.get(int(uid), str(uid)),
+            "days_active": int(active[i].sum()),
+            "total": int(per_day[i].sum()),
+            "mean_per_day": round(float(days_active.mean()), 2),
+            "p50_per_day": round(float(np.percentile(days_active, 50)), 2),
+            "p90_per_day": round(float(np.percentile(days_active, 90)), 2),
+            "ma7": round(float(ma7[i]), 2),
+            "ma30": round(float(ma30[i]), 2),
+            "last_week": int(last7[i]),
+            "previous_week": int(prev7[i]),
+            "wow_delta": int(last7[i] - prev7[i]),
+            "devices": int(devices_per_user[i]),
+            "fusions_per_device": round(float(per_day[i].sum() / max(devices_per_user[i], 1)), 2),
+        })
+    users.sort(key=lambda u: u["total"], reverse=True)
+
+    # Fusões por dispositivo (registros sem dispositivo ficam de fora)
+    has_device = device >= 0
+    _, didx = np.unique(device[has_device], return_inverse=True)
+    per_device = np.bincount(didx, weights=fusions[has_device]) if has_device.any() else np.zeros(0)
+    dist = None
+    if len(per_device):
+        counts, edges = np.histogram(per_device, bins=HISTOGRAM_BINS)
+        dist = {
+            "count": int(len(per_device)),
+            "mean": round(float(per_device.mean()), 2),
+            "p50": round(float(np.percentile(per_device, 50)), 2),
+            "p90": round(float(np.percentile(per_device, 90)), 2),
+            "max": int(per_device.max()),
+            "histogram": {"edges": _round(edges), "counts": counts.tolist()},
+        }
+
+    return {
+        "records": int(len(day)),
+        "start": _iso(first),
+        "end": _iso(last),
+        "users": users,
+        "daily": team,
+        "weekly": weeks,
+        "devices": dist,
+    }
+
+
+def write_sheet(wb, result):
+    """Aba "Produtividade" no XLSX dos relatórios."""
+    ws = wb.create_sheet("Produtividade")
+    columns = ["user_id", "username", "days_active", "total", "mean_per_day", "p50_per_day", "p90_per_day",
+               "ma7", "ma30", "last_week", "previous_week", "wow_delta", "devices", "fusions_per_device"]
+    ws.append(columns)
+    for u in result["users"]:
+        ws.append([u[c] for c in columns])
+    if result["weekly"]:
+        ws.append([])
+        ws.append(["semana", "fusoes", "variacao", "variacao_%"])
+        w = result["weekly"]
+        for row in zip(w["labels"], w["sums"], w["delta"], w["pct"]):
+            ws.append(list(row))
+    return ws
@@ -1,10 +1,14 @@
 from flask import (
     Flask, render_template, request, redirect, url_for,
-    flash, session, send_from_directory, abort, Response
+    flash, session, send_from_directory, send_file, abort, Response
 )
-from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-import os, sqlite3, csv, zipfile
+from werkzeug.middleware.proxy_fix import ProxyFix
+from passwords import (
+    hash_password, verify_password, login_throttled,
+    record_login_failure, clear_login_failures,
+)
+import os, sqlite3, csv, time
 from contextlib import closing
 from io import StringIO, BytesIO
 
@@ -20,6 +24,11 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(WORKMAP_FOLDER, exist_ok=True)
 
 app = Flask(__name__)
+# Atrás do proxy do Render, remote_addr é o do proxy: usa o X-Forwarded-For
+# (quantidade de proxies confiáveis em PROXY_FIX_X_FOR; 0 desliga)
+_proxy_x_for = int(os.environ.get("PROXY_FIX_X_FOR", "1"))
+if _proxy_x_for > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=_proxy_x_for)
 from backup_bp import backup_bp
 app.register_blueprint(backup_bp)
 UPLOAD_FOLDER = UPLOAD_FOLDER
@@ -29,12 +38,55 @@ app.config["MAX_CONTENT_LENGTH"] = max_len_mb * 1024 * 1024
 
 DB_PATH = os.path.join(BASE_DIR, "app.db")
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
+import metrics
+import sqlprofile
+import parallel_zip
+import compression
+import devices
+import progress
+import live
+import coalesce
+import admission
+import columnar
+import analytics
+import archive
+import replica
+from health import HealthChecker
+metrics.init_app(app, DATA_DIR)
+sqlprofile.init_app(app, DATA_DIR)
+parallel_zip.init_app(app, DATA_DIR)
+compression.init_app(app, DATA_DIR)
+coalesce.init_app(app, DATA_DIR)
+admission.init_app(app, DATA_DIR)
+
+def connect_db(target, **kwargs):
+    # O profiler de SQL também depende das conexões instrumentadas
+    if metrics.METRICS_ENABLED or sqlprofile.profiler.enabled:
+        conn = sqlite3.connect(target, factory=metrics.InstrumentedConnection, **kwargs)
+    else:
+        conn = sqlite3.connect(target, **kwargs)
     conn.row_factory = sqlite3.Row
     return conn
 
 
+def get_db():
+    return connect_db(DB_PATH)
+
+
+def get_report_db(start=None, fresh=False):
+    """Conexão de leitura para relatórios/exportações.
+
+    Lê da réplica somente leitura (replica.py) quando ela existe e está recente;
+    `fresh=True` força o app.db. Inclui o arquivo morto (archive.py) quando o
+    período começa antes do registro arquivado mais novo.
+    """
+    conn = None if fresh else replica.replica.connect()
+    if conn is None:
+        conn = get_db()
+    archive.attach_for_reports(conn, start)
+    return conn
+
+
 def user_has_access_to_map(user_id, work_map_id):
     with closing(get_db()) as db:
         row = db.execute(
@@ -89,7 +141,7 @@ def init_db():
         if not row:
             cur.execute(
                 "INSERT INTO users (username, password_hash, is_admin) VALUES (?, ?, 1)",
-                ("admin", generate_password_hash("admin123"))
+                ("admin", hash_password("admin123"))
             )
             db.commit()
 
@@ -102,7 +154,7 @@ def init_db():
         if not row:
             cur.execute(
                 "INSERT INTO users (username, password_hash, is_admin) VALUES (?, ?, 1)",
-                ("admin", generate_password_hash("admin123"))
+                ("admin", hash_password("admin123"))
             )
             db.commit()
 
@@ -220,17 +272,117 @@ def ensure_schema():
                 work_map_id INTEGER NOT NULL,
                 UNIQUE(user_id, work_map_id)
             )""")
+            # --- Idempotency keys for the offline sync API
+            cur.execute("""CREATE TABLE IF NOT EXISTS sync_keys (
+                user_id INTEGER NOT NULL,
+                key TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                target_id INTEGER NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY(user_id, key)
+            )""")
+            # --- Resumable chunked uploads (upload_bp)
+            cur.execute("""CREATE TABLE IF NOT EXISTS upload_sessions (
+                id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                target TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                final_path TEXT NOT NULL,
+                total_size INTEGER NOT NULL,
+                received INTEGER NOT NULL DEFAULT 0,
+                sha256 TEXT,
+                title TEXT,
+                record_id INTEGER,
+                started_at REAL NOT NULL,
+                completed_at REAL
+            )""")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_photos_record ON photos(record_id)")
             # --- Add columns to records if missing
             cols = {row[1] for row in cur.execute("PRAGMA table_info(records)").fetchall()}
             if 'status' not in cols:
                 cur.execute("ALTER TABLE records ADD COLUMN status TEXT DEFAULT 'draft'")
             if 'work_map_id' not in cols:
                 cur.execute("ALTER TABLE records ADD COLUMN work_map_id INTEGER")
+            # --- Dimensão de dispositivos (records.device_id) + migração dos antigos
+            devices.ensure_devices_schema(cur)
+            live.ensure_live_schema(cur)
+            archive.ensure_archive_schema(cur)
             db.commit()
+            ensure_search_index(db)
+            progress.ensure_progress_schema(db)
         SCHEMA_OK = True
     except Exception as e:
         print("ensure_schema warning:", e)
 
+
+SEARCH_FTS = True
+
+
+def ensure_search_index(db):
+    """Índice FTS5 de registros (dispositivo, autor, status, mapa) mantido por triggers.
+
+    Tabela, triggers e a carga inicial com os registros existentes rodam na MESMA
+    transação (como em progress.py): se a criação for interrompida, nada fica
+    gravado e a próxima inicialização refaz tudo. Um índice vazio com registros
+    na tabela (carga interrompida por versões antigas) também é repopulado. Se o
+    SQLite não tiver FTS5, a busca cai para LIKE por prefixo em device_name.
+    """
+    global SEARCH_FTS
+    try:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            exists = db.execute("SELECT 1 FROM sqlite_master WHERE name='records_fts'").fetchone()
+            db.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5(
+                device_name, username, status, work_map,
+                tokenize="unicode61 remove_diacritics 2", prefix='2 3'
+            )""")
+            fts_row = """(SELECT username FROM users WHERE id = new.user_id), new.status,
+                (SELECT title FROM work_maps WHERE id = new.work_map_id)"""
+            db.execute(f"""CREATE TRIGGER IF NOT EXISTS records_fts_ai AFTER INSERT ON records BEGIN
+                INSERT INTO records_fts(rowid, device_name, username, status, work_map)
+                VALUES (new.id, new.device_name, {fts_row});
+            END""")
+            db.execute(f"""CREATE TRIGGER IF NOT EXISTS records_fts_au AFTER UPDATE ON records BEGIN
+                DELETE FROM records_fts WHERE rowid = old.id;
+                INSERT INTO records_fts(rowid, device_name, username, status, work_map)
+                VALUES (new.id, new.device_name, {fts_row});
+            END""")
+            db.execute("""CREATE TRIGGER IF NOT EXISTS records_fts_ad AFTER DELETE ON records BEGIN
+                DELETE FROM records_fts WHERE rowid = old.id;
+            END""")
+            db.execute("""CREATE TRIGGER IF NOT EXISTS records_fts_user_au AFTER UPDATE OF username ON users BEGIN
+                UPDATE records_fts SET username = new.username
+                WHERE rowid IN (SELECT id FROM records WHERE user_id = new.id);
+            END""")
+            db.execute("""CREATE TRIGGER IF NOT EXISTS records_fts_map_au AFTER UPDATE OF title ON work_maps BEGIN
+                UPDATE records_fts SET work_map = new.title
+                WHERE rowid IN (SELECT id FROM records WHERE work_map_id = new.id);
+            END""")
+            db.execute("""CREATE TRIGGER IF NOT EXISTS records_fts_map_ad AFTER DELETE ON work_maps BEGIN
+                UPDATE records_fts SET work_map = NULL
+                WHERE rowid IN (SELECT id FROM records WHERE work_map_id = old.id);
+            END""")
+            empty = exists and not db.execute("SELECT 1 FROM records_fts LIMIT 1").fetchone()
+            if not exists or (empty and db.execute("SELECT 1 FROM records LIMIT 1").fetchone()):
+                rebuild_search_index(db)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    except sqlite3.OperationalError as e:
+        SEARCH_FTS = False
+        print("FTS5 indisponível, busca por LIKE:", e)
+
+def rebuild_search_index(db):
+    db.execute("DELETE FROM records_fts")
+    db.execute("""
+        INSERT INTO records_fts(rowid, device_name, username, status, work_map)
+        SELECT r.id, r.device_name, u.username, r.status, m.title
+        FROM records r
+        LEFT JOIN users u ON u.id = r.user_id
+        LEFT JOIN work_maps m ON m.id = r.work_map_id
+    """)
+
 @app.before_request
 def _ensure_schema_before_request():
     ensure_schema()
@@ -283,7 +435,7 @@ def register():
             flash("Preencha todos os campos.", "error")
             return redirect(url_for("register"))
         is_admin = 1
-        pw_hash = generate_password_hash(password)
+        pw_hash = hash_password(password)
         try:
             db.execute("INSERT INTO users (username, password_hash, is_admin) VALUES (?, ?, ?)", (username, pw_hash, is_admin))
             db.commit()
@@ -299,11 +451,22 @@ def login():
     if request.method == "POST":
         username = request.form.get("username", "").strip()
         password = request.form.get("password", "").strip()
+        ip = request.remote_addr or ""
+        if login_throttled(ip, username):
+            flash("Muitas tentativas de login. Aguarde alguns minutos.", "error")
+            return render_template("login.html"), 429
         db = get_db()
         row = db.execute("SELECT id, password_hash, is_admin FROM users WHERE username = ?", (username,)).fetchone()
-        if not row or not check_password_hash(row["password_hash"], password):
+        ok, rehash = verify_password(row["password_hash"], password) if row else (False, False)
+        if not ok:
+            record_login_failure(ip, username)
             flash("Credenciais inválidas.", "error")
             return redirect(url_for("login"))
+        clear_login_failures(username)
+        if rehash:
+            # Parâmetros de hash mudaram (PASSWORD_HASH_METHOD): atualiza de forma transparente
+            db.execute("UPDATE users SET password_hash = ? WHERE id = ?", (hash_password(password), row["id"]))
+            db.commit()
         session["user_id"] = row["id"]
         session["username"] = username
         session["is_admin"] = bool(row["is_admin"])
@@ -354,13 +517,14 @@ def new_record():
             return render_template("new_record.html", maps=maps)
         cur = db.cursor()
         cur.execute(
-            "INSERT INTO records (user_id, device_name, fusion_count, status, work_map_id) VALUES (?, ?, ?, COALESCE(?, 'draft'), ?)",
-            (user_id, device_name, int(fusion_count), "draft", work_map_id)
+            "INSERT INTO records (user_id, device_name, device_id, fusion_count, status, work_map_id) VALUES (?, ?, ?, ?, COALESCE(?, 'draft'), ?)",
+            (user_id, device_name, devices.device_id(db, device_name), int(fusion_count), "draft", work_map_id)
         )
         record_id = cur.lastrowid
         # handle photos
         files = request.files.getlist("photos")
         saved_any = False
+        photos = 0
         from werkzeug.utils import secure_filename
         import os
         for f in files[:MAX_FILES_PER_RECORD]:
@@ -375,6 +539,8 @@ def new_record():
             f.save(dest)
             cur.execute("INSERT INTO photos (record_id, filename) VALUES (?, ?)", (record_id, safe))
             saved_any = True
+            photos += 1
+        live.publish_record(db, "record", record_id, photos)
         db.commit()
         if not saved_any and len(files) > 0:
             flash(("warning", "Nenhuma foto foi salva (verifique os tipos permitidos)."))
@@ -437,6 +603,7 @@ def delete_record(record_id):
         if os.path.exists(fpath):
             try: os.remove(fpath)
             except Exception: pass
+    live.publish_record(db, "delete", record_id, len(photos))
     db.execute("DELETE FROM photos WHERE record_id = ?", (record_id,))
     db.execute("DELETE FROM records WHERE id = ?", (record_id,))
     db.commit()
@@ -461,7 +628,7 @@ def admin_users():
             flash("Preencha usuário e senha.", "error")
             return redirect(url_for("admin_users"))
         try:
-            pw_hash = generate_password_hash(password)
+            pw_hash = hash_password(password)
             db.execute("INSERT INTO users (username, password_hash, is_admin) VALUES (?, ?, ?)", (username, pw_hash, is_admin))
             db.commit()
             flash("Usuário criado com sucesso.", "success")
@@ -499,7 +666,7 @@ def admin_reset_password(user_id):
         if not p1 or not p2 or p1 != p2:
             flash("As senhas devem ser preenchidas e iguais.", "error")
             return redirect(url_for("admin_reset_password", user_id=user_id))
-        pw_hash = generate_password_hash(p1)
+        pw_hash = hash_password(p1)
         db.execute("UPDATE users SET password_hash = ? WHERE id = ?", (pw_hash, user_id))
         db.commit()
         flash("Senha atualizada com sucesso.", "success")
@@ -529,7 +696,7 @@ def admin_records():
 @admin_required
 def admin_export_csv():
     user_id = request.args.get("user_id", type=int)
-    db = get_db()
+    db = get_report_db()
     if user_id:
         rows = db.execute(
             "SELECT r.id, u.username, r.device_name, r.fusion_count, r.created_at "
@@ -548,12 +715,27 @@ def admin_export_csv():
         writer.writerow([r["id"], r["username"], r["device_name"], r["fusion_count"], r["created_at"]])
     return Response(si.getvalue(), mimetype="text/csv; charset=utf-8", headers={"Content-Disposition": "attachment; filename=registros_splicing_admin.csv"})
 
+@app.route("/admin/export.<any(parquet, arrow):fmt>")
+@admin_required
+def admin_export_columnar(fmt):
+    """Registros em Parquet/Arrow, com os mesmos filtros start/end/user_id dos relatórios."""
+    if not columnar.available():
+        return Response("Exportação colunar indisponível: instale o pyarrow (requirements-analytics.txt).",
+                        status=501, mimetype="text/plain")
+    key, where_sql, params = report_filter()
+    with closing(get_report_db(key[0])) as db:
+        spool = columnar.export_file(db, where_sql, params, fmt)
+    mimetype, filename = columnar.FORMATS[fmt]
+    return send_file(spool, mimetype=mimetype, as_attachment=True, download_name=filename)
+
 # ===== Relatórios com filtros + gráficos + XLSX =====
 from datetime import datetime
 
-@app.route("/admin/reports", methods=["GET"])
-@admin_required
-def admin_reports():
+def report_filter():
+    """Filtro dos relatórios: (chave normalizada, WHERE sobre `records r`, params).
+
+    A chave só tem o que muda o resultado, para pedidos iguais coalescerem.
+    """
     start_str = request.args.get("start", "").strip()
     end_str = request.args.get("end", "").strip()
     user_id = request.args.get("user_id", type=int)
@@ -566,8 +748,32 @@ def admin_reports():
     if user_id:
         clauses.append("r.user_id = ?"); params.append(user_id)
     where_sql = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+    return (start_str, end_str, user_id or None), where_sql, params
 
-    db = get_db()
+
+@app.route("/admin/reports", methods=["GET"])
+@admin_required
+def admin_reports():
+    key, where_sql, params = report_filter()
+    start_str, end_str, user_id = key
+
+    def compute():
+        with closing(get_report_db(key[0])) as db:
+            return reports_page_data(db, where_sql, params)
+
+    data = coalesce.flights.do("admin_reports", key, compute)
+    with closing(get_db()) as db:
+        users = db.execute("SELECT id, username FROM users ORDER BY username ASC").fetchall()
+
+    return render_template(
+        "admin_reports.html",
+        users=users, selected_user_id=user_id,
+        start=start_str, end=end_str, freshness=replica.replica.status(), **data
+    )
+
+
+def reports_page_data(db, where_sql, params):
+    """Tabelas de /admin/reports (linhas como dicts, para poderem ser compartilhadas)."""
     rows = db.execute(
         f"SELECT r.id, u.username, r.device_name, r.fusion_count, r.created_at "
         f"FROM records r JOIN users u ON u.id = r.user_id {where_sql} ORDER BY r.created_at DESC",
@@ -581,7 +787,7 @@ def admin_reports():
 
     users_summary = db.execute(
         f"SELECT u.id, u.username, "
-        f"COUNT(DISTINCT r.device_name) AS devices, "
+        f"COUNT(DISTINCT r.device_id) AS devices, "
         f"COUNT(r.id) AS registros, "
         f"COALESCE(SUM(r.fusion_count), 0) AS fusoes "
         f"FROM records r JOIN users u ON u.id = r.user_id "
@@ -592,51 +798,134 @@ def admin_reports():
     ).fetchall()
 
     devices = db.execute(
-        f"SELECT r.device_name, COUNT(*) as registros, SUM(r.fusion_count) as fusoes "
-        f"FROM records r {where_sql} GROUP BY r.device_name ORDER BY fusoes DESC, registros DESC",
+        f"SELECT r.device_id, COALESCE(d.name, r.device_name) AS device_name, COUNT(*) as registros, SUM(r.fusion_count) as fusoes "
+        f"FROM records r LEFT JOIN devices d ON d.id = r.device_id {where_sql} GROUP BY r.device_id ORDER BY fusoes DESC, registros DESC",
         tuple(params),
     ).fetchall()
 
-    users = db.execute("SELECT id, username FROM users ORDER BY username ASC").fetchall()
-
-    return render_template(
-        "admin_reports.html",
-        rows=rows, users=users, selected_user_id=user_id,
-        start=start_str, end=end_str,
-        total_fusions=total_fusions, devices=devices, users_summary=users_summary
-    )
+    return {
+        "rows": [dict(r) for r in rows], "total_fusions": total_fusions,
+        "devices": [dict(r) for r in devices], "users_summary": [dict(r) for r in users_summary],
+    }
 
 @app.route("/admin/reports_data.json")
 @admin_required
 def admin_reports_data():
-    start_str = request.args.get("start", "").strip()
-    end_str = request.args.get("end", "").strip()
-    user_id = request.args.get("user_id", type=int)
+    key, where_sql, params = report_filter()
+    with closing(get_report_db(key[0])) as db:
+        options = reports_chart_options(db, where_sql, params)
 
-    clauses = []; params = []
-    if start_str:
-        clauses.append("date(r.created_at) >= date(?)"); params.append(start_str)
-    if end_str:
-        clauses.append("date(r.created_at) <= date(?)"); params.append(end_str)
-    if user_id:
-        clauses.append("r.user_id = ?"); params.append(user_id)
-    where_sql = ("WHERE " + " AND ".join(clauses)) if clauses else ""
-    db = get_db()
+    def compute():
+        with closing(get_report_db(key[0])) as db:
+            return reports_chart_data(db, where_sql, params, *options)
 
-    by_day = db.execute(
-        f"SELECT date(r.created_at) as d, SUM(r.fusion_count) as total FROM records r {where_sql} GROUP BY date(r.created_at) ORDER BY d ASC",
+    data = coalesce.flights.do("admin_reports_data", (key, options), compute)
+    return dict(data, freshness=replica.replica.status())
+
+
+@app.route("/admin/reports/stream")
+@admin_required
+def admin_reports_stream():
+    """SSE: totais do filtro e, depois, os deltas publicados pelos caminhos de escrita."""
+    key, where_sql, params = report_filter()
+    with closing(get_report_db(key[0], fresh=True)) as db:
+        # Totais e último evento no mesmo snapshot: nenhum delta é contado duas vezes
+        db.execute("BEGIN")
+        try:
+            totals = reports_chart_data(db, where_sql, params, *reports_chart_options(db, where_sql, params))
+            counts = db.execute(
+                f"SELECT COUNT(*) AS records, COALESCE(SUM(r.status IS 'launched'), 0) AS launched, "
+                f"(SELECT COUNT(*) FROM photos p JOIN records r ON r.id = p.record_id {where_sql}) AS photos "
+                f"FROM records r {where_sql}",
+                (*params, *params),
+            ).fetchone()
+            totals.update(dict(counts))
+            totals["last_id"] = live.last_event_id(db)
+        finally:
+            db.rollback()
+    try:
+        q = live_hub.subscribe(totals["last_id"])
+    except live.TooManyStreams:
+        return Response("Muitos painéis ao vivo conectados; tente mais tarde.", status=503,
+                        headers={"Retry-After": "30"}, mimetype="text/plain")
+    resp = Response(
+        live_hub.stream(q, totals),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # Libera a vaga mesmo se o cliente sair antes do primeiro evento
+    resp.call_on_close(lambda: live_hub.unsubscribe(q))
+    return resp
+
+
+REPORTS_TOP_DEVICES = int(os.environ.get("REPORTS_TOP_DEVICES", "20"))
+# Início de cada período; semana começa na segunda-feira
+REPORT_BUCKETS = {
+    "day": "date(r.created_at)",
+    "week": "date(r.created_at, '-6 days', 'weekday 1')",
+    "month": "strftime('%Y-%m-01', r.created_at)",
+}
+
+
+def reports_chart_options(db, where_sql, params):
+    """(bucket, top) de `?bucket=day|week|month&top=N`; sem bucket, escolhe pelo período.
+
+    Até ~3 meses por dia, até 2 anos por semana, acima disso por mês: o gráfico
+    nunca passa de ~100 pontos, qualquer que seja o intervalo.
+    """
+    bucket = request.args.get("bucket", "").strip()
+    if bucket not in REPORT_BUCKETS:
+        first = request.args.get("start", "").strip()
+        last = request.args.get("end", "").strip()
+        if not (first and last):
+            # Sem início/fim explícitos: o período real dos registros no filtro
+            row = db.execute(
+                f"SELECT date(MIN(r.created_at)), date(MAX(r.created_at)) FROM records r {where_sql}", tuple(params)
+            ).fetchone()
+            first, last = first or row[0], last or row[1]
+        try:
+            days = (datetime.strptime(last, "%Y-%m-%d") - datetime.strptime(first, "%Y-%m-%d")).days
+        except (TypeError, ValueError):
+            days = 0
+        bucket = "day" if days <= 92 else "week" if days <= 731 else "month"
+    top = request.args.get("top", REPORTS_TOP_DEVICES, type=int)
+    return bucket, max(1, min(top, 100))
+
+
+def reports_chart_data(db, where_sql, params, bucket="day", top=REPORTS_TOP_DEVICES):
+    """Séries dos gráficos em arrays paralelos: fusões por período e os `top`
+    dispositivos com mais fusões; o resto vai somado em `others`.
+    """
+    period = REPORT_BUCKETS[bucket]
+    by_period = db.execute(
+        f"SELECT {period} AS p, SUM(r.fusion_count) AS total FROM records r {where_sql} GROUP BY p ORDER BY p ASC",
         tuple(params),
     ).fetchall()
-    by_day_list = [{"date": r["d"], "sum": r["total"] or 0} for r in by_day]
 
     by_device = db.execute(
-        f"SELECT r.device_name, SUM(r.fusion_count) as total FROM records r {where_sql} GROUP BY r.device_name ORDER BY total DESC",
-        tuple(params),
+        f"SELECT COALESCE(d.name, r.device_name) AS device_name, SUM(r.fusion_count) as total "
+        f"FROM records r LEFT JOIN devices d ON d.id = r.device_id {where_sql} "
+        f"GROUP BY r.device_id ORDER BY total DESC LIMIT ?",
+        (*params, top),
     ).fetchall()
-    by_device_list = [{"device_name": r["device_name"], "sum": r["total"] or 0} for r in by_device]
-
-    total_fusions = sum(item["sum"] for item in by_day_list)
-    return {"by_day": by_day_list, "by_device": by_device_list, "total_fusions": total_fusions}
+    device_count = db.execute(
+        f"SELECT COUNT(*) FROM (SELECT 1 FROM records r {where_sql} GROUP BY r.device_id)", tuple(params)
+    ).fetchone()[0]
+
+    total_fusions = sum(r["total"] or 0 for r in by_period)
+    top_sums = [r["total"] or 0 for r in by_device]
+    return {
+        "bucket": bucket,
+        "series": {"labels": [r["p"] for r in by_period], "sums": [r["total"] or 0 for r in by_period]},
+        "devices": {
+            "labels": [r["device_name"] for r in by_device],
+            "sums": top_sums,
+            "others": total_fusions - sum(top_sums),
+            "others_count": max(0, device_count - len(by_device)),
+            "top": top,
+        },
+        "total_fusions": total_fusions,
+    }
 
 @app.route("/admin/reports.csv")
 @admin_required
@@ -653,7 +942,7 @@ def admin_reports_csv():
     if user_id:
         clauses.append("r.user_id = ?"); params.append(user_id)
     where_sql = ("WHERE " + " AND ".join(clauses)) if clauses else ""
-    db = get_db()
+    db = get_report_db(start_str)
     rows = db.execute(
         f"SELECT r.id, u.username, r.device_name, r.fusion_count, r.created_at FROM records r JOIN users u ON u.id = r.user_id {where_sql} ORDER BY r.created_at DESC",
         tuple(params),
@@ -680,9 +969,9 @@ def admin_reports_users_csv():
         clauses.append("r.user_id = ?"); params.append(user_id)
     where_sql = ("WHERE " + " AND ".join(clauses)) if clauses else ""
 
-    db = get_db()
+    db = get_report_db(start_str)
     rows = db.execute(
-        f"SELECT u.id, u.username, COUNT(DISTINCT r.device_name) AS devices, COUNT(r.id) AS registros, COALESCE(SUM(r.fusion_count), 0) AS fusoes "
+        f"SELECT u.id, u.username, COUNT(DISTINCT r.device_id) AS devices, COUNT(r.id) AS registros, COALESCE(SUM(r.fusion_count), 0) AS fusoes "
         f"FROM records r JOIN users u ON u.id = r.user_id {where_sql} GROUP BY u.id, u.username ORDER BY fusoes DESC, devices DESC",
         tuple(params),
     ).fetchall()
@@ -696,30 +985,33 @@ def admin_reports_users_csv():
 @app.route("/admin/reports.xlsx")
 @admin_required
 def admin_reports_xlsx():
-    from openpyxl import Workbook
-    from openpyxl.utils import get_column_letter
+    key, where_sql, params = report_filter()
 
-    start_str = request.args.get("start", "").strip()
-    end_str = request.args.get("end", "").strip()
-    user_id = request.args.get("user_id", type=int)
+    def compute():
+        with closing(get_report_db(key[0])) as db:
+            return build_reports_xlsx(db, key, where_sql, params)
 
-    clauses = []; params = []
-    if start_str: clauses.append("date(r.created_at) >= date(?)"); params.append(start_str)
-    if end_str:   clauses.append("date(r.created_at) <= date(?)"); params.append(end_str)
-    if user_id:   clauses.append("r.user_id = ?"); params.append(user_id)
-    where_sql = ("WHERE " + " AND ".join(clauses)) if clauses else ""
-    db = get_db()
+    data = coalesce.flights.do("admin_reports_xlsx", key, compute)
+    return Response(data, mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    headers={"Content-Disposition": "attachment; filename=relatorio_admin.xlsx"})
+
+
+def build_reports_xlsx(db, key, where_sql, params):
+    """Planilha do relatório filtrado (bytes do .xlsx)."""
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
 
     rows = db.execute(
         f"SELECT r.id, u.username, r.device_name, r.fusion_count, r.created_at FROM records r JOIN users u ON u.id = r.user_id {where_sql} ORDER BY r.created_at DESC",
         tuple(params),
     ).fetchall()
     devices = db.execute(
-        f"SELECT r.device_name, COUNT(*) as registros, SUM(r.fusion_count) as fusoes FROM records r {where_sql} GROUP BY r.device_name ORDER BY fusoes DESC",
+        f"SELECT COALESCE(d.name, r.device_name) AS device_name, COUNT(*) as registros, SUM(r.fusion_count) as fusoes "
+        f"FROM records r LEFT JOIN devices d ON d.id = r.device_id {where_sql} GROUP BY r.device_id ORDER BY fusoes DESC",
         tuple(params),
     ).fetchall()
     users_summary = db.execute(
-        f"SELECT u.id, u.username, COUNT(DISTINCT r.device_name) AS devices, COUNT(r.id) AS registros, COALESCE(SUM(r.fusion_count), 0) AS fusoes "
+        f"SELECT u.id, u.username, COUNT(DISTINCT r.device_id) AS devices, COUNT(r.id) AS registros, COALESCE(SUM(r.fusion_count), 0) AS fusoes "
         f"FROM records r JOIN users u ON u.id = r.user_id {where_sql} GROUP BY u.id, u.username ORDER BY fusoes DESC, devices DESC",
         tuple(params),
     ).fetchall()
@@ -753,16 +1045,41 @@ def admin_reports_xlsx():
     for r in users_summary:
         ws4.append([r["id"], r["username"], r["devices"], r["registros"], r["fusoes"]])
 
-    for ws in [ws1, ws2, ws3, ws4]:
+    sheets = [ws1, ws2, ws3, ws4]
+    if analytics.available():
+        sheets.append(analytics.write_sheet(wb, productivity(db, key, where_sql, params)))
+
+    for ws in sheets:
         for col in ws.columns:
             from openpyxl.utils import get_column_letter
             col_letter = get_column_letter(col[0].column)
             max_len = max(len(str(c.value)) if c.value is not None else 0 for c in col)
             ws.column_dimensions[col_letter].width = min(max_len + 2, 40)
 
-    bio = BytesIO(); wb.save(bio); bio.seek(0)
-    return Response(bio.getvalue(), mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    headers={"Content-Disposition": "attachment; filename=relatorio_admin.xlsx"})
+    bio = BytesIO(); wb.save(bio)
+    return bio.getvalue()
+
+def productivity(db, key, where_sql, params):
+    """Estatísticas de produtividade (analytics.py), memoizadas por filtro e geração dos dados."""
+    generation = analytics.data_generation(db)
+
+    def compute():
+        with closing(get_report_db(key[0])) as conn:
+            usernames = dict(conn.execute("SELECT id, username FROM users").fetchall())
+            return analytics.compute(conn, where_sql, params, usernames)
+
+    return analytics.cached(key, generation, lambda: coalesce.flights.do("analytics", (key, generation), compute))
+
+
+@app.route("/admin/analytics.json")
+@admin_required
+def admin_analytics():
+    """Produtividade por técnico (percentis diários, médias móveis, semana a semana)."""
+    if not analytics.available():
+        return {"error": "análise indisponível: instale o numpy (requirements-analytics.txt)"}, 501
+    key, where_sql, params = report_filter()
+    with closing(get_report_db(key[0])) as db:
+        return dict(productivity(db, key, where_sql, params), freshness=replica.replica.status())
 
 # ===== Download de fotos em ZIP por dispositivo =====
 @app.route("/admin/photos", methods=["GET", "POST"])
@@ -781,23 +1098,25 @@ def admin_photos():
         clauses.append("r.user_id = ?"); params.append(user_id)
     where_sql = ("WHERE " + " AND ".join(clauses)) if clauses else ""
 
-    db = get_db()
+    db = get_report_db(start_str)
     devices = db.execute(
         f"""
-        SELECT r.device_name,
+        SELECT r.device_id, COALESCE(d.name, r.device_name) AS device_name,
                COUNT(DISTINCT r.id) as registros,
                COUNT(p.id) as fotos
         FROM records r
+        LEFT JOIN devices d ON d.id = r.device_id
         LEFT JOIN photos p ON p.record_id = r.id
         {where_sql}
-        GROUP BY r.device_name
+        GROUP BY r.device_id
         ORDER BY fotos DESC, registros DESC
         """,
         tuple(params)
     ).fetchall()
 
     users = db.execute("SELECT id, username FROM users ORDER BY username ASC").fetchall()
-    return render_template("admin_photos.html", devices=devices, users=users, selected_user_id=user_id, start=start_str, end=end_str)
+    return render_template("admin_photos.html", devices=devices, users=users, selected_user_id=user_id,
+                           start=start_str, end=end_str, freshness=replica.replica.status())
 
 @app.route("/admin/photos.zip", methods=["POST"])
 @admin_required
@@ -805,7 +1124,7 @@ def admin_photos_zip():
     start_str = request.form.get("start", "").strip()
     end_str = request.form.get("end", "").strip()
     user_id = request.form.get("user_id", type=int)
-    selected = request.form.getlist("devices")
+    selected = [d for d in request.form.getlist("devices", type=int) if d]
 
     if not selected:
         flash("Selecione pelo menos um dispositivo.", "error")
@@ -818,42 +1137,44 @@ def admin_photos_zip():
         clauses.append("date(r.created_at) <= date(?)"); params.append(end_str)
     if user_id:
         clauses.append("r.user_id = ?"); params.append(user_id)
-    in_clause = " OR ".join(["r.device_name = ?"] * len(selected))
-    clauses.append(f"({in_clause})"); params.extend(selected)
+    clauses.append(f"r.device_id IN ({','.join('?' * len(selected))})"); params.extend(selected)
 
     where_sql = "WHERE " + " AND ".join(clauses)
 
-    db = get_db()
+    db = get_report_db(start_str)
     rows = db.execute(
         f"""
-        SELECT r.id as record_id, r.device_name, u.username, p.filename
+        SELECT r.id as record_id, d.name AS device_name, u.username, p.filename
         FROM records r
+        JOIN devices d ON d.id = r.device_id
         JOIN users u ON u.id = r.user_id
         JOIN photos p ON p.record_id = r.id
         {where_sql}
-        ORDER BY r.device_name ASC, r.id ASC
+        ORDER BY d.name ASC, r.id ASC
         """,
         tuple(params)
     ).fetchall()
 
-    bio = BytesIO()
-    with zipfile.ZipFile(bio, "w", zipfile.ZIP_DEFLATED) as z:
-        base_upload = app.config.get("UPLOAD_FOLDER")
-        for row in rows:
-            device = row["device_name"]
-            rec_id = row["record_id"]
-            filename = row["filename"]
-            fpath = os.path.join(base_upload, filename)
-            if os.path.isfile(fpath):
-                arcname = f"{device}/record_{rec_id}/{filename}"
-                z.write(fpath, arcname)
-    bio.seek(0)
-    fname = "fotos_filtradas.zip"
-    return Response(
-        bio.getvalue(),
-        mimetype="application/zip",
-        headers={"Content-Disposition": f"attachment; filename={fname}"}
-    )
+    members = [
+        (f"{row['device_name']}/record_{row['record_id']}/{row['filename']}", os.path.join(UPLOAD_FOLDER, row["filename"]))
+        for row in rows
+    ]
+    # ZIP montado em arquivo temporário no disco de dados, comprimido no pool de processos
+    tmp_dir = os.path.join(DATA_DIR, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    out_path = os.path.join(tmp_dir, f"fotos-{os.getpid()}-{time.time_ns()}.zip")
+    try:
+        with parallel_zip.export_slot():
+            parallel_zip.build_zip(out_path, members)
+    except parallel_zip.ExportBusy:
+        flash("Outra exportação está em andamento. Tente novamente em instantes.", "error")
+        return redirect(url_for("admin_photos", start=start_str, end=end_str, user_id=user_id))
+    f = open(out_path, "rb")
+    try:
+        os.remove(out_path)  # o conteúdo continua acessível pelo descritor aberto
+    except OSError:
+        pass
+    return send_file(f, mimetype="application/zip", as_attachment=True, download_name="fotos_filtradas.zip")
 
 # ===== Export do usuário (pessoal) =====
 @app.route("/export.csv")
@@ -889,7 +1210,7 @@ def force_reset_admin():
     row = db.execute("SELECT id FROM users WHERE is_admin = 1 ORDER BY id ASC LIMIT 1").fetchone()
     if not row:
         return "Nenhum admin encontrado", 404
-    db.execute("UPDATE users SET password_hash=? WHERE id=?", (generate_password_hash(new_pw), row["id"]))
+    db.execute("UPDATE users SET password_hash=? WHERE id=?", (hash_password(new_pw), row["id"]))
     db.commit()
     return f"Senha do admin (id={row['id']}) resetada para: {new_pw}"
 
@@ -922,7 +1243,8 @@ def admin_workmaps():
         # get all current grants
         grants = db.execute("SELECT user_id, work_map_id FROM user_work_map_access").fetchall()
         grant_set = {(g['user_id'], g['work_map_id']) for g in grants}
-        return render_template('admin_workmaps.html', maps=maps, users=users, grant_set=grant_set)
+        map_progress = progress.progress_for(db, [m['id'] for m in maps])
+        return render_template('admin_workmaps.html', maps=maps, users=users, grant_set=grant_set, progress=map_progress)
 
 @app.route('/admin/workmaps/grant', methods=['POST'])
 def admin_workmaps_grant():
@@ -957,6 +1279,38 @@ def workmap_download(wm_id):
     return send_from_directory(WORKMAP_FOLDER, wm['filename'], as_attachment=True)
 
 
+def set_records_status(db, where_sql, params, status, work_map_id=None):
+    """Aplica o status (e o mapa, se dado) a todos os registros do filtro.
+
+    Só toca linhas que mudam de fato, para os triggers (busca) não regravarem à toa.
+    Deve rodar dentro de uma transação; devolve quantos registros mudaram.
+    Publica um evento `launch` com a variação de lançados por (usuário, dia).
+    """
+    sets, set_params = ["status = ?"], [status]
+    changed = ["COALESCE(r.status, 'draft') != ?"]
+    changed_params = [status]
+    if work_map_id:
+        sets.append("work_map_id = ?"); set_params.append(work_map_id)
+        changed.append("r.work_map_id IS NOT ?"); changed_params.append(work_map_id)
+    changed_sql = f"({where_sql}) AND ({' OR '.join(changed)})"
+    deltas = db.execute(
+        f"SELECT r.user_id, date(r.created_at) AS day, "
+        f"SUM((? = 'launched') - (r.status IS 'launched')) AS delta "
+        f"FROM records r WHERE {changed_sql} GROUP BY r.user_id, day",
+        (status, *params, *changed_params),
+    ).fetchall()
+    cur = db.execute(
+        f"UPDATE records SET {', '.join(sets)} WHERE id IN (SELECT r.id FROM records r WHERE {changed_sql})",
+        (*set_params, *params, *changed_params),
+    )
+    if cur.rowcount:
+        live.publish(db, "launch", {
+            "changed": cur.rowcount, "status": status, "work_map_id": work_map_id,
+            "deltas": [[d["user_id"], d["day"], d["delta"]] for d in deltas if d["delta"]],
+        })
+    return cur.rowcount
+
+
 @app.route('/records/<int:rec_id>/launch', methods=['POST'])
 def record_launch(rec_id):
     uid = session.get('user_id')
@@ -967,17 +1321,14 @@ def record_launch(rec_id):
     if not session.get('is_admin'):
         abort(403)
     with closing(get_db()) as db:
-        # Ensure record exists
-        rec = db.execute("SELECT * FROM records WHERE id=?", (rec_id,)).fetchone()
-        if not rec:
+        if not db.execute("SELECT 1 FROM records WHERE id=?", (rec_id,)).fetchone():
             abort(404)
-        # Ensure selected work_map exists
-        wm = db.execute("SELECT * FROM work_maps WHERE id=?", (work_map_id,)).fetchone()
-        if not wm:
+        if not work_map_id or not db.execute("SELECT 1 FROM work_maps WHERE id=?", (work_map_id,)).fetchone():
             flash(('danger','Selecione um Mapa de Trabalho válido.'))
             return redirect(url_for('view_record', record_id=rec_id))
-        db.execute("UPDATE records SET status='launched', work_map_id=? WHERE id=?", (work_map_id, rec_id))
-        db.commit()
+        # Mesmo caminho do lançamento em lote (launch_bp)
+        with db:
+            set_records_status(db, "r.id = ?", [rec_id], "launched", work_map_id)
     flash(('success','Dispositivo marcado como LANÇADO.'))
     return redirect(url_for('view_record', record_id=rec_id))
 
@@ -988,35 +1339,68 @@ def my_workmaps():
     if not uid:
         return redirect(url_for('login'))
     maps = get_user_accessible_maps(uid)
-    return render_template('my_workmaps.html', maps=maps)
+    with closing(get_db()) as db:
+        map_progress = progress.progress_for(db, [m['id'] for m in maps])
+    return render_template('my_workmaps.html', maps=maps, progress=map_progress)
+
+health_checker = HealthChecker(get_db, DB_PATH, DATA_DIR, is_writable)
+live_hub = live.LiveHub(get_db)
+progress.init_app(app, get_db, ensure_schema)
+archive.init_app(app, DATA_DIR, get_db, ensure_schema)
+replica.init_app(app, DATA_DIR, DB_PATH, connect_db)
+
 
+@app.route("/livez")
+def livez():
+    # Liveness: o processo responde; não depende de banco nem disco
+    return {"ok": True}
+
+
+@app.route("/readyz")
 @app.route("/healthz")
 def healthz():
-    # basic checks: can open DB and write to DATA_DIR
-    ok = True
-    checks = {}
-    # DB check
-    try:
-        db = get_db()
-        db.execute("SELECT 1").fetchone()
-        checks["db"] = "ok"
-    except Exception as e:
-        checks["db"] = f"error: {e}"
-        ok = False
-    # Disk check
-    if is_writable(DATA_DIR):
-        checks["disk"] = "ok"
-    else:
-        checks["disk"] = "not-writable"
-        ok = False
-    code = 200 if ok else 503
-    try:
-        import json
-        return app.response_class(json.dumps({"ok": ok, "checks": checks}), status=code, mimetype="application/json")
-    except Exception:
-        return ("ok" if ok else "not ok", code)
+    # Readiness: resultado em cache do HealthChecker (db, disco, espaço livre, WAL)
+    ready, body = health_checker.snapshot()
+    return body, 200 if ready else 503
 
 
+@app.route("/admin/metrics")
+@admin_required
+def admin_metrics():
+    # Formato de texto do Prometheus, somando todos os workers
+    registry = app.extensions["metrics"]
+    return Response(metrics.render_prometheus(registry.merged(), registry.merged_counters()), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.route("/admin/sql-profile", methods=["GET", "POST"])
+@admin_required
+def admin_sql_profile():
+    prof = app.extensions["sqlprofile"]
+    if request.method == "POST":
+        action = request.form.get("action")
+        if action == "reset":
+            prof.reset()
+            flash("Estatísticas de SQL zeradas em todos os processos.", "success")
+        elif action in ("enable", "disable"):
+            # Vale só para este worker; use SQL_PROFILE=1 para ligar em todos
+            prof.enabled = action == "enable"
+            flash(f"Profiler {'ligado' if prof.enabled else 'desligado'} neste processo.", "success")
+        return redirect(url_for("admin_sql_profile"))
+    order = request.args.get("order", "total_ms")
+    if order not in ("total_ms", "max_ms", "calls", "rows", "avg_ms"):
+        order = "total_ms"
+    stats = prof.report(order)
+    return render_template("admin_sql_profile.html", stats=stats, enabled=prof.enabled, order=order,
+                           slow_ms=sqlprofile.SLOW_MS, pid=os.getpid())
+
+
+@app.route("/admin/sql-profile.json")
+@admin_required
+def admin_sql_profile_json():
+    prof = app.extensions["sqlprofile"]
+    return {"enabled": prof.enabled, "slow_ms": sqlprofile.SLOW_MS,
+            "statements": prof.report(request.args.get("order", "total_ms"))}
+
 
 @app.route("/admin/backup")
 @login_required
@@ -1117,3 +1501,27 @@ try:
     app.register_blueprint(backup_bp)
 except Exception as e:
     print('Backup blueprint not registered:', e)
+
+# Importação em lote de registros (rota + comando `flask import-records`)
+from import_bp import import_bp
+app.register_blueprint(import_bp)
+
+# API de sincronização offline + service worker do formulário de registro
+from sync_bp import sync_bp
+app.register_blueprint(sync_bp)
+
+# Uploads em pedaços retomáveis (backups, PDFs de mapas e fotos)
+from upload_bp import upload_bp
+app.register_blueprint(upload_bp)
+
+# Galeria de fotos paginada com miniaturas
+from gallery_bp import gallery_bp
+app.register_blueprint(gallery_bp)
+
+# Busca de registros (índice FTS5 + comando `flask rebuild-search-index`)
+from search_bp import search_bp
+app.register_blueprint(search_bp)
+
+# Lançamento/retorno a rascunho em lote
+from launch_bp import launch_bp
+app.register_blueprint(launch_bp)
@@ -0,0 +1,210 @@
+
+"""Arquivo morto: registros antigos (e suas fotos) num SQLite separado.
+
+`flask --app app archive-records --before 2024-01-01` (e/ou `--work-map ID`,
+`--closed-maps`) move, em lotes, as linhas de `records` e `photos` para
+ARCHIVE_DB_PATH (padrão DATA_DIR/archive.db). O app.db fica pequeno: formulário,
+dashboards, busca e backups só veem o que está em uso. Os arquivos de foto não
+saem do lugar.
+
+Leitura: `attach_for_reports(db, start)` anexa o arquivo e cria views TEMP
+`records`/`photos` = main UNION ALL archive. Como objetos TEMP têm precedência
+sobre os de `main` em nomes sem esquema, todo o SQL dos relatórios passa a ler
+as duas partes sem mudar. Só anexa quando o período pedido alcança os dados
+arquivados (`start` vazio ou anterior ao registro arquivado mais novo).
+
+Os contadores de progresso por mapa (progress.py) continuam contando os
+registros arquivados.
+"""
+from contextlib import closing
+import os
+
+import click
+
+ARCHIVE_PATH = None
+ARCHIVE_SCHEMA = "archive"
+
+
+def init_app(app, data_dir, get_db, ensure_schema):
+    global ARCHIVE_PATH
+    ARCHIVE_PATH = os.environ.get("ARCHIVE_DB_PATH", os.path.join(data_dir, "archive.db"))
+    app.extensions["archive"] = ARCHIVE_PATH
+
+    @app.cli.command("archive-records")
+    @click.option("--before", help="Arquiva registros criados antes desta data (AAAA-MM-DD).")
+    @click.option("--work-map", "work_maps", type=int, multiple=True, help="Arquiva todos os registros do mapa (repetível).")
+    @click.option("--closed-maps", is_flag=True,
+                  help="Arquiva mapas encerrados: tudo lançado e sem atividade desde --before.")
+    @click.option("--batch-size", default=5000, show_default=True)
+    @click.option("--dry-run", is_flag=True, help="Só conta o que seria arquivado.")
+    def archive_records_command(before, work_maps, closed_maps, batch_size, dry_run):
+        """Move registros antigos/encerrados para o banco de arquivo."""
+        if not (before or work_maps):
+            raise click.UsageError("informe --before e/ou --work-map")
+        if closed_maps and not before:
+            raise click.UsageError("--closed-maps precisa de --before")
+        ensure_schema()
+        with closing(get_db()) as db:
+            where_sql, params = archive_filter(db, before, work_maps, closed_maps)
+            if dry_run:
+                n = db.execute(f"SELECT COUNT(*) FROM records r WHERE {where_sql}", params).fetchone()[0]
+                click.echo(f"{n} registro(s) seriam arquivados em {ARCHIVE_PATH}.")
+                return
+            moved = archive_records(db, where_sql, params, batch_size)
+        click.echo(f"{moved} registro(s) arquivados em {ARCHIVE_PATH}.")
+
+
+def ensure_archive_schema(cur):
+    """Metadados no app.db: registro arquivado mais novo (decide se anexa o arquivo)."""
+    cur.execute("""CREATE TABLE IF NOT EXISTS archive_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )""")
+
+
+def _columns(db, table, schema="main"):
+    return [r[1] for r in db.execute(f"PRAGMA {schema}.table_info({table})").fetchall()]
+
+
+def attach(db):
+    """Anexa o arquivo (criando as tabelas com as colunas atuais do app.db)."""
+    if any(r[1] == ARCHIVE_SCHEMA for r in db.execute("PRAGMA database_list").fetchall()):
+        return
+    db.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (ARCHIVE_PATH,))
+    for table in ("records", "photos"):
+        cols = _columns(db, table)
+        db.execute(
+            f"CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.{table} AS SELECT * FROM main.{table} WHERE 0"
+        )
+        # Colunas adicionadas ao app.db depois da criação do arquivo
+        have = set(_columns(db, table, ARCHIVE_SCHEMA))
+        for col in cols:
+            if col not in have:
+                db.execute(f"ALTER TABLE {ARCHIVE_SCHEMA}.{table} ADD COLUMN {col}")
+    db.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archive_records_id ON records(id)")
+    db.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archive_records_created ON records(created_at)")
+    db.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archive_photos_id ON photos(id)")
+    db.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archive_photos_record ON photos(record_id)")
+
+
+def newest_archived(db):
+    row = db.execute("SELECT value FROM archive_meta WHERE key = 'newest'").fetchone()
+    return row[0] if row else None
+
+
+def attach_for_reports(db, start=None):
+    """Faz `records`/`photos` desta conexão incluírem o arquivo, se o período precisar.
+
+    Só para conexões de leitura (as views TEMP não aceitam escrita). Devolve True
+    se anexou.
+    """
+    if ARCHIVE_PATH is None or not os.path.exists(ARCHIVE_PATH):
+        return False
+    try:
+        newest = newest_archived(db)
+    except Exception:
+        return False
+    if newest is None or (start and start > newest[:10]):
+        return False
+    attach(db)
+    for table in ("records", "photos"):
+        cols = ", ".join(_columns(db, table))
+        db.execute(
+            f"CREATE TEMP VIEW IF NOT EXISTS {table} AS "
+            f"SELECT {cols} FROM main.{table} UNION ALL SELECT {cols} FROM {ARCHIVE_SCHEMA}.{table}"
+        )
+    return True
+
+
+def archive_filter(db, before, work_maps=(), closed_maps=False):
+    """WHERE sobre `records r` do que deve ser arquivado."""
+    clauses, params = [], []
+    if closed_maps:
+        # Encerrado: nenhum rascunho e última atividade antes do corte
+        closed = [r[0] for r in db.execute(
+            "SELECT work_map_id FROM work_map_progress WHERE drafts = 0 AND last_activity < date(?)", (before,)
+        ).fetchall()]
+        work_maps = list(work_maps) + closed
+    elif before:
+        clauses.append("r.created_at < date(?)"); params.append(before)
+    if work_maps:
+        clauses.append(f"r.work_map_id IN ({','.join('?' * len(work_maps))})"); params.extend(work_maps)
+    if not clauses:
+        return "0", []
+    return " OR ".join(clauses), params
+
+
+def archive_records(db, where_sql, params, batch_size=5000):
+    """Move os registros do filtro (e as fotos deles) em transações de `batch_size`.
+
+    Cada lote copia para o arquivo e apaga do app.db na mesma transação; se uma
+    execução anterior foi interrompida entre os dois arquivos, as linhas que já
+    estão no arquivo são só apagadas do app.db.
+    """
+    attach(db)
+    cols = {t: ", ".join(_columns(db, t)) for t in ("records", "photos")}
+    db.execute("CREATE TEMP TABLE IF NOT EXISTS archive_batch (id INTEGER PRIMARY KEY)")
+    moved = 0
+    while True:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("DELETE FROM temp.archive_batch")
+            db.execute(
+                f"INSERT INTO temp.archive_batch SELECT r.id FROM main.records r WHERE {where_sql} ORDER BY r.id LIMIT ?",
+                (*params, batch_size),
+            )
+            n = db.execute("SELECT COUNT(*) FROM temp.archive_batch").fetchone()[0]
+            if not n:
+                db.rollback()
+                break
+            db.execute(
+                f"INSERT OR IGNORE INTO {ARCHIVE_SCHEMA}.records ({cols['records']}) "
+                f"SELECT {cols['records']} FROM main.records WHERE id IN (SELECT id FROM temp.archive_batch)"
+            )
+            db.execute(
+                f"INSERT OR IGNORE INTO {ARCHIVE_SCHEMA}.photos ({cols['photos']}) "
+                f"SELECT {cols['photos']} FROM main.photos WHERE record_id IN (SELECT id FROM temp.archive_batch)"
+            )
+            maps, devs = _progress_snapshot(db)
+            db.execute("DELETE FROM main.photos WHERE record_id IN (SELECT id FROM temp.archive_batch)")
+            db.execute("DELETE FROM main.records WHERE id IN (SELECT id FROM temp.archive_batch)")
+            _restore_progress(db, maps, devs)
+            newest = db.execute(f"SELECT MAX(created_at) FROM {ARCHIVE_SCHEMA}.records").fetchone()[0]
+            db.execute(
+                "INSERT INTO archive_meta (key, value) VALUES ('newest', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (newest,),
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        moved += n
+    return moved
+
+
+def _progress_snapshot(db):
+    """Parte do lote em cada mapa; os triggers de progress.py a descontam no DELETE."""
+    batch = "FROM main.records WHERE id IN (SELECT id FROM temp.archive_batch) AND work_map_id IS NOT NULL"
+    maps = db.execute(
+        f"SELECT work_map_id, COUNT(*), COALESCE(SUM(fusion_count), 0), "
+        f"SUM(status IS NOT 'launched'), SUM(status IS 'launched') {batch} GROUP BY work_map_id"
+    ).fetchall()
+    devs = db.execute(
+        f"SELECT work_map_id, device_id, COUNT(*) {batch} AND device_id IS NOT NULL GROUP BY work_map_id, device_id"
+    ).fetchall()
+    return [tuple(r) for r in maps], [tuple(r) for r in devs]
+
+
+def _restore_progress(db, maps, devs):
+    """Devolve ao progresso dos mapas o que foi arquivado: o mapa continua completo."""
+    db.executemany(
+        "UPDATE work_map_progress SET records = records + ?, fusions = fusions + ?, "
+        "drafts = drafts + ?, launched = launched + ? WHERE work_map_id = ?",
+        [(n, f, d, l, m) for m, n, f, d, l in maps],
+    )
+    db.executemany(
+        "INSERT INTO work_map_devices (work_map_id, device_id, n) VALUES (?, ?, ?) "
+        "ON CONFLICT(work_map_id, device_id) DO UPDATE SET n = n + excluded.n",
+        devs,
+    )
@@ -0,0 +1,269 @@
+
+"""Modo ASGI opcional (requirements-async.txt).
+
+    uvicorn asgi:app --workers 2
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+
+As rotas de I/O lento são atendidas direto no event loop, sem prender uma
+thread por conexão: pedaços do upload retomável (PUT/PATCH /api/uploads/<id>),
+download de fotos (/uploads/<arquivo>) e de backups (/admin/backup/download/...)
+e o download de backup por URL (POST /admin/backup/fetch, via httpx).
+O SQLite é acessado com aiosqlite e o disco com asyncio.to_thread.
+Todas as outras rotas seguem para o Flask pelo adaptador WSGI (a2wsgi).
+"""
+from urllib.parse import parse_qs
+import asyncio
+import json
+import mimetypes
+import os
+import re
+
+import aiosqlite
+import httpx
+from a2wsgi import WSGIMiddleware
+from werkzeug.http import dump_cookie, parse_cookie
+from werkzeug.security import safe_join
+
+import app as app_module
+from app import app as flask_app, UPLOAD_FOLDER
+from backup_bp import fetch_filename
+from upload_bp import CHUNK_SIZE
+
+READ_BUF = 256 * 1024
+WRITE_BUF = 1024 * 1024
+MAX_FORM_BYTES = 64 * 1024
+FETCH_TIMEOUT = 60
+
+# Pool de threads próprio: o WsgiToAsgi do asgiref roda tudo numa única thread
+wsgi = WSGIMiddleware(flask_app, workers=int(os.environ.get("ASGI_WSGI_THREADS", "10")))
+
+
+# --- Sessão do Flask (cookie assinado) lida e gravada fora do Flask
+def _serializer():
+    return flask_app.session_interface.get_signing_serializer(flask_app)
+
+
+def load_session(scope):
+    cookies = parse_cookie(dict(scope["headers"]).get(b"cookie", b"").decode("latin-1"))
+    raw = cookies.get(flask_app.config["SESSION_COOKIE_NAME"])
+    if not raw:
+        return {}
+    try:
+        return dict(_serializer().loads(raw, max_age=int(flask_app.permanent_session_lifetime.total_seconds())))
+    except Exception:
+        return {}
+
+
+def session_cookie(sess):
+    cfg = flask_app.config
+    return dump_cookie(
+        cfg["SESSION_COOKIE_NAME"], _serializer().dumps(sess),
+        path=cfg["SESSION_COOKIE_PATH"] or "/", domain=cfg["SESSION_COOKIE_DOMAIN"] or None,
+        secure=cfg["SESSION_COOKIE_SECURE"], httponly=cfg["SESSION_COOKIE_HTTPONLY"],
+        samesite=cfg["SESSION_COOKIE_SAMESITE"],
+    )
+
+
+def flash(sess, message, category):
+    sess.setdefault("_flashes", []).append((category, message))
+
+
+# --- Respostas
+async def send_response(send, status, body=b"", headers=()):
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (k.encode("latin-1"), str(v).encode("latin-1")) for k, v in headers
+    ] + [(b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(send, status, data, headers=()):
+    await send_response(send, status, json.dumps(data).encode(), [("Content-Type", "application/json"), *headers])
+
+
+async def redirect(send, location, sess=None):
+    headers = [("Location", location)]
+    if sess is not None:
+        headers.append(("Set-Cookie", session_cookie(sess)))
+    await send_response(send, 302, b"", headers)
+
+
+async def send_file(scope, send, path, download_name=None):
+    size = os.path.getsize(path)
+    headers = [
+        (b"content-type", (mimetypes.guess_type(path)[0] or "application/octet-stream").encode()),
+        (b"content-length", str(size).encode()),
+    ]
+    if download_name:
+        headers.append((b"content-disposition", f'attachment; filename="{download_name}"'.encode("latin-1", "replace")))
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+    if scope["method"] == "HEAD":
+        await send({"type": "http.response.body", "body": b""})
+        return
+    with open(path, "rb") as f:
+        while True:
+            buf = await asyncio.to_thread(f.read, READ_BUF)
+            await send({"type": "http.response.body", "body": buf, "more_body": bool(buf)})
+            if not buf:
+                break
+
+
+async def read_body(receive, limit):
+    body = b""
+    while True:
+        msg = await receive()
+        body += msg.get("body", b"")
+        if len(body) > limit:
+            return None
+        if not msg.get("more_body"):
+            return body
+
+
+# --- Handlers nativos
+async def serve_upload(scope, receive, send, filename):
+    if "user_id" not in load_session(scope):
+        return await redirect(send, "/login")
+    path = safe_join(UPLOAD_FOLDER, filename)
+    if path is None or not os.path.isfile(path):
+        return await send_response(send, 404, b"Not Found")
+    await send_file(scope, send, path)
+
+
+def _backup_dir():
+    return flask_app.config.get("BACKUP_UPLOAD_FOLDER", os.path.join(flask_app.root_path, "backups"))
+
+
+async def serve_backup(scope, receive, send, filename):
+    sess = load_session(scope)
+    if not sess.get("is_admin"):
+        return await redirect(send, "/login")
+    path = safe_join(_backup_dir(), filename)
+    if path is None or not os.path.isfile(path):
+        return await send_response(send, 404, b"Not Found")
+    await send_file(scope, send, path, download_name=os.path.basename(path))
+
+
+async def fetch_backup(scope, receive, send):
+    """Mesmo fluxo de backup_bp.fetch, mas o download remoto não ocupa thread."""
+    sess = load_session(scope)
+    if not sess.get("is_admin"):
+        return await redirect(send, "/login")
+    body = await read_body(receive, MAX_FORM_BYTES)
+    url = (parse_qs((body or b"").decode("utf-8", "replace")).get("url") or [""])[0].strip()
+    if not url:
+        flash(sess, "Informe uma URL direta para o arquivo de backup.", "warning")
+        return await redirect(send, "/admin/backup/", sess)
+    backup_dir = _backup_dir()
+    os.makedirs(backup_dir, exist_ok=True)
+    dest = os.path.join(backup_dir, fetch_filename(url))
+    part = dest + ".part"
+    try:
+        async with httpx.AsyncClient(timeout=FETCH_TIMEOUT, follow_redirects=True) as client:
+            async with client.stream("GET", url) as r:
+                r.raise_for_status()
+                with open(part, "wb") as f:
+                    async for chunk in r.aiter_bytes(WRITE_BUF):
+                        await asyncio.to_thread(f.write, chunk)
+        os.replace(part, dest)
+        flash(sess, f"Arquivo baixado para: {os.path.basename(dest)}", "success")
+    except Exception as e:
+        flask_app.logger.exception("Falha ao baixar por URL: %s", e)
+        if os.path.exists(part):
+            os.remove(part)
+        flash(sess, f"Falha ao baixar por URL: {e}", "danger")
+    await redirect(send, "/admin/backup/", sess)
+
+
+def _upload_state(row):
+    return {
+        "upload_id": row["id"],
+        "offset": row["received"],
+        "size": row["total_size"],
+        "chunk_size": CHUNK_SIZE,
+        "complete": row["completed_at"] is not None,
+    }
+
+
+async def upload_chunk(scope, receive, send, upload_id):
+    """Versão assíncrona de upload_bp.upload_chunk (mesmas regras de offset e tamanho)."""
+    sess = load_session(scope)
+    if "user_id" not in sess:
+        return await redirect(send, "/login")
+    headers = dict(scope["headers"])
+    query = parse_qs(scope.get("query_string", b"").decode())
+    try:
+        offset = int((query.get("offset") or [headers.get(b"upload-offset", b"").decode()])[0])
+    except ValueError:
+        offset = None
+    try:
+        declared = int(headers[b"content-length"]) if b"content-length" in headers else None
+    except ValueError:
+        declared = None
+    async with aiosqlite.connect(app_module.DB_PATH) as db:
+        db.row_factory = aiosqlite.Row
+        sql = "SELECT * FROM upload_sessions WHERE id=? AND user_id=?"
+        async with db.execute(sql, (upload_id, sess["user_id"])) as cur:
+            row = await cur.fetchone()
+        if not row:
+            return await send_json(send, 404, {"error": "sessão não encontrada"})
+        if row["completed_at"] is not None:
+            return await send_json(send, 409, _upload_state(row))
+        if offset is None or offset < 0 or offset > row["received"]:
+            return await send_json(send, 409, {"error": "offset inválido", "offset": row["received"]},
+                                   [("Upload-Offset", row["received"])])
+        # Corpo chunked não traz Content-Length: o limite vem da sessão, não do header
+        limit = min(CHUNK_SIZE, row["total_size"] - offset)
+        if declared is not None and declared > limit:
+            return await send_json(send, 413, {"error": "pedaço maior que o permitido"})
+        written = 0
+        too_big = False
+        with open(row["final_path"] + ".part", "r+b") as f:
+            f.seek(offset)
+            buf = bytearray()
+            more = True
+            while more:
+                msg = await receive()
+                if msg["type"] == "http.disconnect":
+                    break
+                buf += msg.get("body", b"")
+                more = msg.get("more_body", False)
+                if written + len(buf) > limit:
+                    too_big = True
+                    break
+                if len(buf) >= WRITE_BUF or not more:
+                    await asyncio.to_thread(f.write, bytes(buf))
+                    written += len(buf)
+                    buf.clear()
+        if too_big:
+            # `received` não avança: o cliente reenvia a partir do mesmo offset
+            return await send_json(send, 413, {"error": "pedaço maior que o permitido"})
+        received = max(row["received"], offset + written)
+        await db.execute("UPDATE upload_sessions SET received=? WHERE id=?", (received, upload_id))
+        await db.commit()
+        async with db.execute(sql, (upload_id, sess["user_id"])) as cur:
+            row = await cur.fetchone()
+    await send_json(send, 200, _upload_state(row), [("Upload-Offset", received)])
+
+
+ROUTES = [
+    ({"PUT", "PATCH"}, re.compile(r"^/api/uploads/(?P<upload_id>[0-9a-f]+)$"), upload_chunk),
+    ({"GET", "HEAD"}, re.compile(r"^/uploads/(?P<filename>.+)$"), serve_upload),
+    ({"GET", "HEAD"}, re.compile(r"^/admin/backup/download/(?P<filename>.+)$"), serve_backup),
+    ({"POST"}, re.compile(r"^/admin/backup/fetch$"), fetch_backup),
+]
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            msg = await receive()
+            if msg["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif msg["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] == "http":
+        for methods, pattern, handler in ROUTES:
+            m = pattern.match(scope["path"])
+            if m and scope["method"] in methods:
+                return await handler(scope, receive, send, **m.groupdict())
+    return await wsgi(scope, receive, send)
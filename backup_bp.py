@@ -11,6 +11,8 @@ import tempfile
 import threading
 import signal
 
+import parallel_zip
+
 backup_bp = Blueprint("backup_bp", __name__, url_prefix="/admin/backup")
 
 ALLOWED_DB_EXT = {".db", ".sqlite", ".sqlite3", ".sql"}
@@ -90,20 +92,25 @@ def build_full_backup_zip(dest_folder, label="full"):
         "version": 1,
     }
 
-    with zipfile.ZipFile(out_zip, "w", compression=zipfile.ZIP_DEFLATED) as z:
-        z.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
-
-        if os.path.exists(db_path):
-            z.write(db_path, arcname="db/app.db")
+    members = [("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"))]
+    if os.path.exists(db_path):
+        members.append(("db/app.db", db_path))
+    # A réplica de relatórios (replica.py) é derivada do app.db: fica fora do backup
+    replica = current_app.extensions.get("replica")
+    skip = {replica.path} if replica is not None else set()
+    for d in data_dirs:
+        base = os.path.basename(d.rstrip(os.sep)) or "files"
+        for root, _, files in os.walk(d):
+            for f in files:
+                full = os.path.join(root, f)
+                if full in skip:
+                    continue
+                rel = os.path.relpath(full, d)
+                members.append((os.path.join("files", base, rel), full))
 
-        for d in data_dirs:
-            base = os.path.basename(d.rstrip(os.sep)) or "files"
-            for root, _, files in os.walk(d):
-                for f in files:
-                    full = os.path.join(root, f)
-                    rel = os.path.relpath(full, d)
-                    arc = os.path.join("files", base, rel)
-                    z.write(full, arcname=arc)
+    # Compressão em paralelo (pool de processos), limitada pelas vagas globais de exportação
+    with parallel_zip.export_slot():
+        parallel_zip.build_zip(out_zip, members)
 
     return out_zip
 
@@ -200,7 +207,11 @@ def restore_from_full_zip(zip_path, merge_files=True):
 @backup_bp.route("/", methods=["GET"])
 def index():
     backup_folder = get_backup_dir()
-    files = [f for f in sorted(os.listdir(backup_folder)) if os.path.isfile(os.path.join(backup_folder, f))]
+    # Ignora arquivos ainda em construção (uploads em andamento, ZIPs sendo montados)
+    files = [
+        f for f in sorted(os.listdir(backup_folder))
+        if os.path.isfile(os.path.join(backup_folder, f)) and not f.endswith((".part", ".deflate"))
+    ]
     return render_template("admin/backup.html", files=files, db_path=get_db_path())
 
 
@@ -234,6 +245,8 @@ def create_full():
     try:
         zpath = build_full_backup_zip(backup_folder, label="full")
         flash(f"Backup completo criado: {os.path.basename(zpath)}", "success")
+    except parallel_zip.ExportBusy:
+        flash("Outra exportação está em andamento. Tente novamente em instantes.", "warning")
     except Exception as e:
         current_app.logger.exception("Erro ao criar backup completo: %s", e)
         flash(f"Falha ao criar backup completo: {e}", "danger")
@@ -308,6 +321,10 @@ def restore():
         else:
             flash("Extensão não suportada.", "danger")
             return redirect(url_for("backup_bp.index"))
+    except parallel_zip.ExportBusy:
+        # O backup de segurança não conseguiu vaga: nada foi restaurado
+        flash("Outra exportação está em andamento. Tente novamente em instantes.", "warning")
+        return redirect(url_for("backup_bp.index"))
     except Exception as e:
         current_app.logger.exception("Falha na restauração: %s", e)
         flash(f"Falha na restauração: {e}", "danger")
@@ -340,6 +357,21 @@ def restore():
 
 
 # === Upload por URL (contorna limite 413) ===
+
+def fetch_filename(url):
+    """Nome local (com timestamp) para um backup baixado por URL."""
+    # nome automático
+    ts = time.strftime("%Y%m%d-%H%M%S")
+    # tenta inferir nome
+    fname = url.split("/")[-1] or "backup.zip"
+    if "?" in fname:
+        fname = fname.split("?")[0]
+    if not any(fname.lower().endswith(ext) for ext in (".zip",".db",".sqlite",".sqlite3",".sql")):
+        # força .zip como padrão
+        fname = fname + ".zip"
+    return f"{ts}__{fname}"
+
+
 @backup_bp.route("/fetch", methods=["POST"])
 def fetch():
     url = request.form.get("url", "").strip()
@@ -350,16 +382,7 @@ def fetch():
         import requests
         backup_dir = get_backup_dir()
         os.makedirs(backup_dir, exist_ok=True)
-        # nome automático
-        ts = time.strftime("%Y%m%d-%H%M%S")
-        # tenta inferir nome
-        fname = url.split("/")[-1] or "backup.zip"
-        if "?" in fname:
-            fname = fname.split("?")[0]
-        if not any(fname.lower().endswith(ext) for ext in (".zip",".db",".sqlite",".sqlite3",".sql")):
-            # força .zip como padrão
-            fname = fname + ".zip"
-        dest = os.path.join(backup_dir, f"{ts}__{fname}")
+        dest = os.path.join(backup_dir, fetch_filename(url))
         # stream download
         with requests.get(url, stream=True, timeout=60) as r:
             r.raise_for_status()
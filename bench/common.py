@@ -0,0 +1,130 @@
+"""Utilitários compartilhados pelos cenários de benchmark."""
+import os
+import resource
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+
+def setup_env(data_dir):
+    """Aponta o app para uma pasta de dados isolada antes de importá-lo."""
+    os.makedirs(data_dir, exist_ok=True)
+    os.environ["DATA_DIR"] = data_dir
+    os.environ.setdefault("SQLITE_PATH", os.path.join(data_dir, "app.db"))
+    os.environ.setdefault("UPLOAD_FOLDER", os.path.join(data_dir, "uploads"))
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
+
+
+def load_app(data_dir):
+    setup_env(data_dir)
+    import app as appmod
+    # app.py fixa DB_PATH ao lado do código; o benchmark usa o banco gerado
+    appmod.DB_PATH = os.environ["SQLITE_PATH"]
+    # Fora de DATA_DIR: senão o backup completo incluiria a si mesmo
+    appmod.app.config["BACKUP_UPLOAD_FOLDER"] = data_dir.rstrip(os.sep) + "-backups"
+    return appmod
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def peak_rss_mb():
+    # ru_maxrss: KB no Linux, bytes no macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    div = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return max(rss, rss_children) / div
+
+
+def process_tree_peak_rss_mb(pid):
+    """Soma do VmHWM (pico de RSS) de `pid` e de todos os descendentes, via /proc.
+
+    Serve para o gunicorn ainda em execução (master + workers), que não entra em
+    RUSAGE_CHILDREN antes de terminar. None fora do Linux.
+    """
+    try:
+        names = [n for n in os.listdir("/proc") if n.isdigit()]
+    except OSError:
+        return None
+    children = {}
+    for n in names:
+        try:
+            with open(f"/proc/{n}/stat") as f:
+                # "pid (comm) state ppid ..."; comm pode ter espaços
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(n))
+    total_kb, stack = 0, [pid]
+    while stack:
+        p = stack.pop()
+        stack.extend(children.get(p, ()))
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return total_kb / 1024
+
+
+class Timer:
+    """Acumula latências de um cenário e produz a linha do relatório."""
+
+    def __init__(self, name):
+        self.name = name
+        self.samples = []
+        self.errors = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def measure(self, fn):
+        t0 = time.perf_counter()
+        ok = fn()
+        self.samples.append(time.perf_counter() - t0)
+        if ok is False:
+            self.errors += 1
+
+    def stop(self):
+        self.finished = time.perf_counter()
+        return self
+
+    def summary(self):
+        s = sorted(self.samples)
+        wall = (self.finished or time.perf_counter()) - self.started
+        return {
+            "scenario": self.name,
+            "n": len(s),
+            "errors": self.errors,
+            "p50_ms": percentile(s, 50) * 1000,
+            "p95_ms": percentile(s, 95) * 1000,
+            "p99_ms": percentile(s, 99) * 1000,
+            "throughput_rps": len(s) / wall if wall > 0 else 0.0,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+
+def print_report(rows, out=None):
+    header = f"{'cenário':<28}{'n':>7}{'erros':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'RSS MB':>9}"
+    lines = [header, "-" * len(header)]
+    for r in rows:
+        lines.append(
+            f"{r['scenario']:<28}{r['n']:>7}{r['errors']:>7}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+            f"{r['p99_ms']:>10.1f}{r['throughput_rps']:>10.1f}{r['peak_rss_mb']:>9.0f}"
+        )
+    text = "\n".join(lines)
+    print(text)
+    if out:
+        with open(out, "w") as f:
+            f.write(text + "\n")
@@ -0,0 +1,107 @@
+"""Gera dados sintéticos para benchmark.
+
+Exemplo:
+    python bench/generate.py --data-dir /tmp/splice-bench --records 100000 --photo-files 2000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+
+from common import load_app
+
+BATCH = 20000
+# JPEG mínimo válido (1x1); o resto do arquivo é preenchimento para simular o tamanho real
+_JPEG_HEAD = bytes.fromhex(
+    "ffd8ffe000104a46494600010100000100010000ffdb004300080606070605080707070909080a0c140d0c0b0b0c1912130f"
+)
+
+
+def write_photo_files(upload_dir, count, size_kb):
+    os.makedirs(upload_dir, exist_ok=True)
+    names = []
+    pad = os.urandom(max(0, size_kb * 1024 - len(_JPEG_HEAD) - 2))
+    for i in range(count):
+        name = f"bench_{i:06d}.jpg"
+        path = os.path.join(upload_dir, name)
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(_JPEG_HEAD + pad + b"\xff\xd9")
+        names.append(name)
+    return names
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--data-dir", default="/tmp/splice-bench")
+    ap.add_argument("--users", type=int, default=50)
+    ap.add_argument("--maps", type=int, default=20)
+    ap.add_argument("--records", type=int, default=10000, help="10k a 5M")
+    ap.add_argument("--devices", type=int, default=5000, help="nomes de dispositivo distintos")
+    ap.add_argument("--photos-per-record", type=float, default=1.5, help="média de fotos por registro")
+    ap.add_argument("--photo-files", type=int, default=1000, help="arquivos físicos (reutilizados entre registros)")
+    ap.add_argument("--photo-kb", type=int, default=200)
+    ap.add_argument("--days", type=int, default=365)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    rnd = random.Random(args.seed)
+    appmod = load_app(args.data_dir)
+    appmod.init_db()
+    appmod.ensure_schema()
+    t0 = time.time()
+
+    db = sqlite3.connect(appmod.DB_PATH)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=OFF")
+    with db:
+        # Um hash por usuário (salt próprio), como em produção
+        db.executemany(
+            "INSERT OR IGNORE INTO users (username, password_hash, is_admin) VALUES (?, ?, 0)",
+            [(f"tech{i:04d}", appmod.hash_password("bench123")) for i in range(args.users)],
+        )
+        db.executemany(
+            "INSERT INTO work_maps (title, filename) VALUES (?, ?)",
+            [(f"Mapa {i:03d}", f"bench_map_{i:03d}.pdf") for i in range(args.maps)],
+        )
+    user_ids = [r[0] for r in db.execute("SELECT id FROM users WHERE username LIKE 'tech%'")]
+    map_ids = [r[0] for r in db.execute("SELECT id FROM work_maps")]
+    with db:
+        db.executemany(
+            "INSERT OR IGNORE INTO user_work_map_access (user_id, work_map_id) VALUES (?, ?)",
+            [(u, m) for u in user_ids for m in rnd.sample(map_ids, min(3, len(map_ids)))],
+        )
+
+    photo_names = write_photo_files(appmod.UPLOAD_FOLDER, args.photo_files, args.photo_kb)
+    start_ts = time.time() - args.days * 86400
+    next_id = (db.execute("SELECT COALESCE(MAX(id), 0) FROM records").fetchone()[0]) + 1
+    done = 0
+    while done < args.records:
+        n = min(BATCH, args.records - done)
+        recs, photos = [], []
+        for i in range(n):
+            rid = next_id + i
+            ts = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(start_ts + rnd.random() * args.days * 86400))
+            recs.append((
+                rid, rnd.choice(user_ids), f"OTE-{rnd.randrange(args.devices):05d}", rnd.randint(1, 48),
+                ts, "launched" if rnd.random() < 0.6 else "draft", rnd.choice(map_ids),
+            ))
+            k = int(args.photos_per_record) + (1 if rnd.random() < args.photos_per_record % 1 else 0)
+            for _ in range(min(k, appmod.MAX_FILES_PER_RECORD)):
+                photos.append((rid, rnd.choice(photo_names)))
+        with db:
+            db.executemany(
+                "INSERT INTO records (id, user_id, device_name, fusion_count, created_at, status, work_map_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", recs)
+            db.executemany("INSERT INTO photos (record_id, filename) VALUES (?, ?)", photos)
+        next_id += n
+        done += n
+        print(f"  {done}/{args.records} registros", flush=True)
+    db.execute("PRAGMA journal_mode=DELETE")
+    db.close()
+    print(f"OK em {time.time() - t0:.1f}s -> {appmod.DB_PATH} (senha dos técnicos: bench123)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Carga concorrente contra um gunicorn local com vários workers.
+
+Exemplo:
+    python bench/load_test.py --data-dir /tmp/splice-bench --workers 4 --clients 16 --duration 30
+"""
+import argparse
+import http.cookiejar
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from common import BENCH_DIR, Timer, peak_rss_mb, print_report, process_tree_peak_rss_mb
+
+MIX = {
+    # rota: peso
+    "/": 6,
+    "/new": 2,
+    "/admin/reports_data.json": 2,
+    "/admin/reports": 1,
+}
+
+
+def _opener(base, username, password):
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    body = urllib.parse.urlencode({"username": username, "password": password}).encode()
+    opener.open(base + "/login", data=body, timeout=30).read()
+    return opener
+
+
+def _wait_ready(base, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base + "/login", timeout=2).read()
+            return True
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.3)
+    return False
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--data-dir", default="/tmp/splice-bench")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--threads", type=int, default=1)
+    ap.add_argument("--clients", type=int, default=16)
+    ap.add_argument("--duration", type=float, default=30)
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    env = dict(os.environ, BENCH_DATA_DIR=args.data_dir, PYTHONPATH=BENCH_DIR)
+    base = f"http://127.0.0.1:{args.port}"
+    cmd = [sys.executable, "-m", "gunicorn", "wsgi_bench:app", "-b", f"127.0.0.1:{args.port}",
+           "-w", str(args.workers), "--threads", str(args.threads), "--timeout", "120", "--log-level", "warning"]
+    server = subprocess.Popen(cmd, cwd=BENCH_DIR, env=env)
+    try:
+        if not _wait_ready(base):
+            raise SystemExit("gunicorn não respondeu")
+        timers = {path: Timer(path) for path in MIX}
+        login_timer = Timer("login")
+        lock = threading.Lock()
+        stop_at = time.time() + args.duration
+        weighted = [p for p, w in MIX.items() for _ in range(w)]
+
+        def client(idx):
+            t0 = time.perf_counter()
+            tech = _opener(base, f"tech{idx % 50:04d}", "bench123")
+            admin = _opener(base, "admin", os.environ.get("BENCH_ADMIN_PASSWORD", "admin123"))
+            with lock:
+                login_timer.samples.append(time.perf_counter() - t0)
+            i = idx
+            while time.time() < stop_at:
+                path = weighted[i % len(weighted)]
+                i += 1
+                opener = admin if path.startswith("/admin") else tech
+                t1 = time.perf_counter()
+                ok = True
+                try:
+                    opener.open(base + path, timeout=120).read()
+                except (urllib.error.URLError, ConnectionError):
+                    ok = False
+                with lock:
+                    timers[path].samples.append(time.perf_counter() - t1)
+                    if not ok:
+                        timers[path].errors += 1
+
+        # Pico de memória do servidor (master + workers), amostrado enquanto roda:
+        # workers reciclados no meio do teste também contam
+        server_peak = [None]
+        done = threading.Event()
+
+        def sample_rss():
+            while True:
+                mb = process_tree_peak_rss_mb(server.pid)
+                if mb is not None:
+                    server_peak[0] = max(server_peak[0] or 0.0, mb)
+                if done.wait(1.0):
+                    return
+
+        sampler = threading.Thread(target=sample_rss, daemon=True)
+        sampler.start()
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        done.set()
+        sampler.join()
+        rows = [login_timer.stop().summary()] + [t.stop().summary() for t in timers.values()]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+    # Sem /proc: depois do wait() o gunicorn (e os workers que ele esperou) entra em RUSAGE_CHILDREN
+    rss = server_peak[0] if server_peak[0] is not None else peak_rss_mb()
+    for r in rows:
+        r["peak_rss_mb"] = rss
+    print_report(rows, args.out)
+
+
+if __name__ == "__main__":
+    main()
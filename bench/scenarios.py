@@ -0,0 +1,114 @@
+"""Cenários de benchmark com o test client do Flask (processo único).
+
+Exemplo:
+    python bench/generate.py --data-dir /tmp/splice-bench --records 100000
+    python bench/scenarios.py --data-dir /tmp/splice-bench --repeat 20 --out bench_output.txt
+"""
+import argparse
+import io
+from contextlib import closing
+import json
+import os
+import time
+
+from common import load_app, Timer, print_report
+
+SCENARIOS = ["login_burst", "dashboard", "new_record", "reports_json", "reports_xlsx",
+             "photos_zip", "full_backup", "restore"]
+
+
+def _login(client, username, password):
+    r = client.post("/login", data={"username": username, "password": password})
+    return r.status_code == 302 and "/login" not in (r.location or "")
+
+
+def run(appmod, names, repeat, start, end):
+    app = appmod.app
+    admin = app.test_client()
+    _login(admin, "admin", os.environ.get("BENCH_ADMIN_PASSWORD", "admin123"))
+    tech = app.test_client()
+    _login(tech, "tech0000", "bench123")
+    params = {"start": start, "end": end}
+    results = []
+
+    def get(client, url, **kw):
+        r = client.get(url, **kw)
+        r.get_data()
+        r.close()
+        return r.status_code == 200
+
+    for name in names:
+        t = Timer(name)
+        if name == "login_burst":
+            for i in range(repeat):
+                c = app.test_client()
+                t.measure(lambda: _login(c, f"tech{i % 50:04d}", "bench123"))
+        elif name == "dashboard":
+            for _ in range(repeat):
+                t.measure(lambda: get(tech, "/"))
+        elif name == "new_record":
+            with closing(appmod.get_db()) as db:
+                row = db.execute(
+                    "SELECT work_map_id FROM user_work_map_access a JOIN users u ON u.id=a.user_id "
+                    "WHERE u.username='tech0000' LIMIT 1").fetchone()
+            wm_id = row[0] if row else None
+            for i in range(repeat):
+                data = {
+                    "device_name": f"BENCH-{i}", "fusion_count": "12", "work_map_id": str(wm_id),
+                    "photos": [(io.BytesIO(os.urandom(150 * 1024)), f"bench_{i}_{k}.jpg") for k in range(3)],
+                }
+                t.measure(lambda: tech.post("/new", data=data, content_type="multipart/form-data").status_code == 302)
+        elif name == "reports_json":
+            for _ in range(repeat):
+                t.measure(lambda: get(admin, "/admin/reports_data.json", query_string=params))
+        elif name == "reports_xlsx":
+            for _ in range(max(1, repeat // 5)):
+                t.measure(lambda: get(admin, "/admin/reports.xlsx", query_string=params))
+        elif name == "photos_zip":
+            with closing(appmod.get_db()) as db:
+                devices = [r[0] for r in db.execute(
+                    "SELECT device_name FROM records GROUP BY device_name ORDER BY COUNT(*) DESC LIMIT 50")]
+            for _ in range(max(1, repeat // 5)):
+                t.measure(lambda: admin.post("/admin/photos.zip", data=dict(params, devices=devices)).status_code == 200)
+        elif name in ("full_backup", "restore"):
+            import backup_bp
+            with app.test_request_context():
+                folder = backup_bp.get_backup_dir()
+                if name == "full_backup":
+                    t.measure(lambda: bool(backup_bp.build_full_backup_zip(folder, label="bench")))
+                else:
+                    zips = sorted(f for f in os.listdir(folder) if f.startswith("bench-"))
+                    if zips:
+                        # Chama a função direto: a rota reinicia o processo após restaurar
+                        t.measure(lambda: backup_bp.restore_from_full_zip(os.path.join(folder, zips[-1])) or True)
+        results.append(t.stop().summary())
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--data-dir", default="/tmp/splice-bench")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--only", default=",".join(SCENARIOS), help="lista separada por vírgula")
+    ap.add_argument("--start", default="")
+    ap.add_argument("--end", default="")
+    ap.add_argument("--out", default=None, help="grava o relatório em texto")
+    ap.add_argument("--json", default=None, help="grava o relatório em JSON (para comparar execuções)")
+    args = ap.parse_args()
+
+    appmod = load_app(args.data_dir)
+    names = [n.strip() for n in args.only.split(",") if n.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        ap.error(f"cenários desconhecidos: {', '.join(sorted(unknown))}")
+    t0 = time.time()
+    rows = run(appmod, names, args.repeat, args.start, args.end)
+    print_report(rows, args.out)
+    print(f"total {time.time() - t0:.1f}s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
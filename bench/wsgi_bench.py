@@ -0,0 +1,6 @@
+"""Entrada WSGI usada pelo load_test.py: mesmo app, apontado para o banco gerado."""
+import os
+
+from common import load_app
+
+app = load_app(os.environ.get("BENCH_DATA_DIR", "/tmp/splice-bench")).app
@@ -0,0 +1,154 @@
+
+"""Single-flight para relatórios: pedidos idênticos simultâneos calculam uma vez só.
+
+No fim do turno vários admins abrem `/admin/reports` com o mesmo filtro ao mesmo
+tempo; em vez de cada requisição refazer as mesmas agregações, `flights.do(nome,
+chave, calcular)` deixa a primeira calcular e as outras esperam e reaproveitam o
+resultado:
+
+- no mesmo worker, as threads esperam um Event e recebem o mesmo objeto;
+- entre workers do gunicorn, o líder segura um flock em
+  DATA_DIR/coalesce/<hash>.lock e grava o resultado (pickle) ao lado; quem
+  encontra o lock ocupado espera e lê o arquivo, desde que ele tenha sido
+  terminado depois que chegou (nunca um resultado de antes do pedido).
+
+Cálculos feitos e poupados vão para /admin/metrics como
+`splice_report_computations_total{report=..., result="computed|shared_local|shared_remote"}`.
+
+- REPORT_COALESCE=0 desliga (cada requisição calcula).
+- REPORT_COALESCE_WAIT: quanto esperar por um cálculo alheio antes de calcular
+  por conta própria (padrão 30 s).
+"""
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalescência só dentro do processo
+    fcntl = None
+
+COALESCE_ENABLED = os.environ.get("REPORT_COALESCE", "1") == "1"
+WAIT_SECONDS = float(os.environ.get("REPORT_COALESCE_WAIT", "30"))
+# Resultados gravados só servem a quem estava esperando; depois disso são lixo
+RESULT_TTL_SECONDS = 300
+
+
+class _Call:
+    __slots__ = ("done", "result", "ok")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.ok = False
+
+
+class SingleFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.result_dir = None
+        self.registry = None
+
+    def init_app(self, app, data_dir):
+        self.result_dir = os.path.join(data_dir, "coalesce")
+        self.registry = app.extensions.get("metrics")
+        app.extensions["coalesce"] = self
+
+    def _count(self, name, result):
+        if self.registry is not None:
+            self.registry.incr("splice_report_computations_total", report=name, result=result)
+
+    def do(self, name, key, compute):
+        """Resultado de `compute()` para (name, key); o resultado precisa ser picklável."""
+        if not COALESCE_ENABLED:
+            return compute()
+        digest = hashlib.sha1(repr((name, key)).encode()).hexdigest()
+        with self.lock:
+            call = self.calls.get(digest)
+            leader = call is None
+            if leader:
+                call = self.calls[digest] = _Call()
+        if not leader:
+            if call.done.wait(WAIT_SECONDS) and call.ok:
+                self._count(name, "shared_local")
+                return call.result
+            # Líder falhou ou demorou demais: calcula por conta própria
+            self._count(name, "computed")
+            return compute()
+        try:
+            call.result, how = self._across_workers(digest, compute)
+            call.ok = True
+            self._count(name, how)
+            return call.result
+        finally:
+            with self.lock:
+                self.calls.pop(digest, None)
+            call.done.set()
+
+    def _across_workers(self, digest, compute):
+        if fcntl is None or self.result_dir is None:
+            return compute(), "computed"
+        os.makedirs(self.result_dir, exist_ok=True)
+        path = os.path.join(self.result_dir, digest)
+        arrived = time.time()
+        deadline = time.monotonic() + WAIT_SECONDS
+        waited = False
+        with open(path + ".lock", "a") as f:
+            while True:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except OSError:
+                    if time.monotonic() >= deadline:
+                        return compute(), "computed"
+                    waited = True
+                    time.sleep(0.05)
+            try:
+                if waited:
+                    shared = self._read(path, arrived)
+                    if shared is not None:
+                        return shared[0], "shared_remote"
+                result = compute()
+                self._write(path, result)
+                return result, "computed"
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read(self, path, arrived):
+        try:
+            with open(path, "rb") as f:
+                finished, result = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return (result,) if finished >= arrived else None
+
+    def _write(self, path, result):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump((time.time(), result), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        self._sweep()
+
+    def _sweep(self):
+        now = time.time()
+        try:
+            for name in os.listdir(self.result_dir):
+                p = os.path.join(self.result_dir, name)
+                if not name.endswith(".lock") and now - os.path.getmtime(p) > RESULT_TTL_SECONDS:
+                    os.remove(p)
+        except OSError:
+            pass
+
+
+flights = SingleFlight()
+
+
+def init_app(app, data_dir):
+    flights.init_app(app, data_dir)
+    return flights
@@ -0,0 +1,114 @@
+
+"""Exportação colunar (Parquet e Arrow IPC) dos registros para análise.
+
+Os analistas leem direto no pandas/polars/DuckDB com os tipos certos
+(`created_at` como timestamp, contagens como inteiros), em vez de reinterpretar
+um CSV gigante. Cada registro vem com usuário, dispositivo canônico, mapa de
+trabalho e quantidade de fotos.
+
+As linhas saem do cursor do SQLite em lotes de EXPORT_BATCH_ROWS, viram um
+RecordBatch e são gravadas no arquivo antes do próximo lote: a memória fica em
+um lote, não na tabela inteira. O arquivo vai para um SpooledTemporaryFile
+(em memória até EXPORT_SPOOL_MB, depois em disco) e é enviado dali.
+
+Requer `pyarrow` (requirements-analytics.txt); sem ele as rotas respondem 501.
+"""
+import os
+import tempfile
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # exportação colunar indisponível
+    pa = None
+
+BATCH_ROWS = int(os.environ.get("EXPORT_BATCH_ROWS", "50000"))
+SPOOL_BYTES = int(os.environ.get("EXPORT_SPOOL_MB", "16")) * 1024 * 1024
+
+FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "registros.parquet"),
+    "arrow": ("application/vnd.apache.arrow.file", "registros.arrow"),
+}
+
+# (coluna, tipo Arrow); created_at chega como texto e é convertido por lote
+COLUMNS = [
+    ("id", "int64"),
+    ("user_id", "int64"),
+    ("username", "string"),
+    ("device_id", "int64"),
+    ("device_name", "string"),
+    ("fusion_count", "int32"),
+    ("status", "string"),
+    ("work_map_id", "int64"),
+    ("work_map", "string"),
+    ("photos", "int32"),
+    ("created_at", "timestamp"),
+]
+
+EXPORT_SQL = """
+    SELECT r.id, r.user_id, u.username, r.device_id, COALESCE(d.name, r.device_name) AS device_name,
+           r.fusion_count, COALESCE(r.status, 'draft') AS status, r.work_map_id, m.title AS work_map,
+           (SELECT COUNT(*) FROM photos p WHERE p.record_id = r.id) AS photos, r.created_at
+    FROM records r
+    JOIN users u ON u.id = r.user_id
+    LEFT JOIN devices d ON d.id = r.device_id
+    LEFT JOIN work_maps m ON m.id = r.work_map_id
+    {where_sql}
+    ORDER BY r.id
+"""
+
+
+def available():
+    return pa is not None
+
+
+def schema():
+    types = {"int64": pa.int64(), "int32": pa.int32(), "string": pa.string(), "timestamp": pa.timestamp("s")}
+    return pa.schema([(name, types[kind]) for name, kind in COLUMNS])
+
+
+def _batch(rows, sch):
+    columns = list(zip(*rows))
+    arrays = []
+    for i, field in enumerate(sch):
+        if pa.types.is_timestamp(field.type):
+            # "YYYY-MM-DD HH:MM:SS" (CURRENT_TIMESTAMP/sync/importação); inválido vira nulo
+            text = pa.array(columns[i], type=pa.string())
+            arrays.append(pc.strptime(text, format="%Y-%m-%d %H:%M:%S", unit="s", error_is_null=True))
+        else:
+            arrays.append(pa.array(columns[i], type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=sch)
+
+
+def write_records(db, where_sql, params, fmt, sink):
+    """Grava os registros do filtro em `sink` (Parquet ou Arrow IPC), lote a lote."""
+    sch = schema()
+    cur = db.execute(EXPORT_SQL.format(where_sql=where_sql), tuple(params))
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(sink, sch, compression="zstd")
+    else:
+        writer = pa.ipc.new_file(sink, sch)
+    total = 0
+    try:
+        while True:
+            rows = cur.fetchmany(BATCH_ROWS)
+            if not rows:
+                break
+            writer.write_batch(_batch(rows, sch))
+            total += len(rows)
+    finally:
+        writer.close()
+    return total
+
+
+def export_file(db, where_sql, params, fmt):
+    """Arquivo temporário (posicionado no início) com a exportação; o chamador fecha."""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    try:
+        write_records(db, where_sql, params, fmt, spool)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
@@ -0,0 +1,162 @@
+
+"""Compressão de respostas e arquivos estáticos com cache longo.
+
+- Respostas dinâmicas (HTML, JSON, CSV, CSS/JS...) acima de COMPRESS_MIN_BYTES
+  saem em brotli (se o pacote `brotli` estiver instalado) ou gzip, conforme o
+  Accept-Encoding do cliente. COMPRESS_ENABLED=0 desliga.
+- Arquivos de static/ ganham `?v=<hash do conteúdo>` no url_for('static', ...);
+  com o hash certo vão com Cache-Control de um ano (immutable). As versões
+  .gz/.br são geradas uma vez na inicialização em DATA_DIR/static_cache.
+"""
+from flask import request, send_file, send_from_directory
+import gzip
+import hashlib
+import mimetypes
+import os
+
+try:
+    import brotli
+except ImportError:  # só gzip
+    brotli = None
+
+COMPRESS_ENABLED = os.environ.get("COMPRESS_ENABLED", "1") == "1"
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("COMPRESS_LEVEL", "6"))
+BROTLI_QUALITY = 5
+STATIC_MAX_AGE = 365 * 24 * 3600
+COMPRESSIBLE_TYPES = {
+    "text/html", "text/css", "text/plain", "text/csv", "text/javascript",
+    "application/javascript", "application/json", "application/xml", "image/svg+xml",
+}
+# Conteúdo enviado pelos usuários também pode estar dentro de static/ (disco do Render)
+STATIC_SKIP_DIRS = {"uploads"}
+
+
+def _encodings():
+    """Codificações aceitas pelo cliente, em ordem de preferência."""
+    accepted = request.accept_encodings
+    out = []
+    if brotli is not None and accepted["br"]:
+        out.append("br")
+    if accepted["gzip"]:
+        out.append("gzip")
+    return out
+
+
+def _compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response):
+    if (
+        request.method == "HEAD"
+        or response.direct_passthrough
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_TYPES
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    encodings = _encodings()
+    if not encodings:
+        return response
+    response.set_data(_compress(data, encodings[0]))
+    response.headers["Content-Encoding"] = encodings[0]
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encodings[0]}", weak)
+    return response
+
+
+class StaticAssets:
+    """Manifesto {arquivo: hash} de static/ e variantes pré-comprimidas."""
+
+    def __init__(self, static_folder, cache_dir):
+        self.static_folder = static_folder
+        self.cache_dir = cache_dir
+        self.manifest = {}
+        self.variants = {}
+
+    def build(self):
+        if not self.static_folder or not os.path.isdir(self.static_folder):
+            return self
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for root, dirs, files in os.walk(self.static_folder):
+            if root == self.static_folder:
+                dirs[:] = [d for d in dirs if d not in STATIC_SKIP_DIRS]
+            for name in files:
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, self.static_folder).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    data = f.read()
+                digest = hashlib.sha256(data).hexdigest()[:12]
+                self.manifest[rel] = digest
+                mimetype = mimetypes.guess_type(name)[0]
+                if mimetype not in COMPRESSIBLE_TYPES or len(data) < COMPRESS_MIN_BYTES:
+                    continue
+                variants = {}
+                for encoding, ext in (("br", "br"), ("gzip", "gz")):
+                    if encoding == "br" and brotli is None:
+                        continue
+                    out = os.path.join(self.cache_dir, f"{digest}-{rel.replace('/', '_')}.{ext}")
+                    if not os.path.exists(out):
+                        # Vários workers podem gerar ao mesmo tempo: grava e renomeia
+                        tmp = f"{out}.{os.getpid()}.tmp"
+                        with open(tmp, "wb") as f:
+                            f.write(_compress(data, encoding))
+                        os.replace(tmp, out)
+                    variants[encoding] = out
+                self.variants[rel] = (mimetype, variants)
+        return self
+
+    def url_defaults(self, endpoint, values):
+        if endpoint == "static" and "v" not in values:
+            digest = self.manifest.get(values.get("filename"))
+            if digest:
+                values["v"] = digest
+
+    def serve(self, filename):
+        digest = self.manifest.get(filename)
+        if digest is None:
+            return send_from_directory(self.static_folder, filename)
+        mimetype, variants = self.variants.get(filename, (None, {}))
+        encoding = next((e for e in _encodings() if e in variants), None) if COMPRESS_ENABLED else None
+        if encoding:
+            response = send_file(variants[encoding], mimetype=mimetype, conditional=True)
+            response.headers["Content-Encoding"] = encoding
+        else:
+            response = send_from_directory(self.static_folder, filename)
+        if variants:
+            response.vary.add("Accept-Encoding")
+        if request.args.get("v") == digest:
+            response.cache_control.no_cache = None
+            response.cache_control.max_age = STATIC_MAX_AGE
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+        else:
+            # URL sem hash (ou de versão antiga): sempre revalida
+            response.cache_control.max_age = 0
+            response.cache_control.no_cache = True
+        return response
+
+
+def init_app(app, data_dir):
+    """Deve ser chamado depois de metrics.init_app para as métricas contarem os bytes comprimidos."""
+    assets = StaticAssets(app.static_folder, os.path.join(data_dir, "static_cache"))
+    try:
+        assets.build()
+    except OSError as e:
+        print("Pré-compressão de estáticos falhou:", e)
+    app.extensions["static_assets"] = assets
+    app.url_defaults(assets.url_defaults)
+    app.view_functions["static"] = assets.serve
+    if COMPRESS_ENABLED:
+        app.after_request(compress_response)
+    return assets
@@ -0,0 +1,114 @@
+
+"""Dimensão de dispositivos: nome canônico + id inteiro para `records.device_id`.
+
+O nome digitado no formulário continua em `records.device_name`; relatórios,
+filtros e o ZIP de fotos agrupam/filtram por `device_id` (indexado).
+
+Regras de casamento (chave em `devices.name_key`):
+- maiúsculas, sem acentos e sem espaços nas pontas;
+- espaços, "_", "." e "-" viram um único "-";
+- letras e números colados são separados ("OTE12" == "OTE-12");
+- zeros à esquerda de números são ignorados ("OTE-012" == "OTE-12");
+- prefixos de DEVICE_STRIP_PREFIXES (ex. "CX,CAIXA") são descartados
+  ("CX OTE-12" == "OTE-12").
+"""
+import os
+import re
+import unicodedata
+
+STRIP_PREFIXES = tuple(
+    p.strip().upper() for p in os.environ.get("DEVICE_STRIP_PREFIXES", "").split(",") if p.strip()
+)
+_re_sep = re.compile(r"[\s_.\-]+")
+_re_alnum = re.compile(r"(?<=[A-Z])(?=\d)|(?<=\d)(?=[A-Z])")
+_re_zeros = re.compile(r"(?<![\d])0+(?=\d)")
+
+
+def display_name(name):
+    """Nome para exibição: espaços colapsados, sem alterar a grafia."""
+    return " ".join((name or "").split())
+
+
+def device_key(name):
+    """Chave de casamento do nome digitado; "" se não sobrar nada."""
+    s = unicodedata.normalize("NFKD", display_name(name)).encode("ascii", "ignore").decode().upper()
+    s = _re_sep.sub("-", s).strip("-")
+    s = _re_alnum.sub("-", s)
+    parts = s.split("-")
+    while len(parts) > 1 and parts[0] in STRIP_PREFIXES:
+        parts.pop(0)
+    return _re_zeros.sub("", "-".join(parts))
+
+
+def ensure_devices_schema(cur):
+    """Cria a tabela/índices e migra `records` (chamado dentro de ensure_schema)."""
+    cur.execute("""CREATE TABLE IF NOT EXISTS devices (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        name_key TEXT NOT NULL UNIQUE,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )""")
+    cols = {row[1] for row in cur.execute("PRAGMA table_info(records)").fetchall()}
+    if "device_id" not in cols:
+        cur.execute("ALTER TABLE records ADD COLUMN device_id INTEGER REFERENCES devices(id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_records_device ON records(device_id)")
+    backfill_device_ids(cur)
+
+
+def backfill_device_ids(cur):
+    """Preenche `device_id` de registros antigos; pelo índice, só olha os que faltam.
+
+    Um UPDATE só, via tabela temporária nome digitado -> id, em vez de um por nome.
+    """
+    names = [r[0] for r in cur.execute(
+        "SELECT DISTINCT device_name FROM records WHERE device_id IS NULL AND device_name IS NOT NULL"
+    ).fetchall()]
+    if not names:
+        return 0
+    ids = device_ids(cur, names)
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS device_map (device_name TEXT PRIMARY KEY, device_id INTEGER)")
+    cur.execute("DELETE FROM device_map")
+    cur.executemany("INSERT INTO device_map VALUES (?, ?)", [(n, ids[n]) for n in names if ids.get(n)])
+    cur.execute("""
+        UPDATE records SET device_id = (SELECT device_id FROM device_map m WHERE m.device_name = records.device_name)
+        WHERE device_id IS NULL AND device_name IS NOT NULL
+    """)
+    n = cur.rowcount
+    cur.execute("DROP TABLE device_map")
+    return n
+
+
+def device_ids(db, names):
+    """{nome digitado: device_id}, criando os dispositivos que faltarem."""
+    by_key = {}
+    for name in names:
+        key = device_key(name)
+        if key:
+            by_key.setdefault(key, display_name(name))
+    if not by_key:
+        return {}
+    db.executemany(
+        "INSERT INTO devices (name, name_key) VALUES (?, ?) ON CONFLICT(name_key) DO NOTHING",
+        [(display, key) for key, display in by_key.items()],
+    )
+    found = {}
+    keys = list(by_key)
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        rows = db.execute(
+            f"SELECT id, name_key FROM devices WHERE name_key IN ({','.join('?' * len(chunk))})", chunk
+        ).fetchall()
+        found.update({r[1]: r[0] for r in rows})
+    return {name: found.get(device_key(name)) for name in names}
+
+
+def device_id(db, name):
+    """Id do dispositivo para um nome digitado (criando se for novo); None se vazio."""
+    return device_ids(db, [name]).get(name)
+
+
+def lookup_device_id(db, name):
+    """Como device_id, mas sem criar: para filtros digitados pelo usuário."""
+    key = device_key(name)
+    row = db.execute("SELECT id FROM devices WHERE name_key = ?", (key,)).fetchone() if key else None
+    return row[0] if row else None
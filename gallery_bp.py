@@ -0,0 +1,146 @@
+
+"""Galeria de fotos por dispositivo/usuário/período.
+
+- `/admin/gallery/photos.json`: paginação por chave (`before=<id da última foto>`),
+  ordenada da foto mais nova para a mais antiga; custo constante por página.
+- `/admin/gallery/thumb/<id>`: miniatura JPEG gerada na primeira visita
+  (Pillow, opcional) e guardada em DATA_DIR/thumbs; sem Pillow redireciona
+  para a foto original.
+"""
+from flask import Blueprint, render_template, request, redirect, url_for, jsonify, send_from_directory, abort
+from contextlib import closing
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # miniaturas desativadas; a galeria usa a foto original
+    Image = None
+
+from app import get_db, admin_required, UPLOAD_FOLDER, DATA_DIR
+from devices import lookup_device_id
+
+gallery_bp = Blueprint("gallery_bp", __name__, url_prefix="/admin/gallery")
+
+PAGE_SIZE = 60
+MAX_PAGE_SIZE = 200
+THUMB_PX = int(os.environ.get("GALLERY_THUMB_PX", "320"))
+THUMB_DIR = os.path.join(DATA_DIR, "thumbs", str(THUMB_PX))
+THUMB_MAX_AGE = 365 * 24 * 3600
+
+
+def _filters(db, args):
+    clauses = []
+    params = []
+    device = (args.get("device") or "").strip()
+    if device:
+        # Mesmas regras de casamento do cadastro ("ote 12" acha "OTE-12")
+        clauses.append("r.device_id = ?"); params.append(lookup_device_id(db, device))
+    user_id = args.get("user_id", type=int)
+    if user_id:
+        clauses.append("r.user_id = ?"); params.append(user_id)
+    # Comparação direta com created_at (sem date()) para o SQLite poder usar índice
+    start = (args.get("start") or "").strip()
+    if start:
+        clauses.append("r.created_at >= date(?)"); params.append(start)
+    end = (args.get("end") or "").strip()
+    if end:
+        clauses.append("r.created_at < date(?, '+1 day')"); params.append(end)
+    return clauses, params
+
+
+def query_photos(db, args, before=None, limit=PAGE_SIZE):
+    """Uma página de fotos com `p.id < before`; devolve (linhas, próximo cursor ou None)."""
+    clauses, params = _filters(db, args)
+    if before:
+        clauses.append("p.id < ?"); params.append(before)
+    where_sql = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+    rows = db.execute(
+        f"""
+        SELECT p.id, p.record_id, p.filename, COALESCE(d.name, r.device_name) AS device_name, r.created_at, u.username
+        FROM photos p
+        JOIN records r ON r.id = p.record_id
+        JOIN users u ON u.id = r.user_id
+        LEFT JOIN devices d ON d.id = r.device_id
+        {where_sql}
+        ORDER BY p.id DESC
+        LIMIT ?
+        """,
+        (*params, limit + 1),
+    ).fetchall()
+    cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+    return rows[:limit], cursor
+
+
+@gallery_bp.route("/")
+@admin_required
+def index():
+    with closing(get_db()) as db:
+        users = db.execute("SELECT id, username FROM users ORDER BY username ASC").fetchall()
+        devices = db.execute("SELECT name FROM devices ORDER BY name").fetchall()
+    return render_template(
+        "admin_gallery.html",
+        users=users,
+        devices=[d["name"] for d in devices],
+        device=request.args.get("device", ""),
+        selected_user_id=request.args.get("user_id", type=int),
+        start=request.args.get("start", ""),
+        end=request.args.get("end", ""),
+        page_size=PAGE_SIZE,
+    )
+
+
+@gallery_bp.route("/photos.json")
+@admin_required
+def photos_json():
+    limit = min(max(request.args.get("limit", PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    with closing(get_db()) as db:
+        rows, cursor = query_photos(db, request.args, request.args.get("before", type=int), limit)
+    return jsonify({
+        "photos": [
+            {
+                "id": r["id"],
+                "record_id": r["record_id"],
+                "device_name": r["device_name"],
+                "username": r["username"],
+                "created_at": r["created_at"],
+                "url": url_for("uploaded_file", filename=r["filename"]),
+                "thumb_url": url_for("gallery_bp.thumbnail", photo_id=r["id"]),
+                "record_url": url_for("view_record", record_id=r["record_id"]),
+            }
+            for r in rows
+        ],
+        "next": cursor,
+    })
+
+
+def _make_thumbnail(src, dest):
+    with Image.open(src) as im:
+        im = ImageOps.exif_transpose(im)
+        im.thumbnail((THUMB_PX, THUMB_PX))
+        tmp = f"{dest}.{os.getpid()}.tmp"
+        im.convert("RGB").save(tmp, "JPEG", quality=80, optimize=True)
+    os.replace(tmp, dest)
+
+
+@gallery_bp.route("/thumb/<int:photo_id>")
+@admin_required
+def thumbnail(photo_id):
+    with closing(get_db()) as db:
+        row = db.execute("SELECT filename FROM photos WHERE id=?", (photo_id,)).fetchone()
+    if not row:
+        abort(404)
+    name = f"{photo_id}.jpg"
+    if not os.path.exists(os.path.join(THUMB_DIR, name)):
+        src = os.path.join(UPLOAD_FOLDER, row["filename"])
+        if Image is None or not os.path.isfile(src):
+            return redirect(url_for("uploaded_file", filename=row["filename"]))
+        os.makedirs(THUMB_DIR, exist_ok=True)
+        try:
+            _make_thumbnail(src, os.path.join(THUMB_DIR, name))
+        except (OSError, ValueError):
+            return redirect(url_for("uploaded_file", filename=row["filename"]))
+    # ids de foto não são reaproveitados (AUTOINCREMENT): a miniatura nunca muda
+    resp = send_from_directory(THUMB_DIR, name, mimetype="image/jpeg", max_age=THUMB_MAX_AGE)
+    resp.cache_control.public = False
+    resp.cache_control.private = True
+    return resp
@@ -0,0 +1,55 @@
+
+"""Configuração do gunicorn (`gunicorn -c gunicorn.conf.py app:app`).
+
+- preload_app: o app.py é importado uma vez no master; o schema é criado/migrado
+  ali (when_ready) e os workers nascem por fork já com SCHEMA_OK. A thread de
+  backup diário (AUTO_BACKUP_DAILY=1) também fica só no master.
+- Workers gthread: WEB_CONCURRENCY processos (padrão 2×CPUs+1, até 8) com
+  GUNICORN_THREADS threads cada (padrão 4).
+- No gthread o heartbeat do worker não depende da requisição em andamento, então
+  exportações longas (ZIP, XLSX, backup) não são mortas pelo `timeout`; ele só
+  derruba workers travados. GUNICORN_TIMEOUT (padrão 60).
+- Reciclagem: cada worker reinicia após GUNICORN_MAX_REQUESTS requisições
+  (padrão 1000, com jitter) para conter crescimento de memória.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", str(min(8, multiprocessing.cpu_count() * 2 + 1))))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = max(1, max_requests // 10)
+
+# Heartbeat em memória: disco do Render pode ser lento para o fchmod a cada segundo
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG") or None
+errorlog = "-"
+
+
+def when_ready(server):
+    """Cria/migra o schema uma vez, antes do fork dos workers."""
+    if not preload_app:
+        return
+    import app
+    app.ensure_schema()
+    server.log.info("Schema verificado no master (SCHEMA_OK=%s)", app.SCHEMA_OK)
+
+
+def worker_exit(server, worker):
+    """Grava o último snapshot de métricas do worker que está saindo (reciclagem)."""
+    try:
+        import app
+        app.app.extensions["metrics"].flush()
+    except Exception:
+        pass
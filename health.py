@@ -0,0 +1,89 @@
+
+"""Health checks em cache, atualizados por uma thread em segundo plano.
+
+As sondas (/livez, /readyz, /healthz) só leem o último resultado: não abrem
+conexão nem escrevem em disco. HEALTH_CHECK_INTERVAL define o intervalo (s).
+"""
+from contextlib import closing
+import os
+import shutil
+import threading
+import time
+
+CHECK_INTERVAL = float(os.environ.get("HEALTH_CHECK_INTERVAL", "15"))
+MIN_FREE_MB = float(os.environ.get("HEALTH_MIN_FREE_MB", "50"))
+
+
+class HealthChecker:
+    def __init__(self, get_db, db_path, data_dir, is_writable):
+        self.get_db = get_db
+        self.db_path = db_path
+        self.data_dir = data_dir
+        self.is_writable = is_writable
+        self.result = {"ok": False, "checks": {"db": "pending", "disk": "pending"}}
+        self.checked_at = None
+        self.lock = threading.Lock()
+        self._pid = None
+
+    def run_checks(self):
+        checks = {}
+        ok = True
+        try:
+            with closing(self.get_db()) as db:
+                db.execute("SELECT 1").fetchone()
+            checks["db"] = "ok"
+        except Exception as e:
+            checks["db"] = f"error: {e}"
+            ok = False
+        if self.is_writable(self.data_dir):
+            checks["disk"] = "ok"
+        else:
+            checks["disk"] = "not-writable"
+            ok = False
+        try:
+            free_mb = shutil.disk_usage(self.data_dir).free / (1024 * 1024)
+            checks["free_mb"] = round(free_mb, 1)
+            if free_mb < MIN_FREE_MB:
+                checks["disk"] = "low-space"
+                ok = False
+        except OSError:
+            checks["free_mb"] = None
+        try:
+            checks["wal_bytes"] = os.path.getsize(self.db_path + "-wal")
+        except OSError:
+            checks["wal_bytes"] = 0
+        with self.lock:
+            self.result = {"ok": ok, "checks": checks}
+            self.checked_at = time.time()
+
+    def _loop(self):
+        while True:
+            time.sleep(CHECK_INTERVAL)
+            try:
+                self.run_checks()
+            except Exception as e:
+                print("health check failed:", e)
+
+    def ensure_started(self):
+        # Uma thread por processo (workers forkados a partir do master recriam a sua)
+        if self._pid == os.getpid():
+            return
+        with self.lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        # Primeira verificação síncrona para a sonda inicial já ter resultado
+        self.run_checks()
+        threading.Thread(target=self._loop, name="health-checker", daemon=True).start()
+
+    def snapshot(self):
+        """(pronto, corpo) a partir do último resultado em cache."""
+        self.ensure_started()
+        with self.lock:
+            result = dict(self.result)
+            checked_at = self.checked_at
+        lag = None if checked_at is None else round(time.time() - checked_at, 3)
+        stale = lag is None or lag > CHECK_INTERVAL * 3
+        ready = result["ok"] and not stale
+        body = dict(result, ok=ready, lag_seconds=lag, interval_seconds=CHECK_INTERVAL)
+        return ready, body
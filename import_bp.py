@@ -0,0 +1,184 @@
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from contextlib import closing
+from datetime import datetime
+import csv
+import io
+import json
+
+import click
+
+from app import get_db, admin_required, ensure_schema
+from devices import device_ids
+import live
+
+import_bp = Blueprint("import_bp", __name__, url_prefix="/admin/import", cli_group=None)
+
+ALLOWED_IMPORT_EXT = {".csv", ".json"}
+IMPORT_COLUMNS = ["username", "device_name", "fusion_count", "created_at", "status", "work_map", "work_map_id"]
+VALID_STATUS = {"draft", "launched"}
+DEFAULT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 500
+
+
+def parse_import_file(stream, fmt):
+    """Lê CSV ou JSON (lista de objetos ou {"records": [...]}) e devolve lista de dicts."""
+    raw = stream.read()
+    if isinstance(raw, bytes):
+        raw = raw.decode("utf-8-sig")
+    if fmt == "json":
+        data = json.loads(raw or "[]")
+        if isinstance(data, dict):
+            data = data.get("records") or []
+        if not isinstance(data, list):
+            raise ValueError("JSON deve ser uma lista de registros.")
+        return [d if isinstance(d, dict) else {} for d in data]
+    reader = csv.DictReader(io.StringIO(raw))
+    return list(reader)
+
+
+def _column(rows, name):
+    out = []
+    for r in rows:
+        v = r.get(name)
+        out.append("" if v is None else str(v).strip())
+    return out
+
+
+def _parse_ts(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("T", " ").replace("Z", "")).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return False
+
+
+def validate_rows(db, rows, first_line=2):
+    """Valida as linhas por coluna e resolve usuário/mapa com uma consulta cada.
+
+    Retorna (params, errors): params prontos para INSERT e lista de (linha, mensagem).
+    `first_line` é o número da primeira linha de dados (2 no CSV, por causa do cabeçalho).
+    """
+    usernames = _column(rows, "username")
+    devices = _column(rows, "device_name")
+    counts = _column(rows, "fusion_count")
+    created = [_parse_ts(v) for v in _column(rows, "created_at")]
+    statuses = [v.lower() or "draft" for v in _column(rows, "status")]
+    maps = _column(rows, "work_map")
+    map_ids = _column(rows, "work_map_id")
+
+    user_ids = {r["username"]: r["id"] for r in db.execute("SELECT id, username FROM users").fetchall()}
+    wanted_titles = {t for t in maps if t}
+    map_by_title, map_by_id = {}, set()
+    for m in db.execute("SELECT id, title FROM work_maps ORDER BY id ASC").fetchall():
+        map_by_id.add(m["id"])
+        if m["title"] in wanted_titles:
+            map_by_title.setdefault(m["title"], m["id"])
+
+    params, errors = [], []
+    for i in range(len(rows)):
+        line = i + first_line
+        problems = []
+        uid = user_ids.get(usernames[i])
+        if uid is None:
+            problems.append(f"usuário desconhecido '{usernames[i]}'")
+        if not devices[i]:
+            problems.append("device_name vazio")
+        if not counts[i].isdigit():
+            problems.append(f"fusion_count inválido '{counts[i]}'")
+        if created[i] is False:
+            problems.append("created_at inválido")
+        if statuses[i] not in VALID_STATUS:
+            problems.append(f"status inválido '{statuses[i]}'")
+        wm_id = None
+        if map_ids[i]:
+            wm_id = int(map_ids[i]) if map_ids[i].isdigit() else None
+            if wm_id not in map_by_id:
+                problems.append(f"work_map_id desconhecido '{map_ids[i]}'")
+        elif maps[i]:
+            wm_id = map_by_title.get(maps[i])
+            if wm_id is None:
+                problems.append(f"mapa desconhecido '{maps[i]}'")
+        if problems:
+            errors.append((line, "; ".join(problems)))
+            continue
+        params.append((uid, devices[i], int(counts[i]), created[i], statuses[i], wm_id))
+    return params, errors
+
+
+def insert_batches(db, params, batch_size=DEFAULT_BATCH_SIZE):
+    """Insere em transações de `batch_size` linhas via executemany."""
+    inserted = 0
+    for start in range(0, len(params), batch_size):
+        chunk = params[start:start + batch_size]
+        with db:
+            ids = device_ids(db, {p[1] for p in chunk})
+            db.executemany(
+                "INSERT INTO records (user_id, device_name, device_id, fusion_count, created_at, status, work_map_id) "
+                "VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?, ?)",
+                [(uid, name, ids.get(name), *rest) for uid, name, *rest in chunk],
+            )
+            # Lote grande: os painéis recarregam os totais em vez de receber linha a linha
+            live.publish(db, "import", {"inserted": len(chunk)})
+        inserted += len(chunk)
+    return inserted
+
+
+def import_records(rows, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, first_line=2):
+    with closing(get_db()) as db:
+        params, errors = validate_rows(db, rows, first_line)
+        inserted = 0 if dry_run else insert_batches(db, params, batch_size)
+    return {
+        "total": len(rows),
+        "valid": len(params),
+        "inserted": inserted,
+        "errors": [{"line": line, "error": msg} for line, msg in errors],
+    }
+
+
+def _fmt_from_name(filename):
+    return "json" if filename.lower().endswith(".json") else "csv"
+
+
+@import_bp.route("/", methods=["GET", "POST"])
+@admin_required
+def index():
+    if request.method == "GET":
+        return render_template("admin_import.html", result=None, columns=IMPORT_COLUMNS)
+    file = request.files.get("file")
+    if not file or not file.filename:
+        flash("Selecione um arquivo CSV ou JSON.", "warning")
+        return redirect(url_for("import_bp.index"))
+    if not any(file.filename.lower().endswith(ext) for ext in ALLOWED_IMPORT_EXT):
+        flash("Extensão não permitida. Use .csv ou .json.", "danger")
+        return redirect(url_for("import_bp.index"))
+    dry_run = request.form.get("dry_run") == "1"
+    try:
+        fmt = _fmt_from_name(file.filename)
+        rows = parse_import_file(file.stream, fmt)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        flash(f"Arquivo inválido: {e}", "danger")
+        return redirect(url_for("import_bp.index"))
+    result = import_records(rows, dry_run=dry_run, first_line=2 if fmt == "csv" else 1)
+    if request.args.get("format") == "json":
+        return jsonify(result)
+    result["errors"] = result["errors"][:MAX_REPORTED_ERRORS]
+    return render_template("admin_import.html", result=result, dry_run=dry_run, columns=IMPORT_COLUMNS)
+
+
+@import_bp.cli.command("import-records")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["csv", "json"]), default=None, help="Padrão: pela extensão.")
+@click.option("--batch-size", default=DEFAULT_BATCH_SIZE, show_default=True)
+@click.option("--dry-run", is_flag=True, help="Apenas valida, sem inserir.")
+def import_records_command(path, fmt, batch_size, dry_run):
+    """Importa registros em lote de um arquivo CSV/JSON."""
+    ensure_schema()
+    fmt = fmt or _fmt_from_name(path)
+    with open(path, "rb") as f:
+        rows = parse_import_file(f, fmt)
+    result = import_records(rows, batch_size=batch_size, dry_run=dry_run, first_line=2 if fmt == "csv" else 1)
+    for err in result["errors"][:MAX_REPORTED_ERRORS]:
+        click.echo(f"linha {err['line']}: {err['error']}", err=True)
+    click.echo(f"{result['inserted']} inseridos, {len(result['errors'])} com erro, {result['total']} lidos.")
@@ -1,7 +1,7 @@
 
 import os, sqlite3
 from contextlib import closing
-from werkzeug.security import generate_password_hash
+from passwords import hash_password
 
 DATA_DIR = os.environ.get("DATA_DIR", "/data")
 DB_PATH = os.environ.get("DB_PATH", os.path.join(DATA_DIR, "app.db"))
@@ -47,6 +47,6 @@ with closing(get_db()) as db:
     )""")
     if not c.execute("SELECT id FROM users WHERE username=?",( "admin",)).fetchone():
         c.execute("INSERT INTO users (username, password_hash, is_admin) VALUES (?,?,1)",
-                  ("admin", generate_password_hash("admin123")))
+                  ("admin", hash_password("admin123")))
     db.commit()
 print("OK: schema criado e admin garantido em", DB_PATH)
@@ -0,0 +1,133 @@
+
+"""Lançamento em lote: marca (ou desmarca) como `launched` todos os registros que
+casam com um filtro (mapa, dispositivo, usuário, período) numa única transação.
+
+- GET `/admin/launch/`: filtros + prévia (quantos estão em rascunho/lançados).
+- POST `/admin/launch/apply`: `action=launch|unlaunch`, mesmos filtros (ou
+  `record_ids`), `target_map_id` opcional para vincular o mapa ao lançar.
+  Responde JSON com as contagens se pedido (`Accept: application/json` ou corpo
+  JSON); senão redireciona de volta à prévia com uma mensagem.
+"""
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from contextlib import closing
+
+from app import get_db, admin_required, set_records_status
+from devices import lookup_device_id
+
+launch_bp = Blueprint("launch_bp", __name__, url_prefix="/admin/launch")
+
+PREVIEW_ROWS = 50
+STATUS_FOR_ACTION = {"launch": "launched", "unlaunch": "draft"}
+
+
+def _filters(db, args):
+    """WHERE sobre `records r` a partir dos filtros; None se nada foi filtrado."""
+    clauses, params = [], []
+    # Formulário (MultiDict) ou corpo JSON ({"record_ids": [1, 2]})
+    raw_ids = args.getlist("record_ids") if hasattr(args, "getlist") else (args.get("record_ids") or [])
+    ids = [int(v) for v in raw_ids if str(v).isdigit()]
+    if ids:
+        clauses.append(f"r.id IN ({','.join('?' * len(ids))})"); params.extend(ids)
+    work_map_id = _int(args.get("work_map_id"))
+    if work_map_id:
+        clauses.append("r.work_map_id = ?"); params.append(work_map_id)
+    device = str(args.get("device") or "").strip()
+    if device:
+        clauses.append("r.device_id = ?"); params.append(lookup_device_id(db, device))
+    user_id = _int(args.get("user_id"))
+    if user_id:
+        clauses.append("r.user_id = ?"); params.append(user_id)
+    start = str(args.get("start") or "").strip()
+    if start:
+        clauses.append("r.created_at >= date(?)"); params.append(start)
+    end = str(args.get("end") or "").strip()
+    if end:
+        clauses.append("r.created_at < date(?, '+1 day')"); params.append(end)
+    if not clauses:
+        return None, []
+    return " AND ".join(clauses), params
+
+
+def _int(v):
+    try:
+        return int(v) if v not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _counts(db, where_sql, params):
+    row = db.execute(
+        f"SELECT COUNT(*) AS total, "
+        f"SUM(CASE WHEN r.status = 'launched' THEN 1 ELSE 0 END) AS launched "
+        f"FROM records r WHERE {where_sql}",
+        params,
+    ).fetchone()
+    total = row["total"] or 0
+    launched = row["launched"] or 0
+    return {"matched": total, "launched": launched, "draft": total - launched}
+
+
+@launch_bp.route("/")
+@admin_required
+def index():
+    with closing(get_db()) as db:
+        where_sql, params = _filters(db, request.args)
+        counts, rows = None, []
+        if where_sql:
+            counts = _counts(db, where_sql, params)
+            rows = db.execute(
+                f"""
+                SELECT r.id, COALESCE(d.name, r.device_name) AS device_name, r.fusion_count, r.created_at,
+                       r.status, u.username, m.title AS work_map
+                FROM records r
+                LEFT JOIN devices d ON d.id = r.device_id
+                LEFT JOIN users u ON u.id = r.user_id
+                LEFT JOIN work_maps m ON m.id = r.work_map_id
+                WHERE {where_sql}
+                ORDER BY r.id DESC LIMIT ?
+                """,
+                (*params, PREVIEW_ROWS),
+            ).fetchall()
+        maps = db.execute("SELECT id, title FROM work_maps ORDER BY uploaded_at DESC").fetchall()
+        users = db.execute("SELECT id, username FROM users ORDER BY username ASC").fetchall()
+    return render_template(
+        "admin_launch.html", counts=counts, rows=rows, maps=maps, users=users,
+        filters=request.args, preview_rows=PREVIEW_ROWS,
+        selected_map_id=request.args.get("work_map_id", type=int),
+        selected_user_id=request.args.get("user_id", type=int),
+    )
+
+
+@launch_bp.route("/apply", methods=["POST"])
+@admin_required
+def apply():
+    data = request.get_json(silent=True) if request.is_json else request.form
+    data = data or {}
+    wants_json = request.is_json or request.accept_mimetypes.best == "application/json"
+    action = data.get("action", "launch")
+    status = STATUS_FOR_ACTION.get(action)
+    back = {k: data.get(k) for k in ("work_map_id", "device", "user_id", "start", "end") if data.get(k)}
+    with closing(get_db()) as db:
+        where_sql, params = _filters(db, data)
+        error = None
+        if status is None:
+            error = "ação inválida"
+        elif not where_sql:
+            error = "informe pelo menos um filtro"
+        target_map = _int(data.get("target_map_id")) if action == "launch" else None
+        if not error and target_map and not db.execute("SELECT 1 FROM work_maps WHERE id=?", (target_map,)).fetchone():
+            error = "mapa de trabalho inválido"
+        if error:
+            if wants_json:
+                return jsonify({"error": error}), 400
+            flash(f"Lançamento em lote: {error}.", "danger")
+            return redirect(url_for("launch_bp.index", **back))
+        with db:
+            changed = set_records_status(db, where_sql, params, status, target_map)
+        counts = _counts(db, where_sql, params)
+    result = {"action": action, "changed": changed, **counts}
+    if wants_json:
+        return jsonify(result)
+    verb = "lançado(s)" if action == "launch" else "voltaram para rascunho"
+    flash(f"{changed} registro(s) {verb}; {counts['launched']} de {counts['matched']} lançados no filtro.", "success")
+    return redirect(url_for("launch_bp.index", **back))
@@ -0,0 +1,171 @@
+
+"""Eventos ao vivo (Server-Sent Events) para o painel de relatórios.
+
+Os caminhos de escrita (novo registro, sync offline, fotos, lançamento,
+importação) chamam `publish(db, kind, data)` na mesma transação da escrita:
+o evento vai para a tabela `live_events` (só os últimos LIVE_KEEP_EVENTS ficam).
+Cada worker do gunicorn tem um hub com uma thread que, enquanto houver painéis
+conectados, lê os eventos novos a cada LIVE_POLL_SECONDS (busca pela chave
+primária) e os repassa às filas dos clientes. Assim um registro criado em
+qualquer worker chega a todos os painéis sem refazer a agregação.
+
+- LIVE_MAX_STREAMS: conexões SSE simultâneas por processo (cada uma ocupa uma
+  thread do gthread; padrão 2). Acima disso, 503 com Retry-After.
+- LIVE_STREAM_SECONDS: duração máxima de uma conexão; o navegador reconecta.
+"""
+from collections import deque
+import json
+import os
+import queue
+import threading
+import time
+
+POLL_SECONDS = float(os.environ.get("LIVE_POLL_SECONDS", "1"))
+MAX_STREAMS = int(os.environ.get("LIVE_MAX_STREAMS", "2"))
+STREAM_SECONDS = int(os.environ.get("LIVE_STREAM_SECONDS", "300"))
+KEEP_EVENTS = int(os.environ.get("LIVE_KEEP_EVENTS", "5000"))
+HEARTBEAT_SECONDS = 15
+QUEUE_SIZE = 1000
+
+
+def ensure_live_schema(cur):
+    cur.execute("""CREATE TABLE IF NOT EXISTS live_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        data TEXT NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )""")
+
+
+def publish(db, kind, data):
+    """Grava um evento; deve rodar dentro da transação da escrita que o gerou."""
+    cur = db.execute("INSERT INTO live_events (kind, data) VALUES (?, ?)", (kind, json.dumps(data)))
+    if cur.lastrowid % 100 == 0:
+        db.execute("DELETE FROM live_events WHERE id <= ?", (cur.lastrowid - KEEP_EVENTS,))
+
+
+def publish_record(db, kind, record_id, photos=0):
+    """`record` (criado) ou `delete` (antes de apagar) com o que o painel agrega."""
+    row = db.execute(
+        "SELECT r.id, r.user_id, COALESCE(d.name, r.device_name) AS device, r.fusion_count, "
+        "r.created_at, r.status, r.work_map_id FROM records r "
+        "LEFT JOIN devices d ON d.id = r.device_id WHERE r.id = ?",
+        (record_id,),
+    ).fetchone()
+    if row:
+        publish(db, kind, {**dict(row), "photos": photos})
+
+
+def publish_photo(db, record_id):
+    row = db.execute("SELECT user_id, created_at FROM records WHERE id = ?", (record_id,)).fetchone()
+    if row:
+        publish(db, "photo", {"record_id": record_id, "user_id": row[0], "created_at": row[1]})
+
+
+def last_event_id(db):
+    return db.execute("SELECT COALESCE(MAX(id), 0) FROM live_events").fetchone()[0]
+
+
+class TooManyStreams(Exception):
+    pass
+
+
+class LiveHub:
+    def __init__(self, get_db):
+        self.get_db = get_db
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.last_id = None
+        self.recent = deque(maxlen=QUEUE_SIZE)
+        self._pid = None
+
+    def _ensure_started(self):
+        # Uma thread por processo (workers forkados a partir do master recriam a sua)
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self.subscribers = set()
+        self.last_id = None
+        self.recent.clear()
+        threading.Thread(target=self._loop, name="live-hub", daemon=True).start()
+
+    def subscribe(self, since):
+        """Fila de eventos com id > `since` (id lido junto com os totais)."""
+        with self.lock:
+            self._ensure_started()
+            if len(self.subscribers) >= MAX_STREAMS:
+                raise TooManyStreams()
+            q = queue.Queue(QUEUE_SIZE)
+            if self.last_id is None:
+                self.last_id = since
+            else:
+                # Eventos já repassados aos outros painéis depois do snapshot deste
+                for event in self.recent:
+                    if event[0] > since:
+                        q.put_nowait(event)
+            self.subscribers.add(q)
+            return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.subscribers.discard(q)
+
+    def _loop(self):
+        while True:
+            time.sleep(POLL_SECONDS)
+            with self.lock:
+                if not self.subscribers:
+                    # Sem painéis conectados não consulta nada; o próximo define o ponto de partida
+                    self.last_id = None
+                    self.recent.clear()
+                    continue
+                since = self.last_id
+            try:
+                self._poll(since)
+            except Exception as e:
+                print("live hub poll failed:", e)
+
+    def _poll(self, since):
+        db = self.get_db()
+        try:
+            rows = db.execute(
+                "SELECT id, kind, data FROM live_events WHERE id > ? ORDER BY id LIMIT 500", (since,)
+            ).fetchall()
+        finally:
+            db.close()
+        for r in rows:
+            self._dispatch((r[0], r[1], r[2]))
+
+    def _dispatch(self, event):
+        with self.lock:
+            if self.last_id is not None and event[0] <= self.last_id:
+                return
+            self.last_id = event[0]
+            self.recent.append(event)
+            subscribers = list(self.subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # Cliente lento: descarta a fila e manda recarregar os totais
+                with q.mutex:
+                    q.queue.clear()
+                q.put_nowait((event[0], "resync", "{}"))
+
+    def stream(self, q, totals):
+        """Gerador SSE: totais atuais, depois deltas até STREAM_SECONDS."""
+        deadline = time.monotonic() + STREAM_SECONDS
+        try:
+            yield f"retry: 3000\nevent: totals\ndata: {json.dumps(totals)}\n\n"
+            while True:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                try:
+                    event_id, kind, data = q.get(timeout=min(HEARTBEAT_SECONDS, left))
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                yield f"id: {event_id}\nevent: {kind}\ndata: {data}\n\n"
+        finally:
+            self.unsubscribe(q)
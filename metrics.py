@@ -0,0 +1,323 @@
+
+"""Instrumentação por rota: latência, nº/tempo de queries SQLite e bytes enviados.
+
+- METRICS_ENABLED=0 desliga tudo (get_db volta a usar a conexão padrão, a não ser
+  que o profiler de SQL esteja ligado).
+- SLOW_REQUEST_MS: requisições acima disso são logadas com o detalhamento (0 desliga).
+- Cada worker grava um snapshot em DATA_DIR/metrics/<pid>.json a cada
+  METRICS_FLUSH_SECONDS; /admin/metrics soma os snapshots de todos os workers.
+"""
+from flask import g, request, has_request_context
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import sqlprofile
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "0"))
+FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", "5"))
+STALE_SNAPSHOT_SECONDS = 600
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _note_query(elapsed):
+    if has_request_context():
+        g._metrics_queries = g.get("_metrics_queries", 0) + 1
+        g._metrics_query_time = g.get("_metrics_query_time", 0.0) + elapsed
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    _fp = None
+
+    def execute(self, sql, params=()):
+        t0 = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            elapsed = time.perf_counter() - t0
+            _note_query(elapsed)
+            prof = sqlprofile.profiler
+            if prof is not None and prof.enabled:
+                self._fp = prof.observe(self, sql, params, elapsed)
+
+    def executemany(self, sql, seq):
+        prof = sqlprofile.profiler
+        first = ()
+        if prof is not None and prof.enabled:
+            # Primeira linha de parâmetros para o EXPLAIN, sem consumir o iterador
+            it = iter(seq)
+            row = next(it, None)
+            if row is not None:
+                first, seq = row, itertools.chain((row,), it)
+            else:
+                seq = ()
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(sql, seq)
+        finally:
+            elapsed = time.perf_counter() - t0
+            _note_query(elapsed)
+            if prof is not None and prof.enabled:
+                self._fp = prof.observe(self, sql, first, elapsed)
+
+    # Linhas devolvidas só são contadas quando o profiler de SQL está ligado
+    def _rows(self, n):
+        if self._fp is not None and n:
+            sqlprofile.profiler.add_rows(self._fp, n)
+
+    def fetchone(self):
+        row = super().fetchone()
+        self._rows(0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._rows(len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        self._rows(1)
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Conexão que contabiliza queries e tempo de execução na requisição atual."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq):
+        return self.cursor().executemany(sql, seq)
+
+    def executescript(self, script):
+        t0 = time.perf_counter()
+        try:
+            return super().executescript(script)
+        finally:
+            _note_query(time.perf_counter() - t0)
+
+
+class RouteStats:
+    __slots__ = ("count", "seconds", "buckets", "queries", "query_seconds", "bytes", "errors")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.bytes = 0
+        self.errors = 0
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+class Registry:
+    def __init__(self, snapshot_dir):
+        self.snapshot_dir = snapshot_dir
+        self.routes = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.last_flush = 0.0
+
+    def observe(self, key, elapsed, queries, query_seconds, nbytes, status):
+        with self.lock:
+            st = self.routes.get(key)
+            if st is None:
+                st = self.routes[key] = RouteStats()
+            st.count += 1
+            st.seconds += elapsed
+            for i, bound in enumerate(BUCKETS):
+                if elapsed <= bound:
+                    st.buckets[i] += 1
+                    break
+            st.queries += queries
+            st.query_seconds += query_seconds
+            st.bytes += nbytes
+            if status >= 500:
+                st.errors += 1
+            due = time.monotonic() - self.last_flush >= FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def incr(self, name, n=1, **labels):
+        """Contador livre (ex. cálculos de relatório poupados), somado entre workers."""
+        key = name + "|" + ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def snapshot(self):
+        with self.lock:
+            return {"|".join(k): st.to_dict() for k, st in self.routes.items()}
+
+    def counters_snapshot(self):
+        with self.lock:
+            return dict(self.counters)
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            path = os.path.join(self.snapshot_dir, f"{os.getpid()}.json")
+            tmp = path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"routes": self.snapshot(), "counters": self.counters_snapshot()}, f)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def _sources(self):
+        """Snapshot vivo deste processo + os gravados pelos outros workers."""
+        sources = [{"routes": self.snapshot(), "counters": self.counters_snapshot()}]
+        me = f"{os.getpid()}.json"
+        try:
+            now = time.time()
+            for name in os.listdir(self.snapshot_dir):
+                p = os.path.join(self.snapshot_dir, name)
+                if name == me or not name.endswith(".json") or now - os.path.getmtime(p) > STALE_SNAPSHOT_SECONDS:
+                    continue
+                with open(p) as f:
+                    sources.append(json.load(f))
+        except (OSError, ValueError):
+            pass
+        return sources
+
+    def merged(self):
+        """Soma as métricas por rota de todos os workers."""
+        total = {}
+        for src in self._sources():
+            for key, st in src.get("routes", {}).items():
+                acc = total.setdefault(key, {k: (0 if k != "buckets" else [0] * len(BUCKETS)) for k in RouteStats.__slots__})
+                for k, v in st.items():
+                    if k == "buckets":
+                        acc[k] = [a + b for a, b in zip(acc[k], v)]
+                    else:
+                        acc[k] += v
+        return total
+
+    def merged_counters(self):
+        total = {}
+        for src in self._sources():
+            for key, n in src.get("counters", {}).items():
+                total[key] = total.get(key, 0) + n
+        return total
+
+
+def _esc(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def render_prometheus(stats, counters=None):
+    lines = [
+        "# HELP splice_request_duration_seconds Request latency by route.",
+        "# TYPE splice_request_duration_seconds histogram",
+    ]
+    for key in sorted(stats):
+        st = stats[key]
+        endpoint, method = key.split("|", 1)
+        labels = f'route="{_esc(endpoint)}",method="{_esc(method)}"'
+        cum = 0
+        for bound, n in zip(BUCKETS, st["buckets"]):
+            cum += n
+            lines.append(f'splice_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cum}')
+        lines.append(f'splice_request_duration_seconds_bucket{{{labels},le="+Inf"}} {st["count"]}')
+        lines.append(f"splice_request_duration_seconds_sum{{{labels}}} {st['seconds']:.6f}")
+        lines.append(f"splice_request_duration_seconds_count{{{labels}}} {st['count']}")
+    for name, field, kind, help_ in (
+        ("splice_db_queries_total", "queries", "counter", "SQLite statements executed."),
+        ("splice_db_query_seconds_total", "query_seconds", "counter", "Time spent executing SQLite statements."),
+        ("splice_response_bytes_total", "bytes", "counter", "Response body bytes sent."),
+        ("splice_request_errors_total", "errors", "counter", "Responses with status >= 500."),
+    ):
+        lines.append(f"# HELP {name} {help_}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key in sorted(stats):
+            endpoint, method = key.split("|", 1)
+            value = stats[key][field]
+            value = f"{value:.6f}" if isinstance(value, float) else value
+            lines.append(f'{name}{{route="{_esc(endpoint)}",method="{_esc(method)}"}} {value}')
+    seen = set()
+    for key in sorted(counters or {}):
+        name, labels = key.split("|", 1)
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# TYPE {name} counter")
+        pairs = [p.split("=", 1) for p in labels.split(",") if p]
+        label_str = ",".join(f'{k}="{_esc(v)}"' for k, v in pairs)
+        lines.append(f"{name}{{{label_str}}} {counters[key]}" if label_str else f"{name} {counters[key]}")
+    return "\n".join(lines) + "\n"
+
+
+def _counting(iterable, box):
+    try:
+        for chunk in iterable:
+            box[0] += len(chunk)
+            yield chunk
+    finally:
+        close = getattr(iterable, "close", None)
+        if close:
+            close()
+
+
+def init_app(app, data_dir):
+    registry = Registry(os.path.join(data_dir, "metrics"))
+    app.extensions["metrics"] = registry
+    if not METRICS_ENABLED:
+        return registry
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_t0 = time.perf_counter()
+
+    @app.after_request
+    def _metrics_finish(response):
+        t0 = g.get("_metrics_t0")
+        if t0 is None:
+            return response
+        endpoint = request.endpoint or "unmatched"
+        method = request.method
+        path = request.path
+        status = response.status_code
+        # Latência medida no fechamento da resposta, incluindo o tempo de streaming
+        ctx = {"queries": g.get("_metrics_queries", 0), "query_seconds": g.get("_metrics_query_time", 0.0)}
+        box = [0]
+        if response.content_length is not None:
+            box[0] = response.content_length
+        elif response.is_streamed:
+            response.response = _counting(response.response, box)
+        else:
+            box[0] = len(response.get_data())
+
+        def _record():
+            elapsed = time.perf_counter() - t0
+            registry.observe((endpoint, method), elapsed, ctx["queries"], ctx["query_seconds"], box[0], status)
+            if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+                app.logger.warning(
+                    "slow request %s %s -> %s: %.1f ms, %d queries (%.1f ms), %d bytes",
+                    method, path, status,
+                    elapsed * 1000, ctx["queries"], ctx["query_seconds"] * 1000, box[0],
+                )
+
+        if response.direct_passthrough:
+            # send_file: o servidor recebe o arquivo direto (sendfile) e não chama
+            # os callbacks de fechamento; mede até aqui, sem o tempo de envio
+            _record()
+        else:
+            response.call_on_close(_record)
+        return response
+
+    return registry
@@ -0,0 +1,334 @@
+
+"""Montagem de ZIPs com compressão em paralelo num pool de processos.
+
+Cada arquivo é lido em pedaços de ZIP_CHUNK_MB; os pedaços são comprimidos
+(deflate bruto, com Z_SYNC_FLUSH entre eles) em processos separados e gravados
+em arquivos temporários, que o processo da requisição concatena em ordem no ZIP
+final. Imagens e arquivos já comprimidos vão sem recompressão (só CRC).
+
+- ZIP_WORKERS: processos do pool (padrão: min(4, nº de CPUs); 1 = sem pool).
+- EXPORT_MAX_CONCURRENT: exportações simultâneas somando todos os workers
+  do gunicorn (padrão 1), controladas por lock de arquivo em DATA_DIR/locks.
+- EXPORT_WAIT_SECONDS: quanto esperar por uma vaga antes de desistir (padrão 10).
+"""
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+import multiprocessing
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows: limite só dentro do processo
+    fcntl = None
+
+ZIP_WORKERS = int(os.environ.get("ZIP_WORKERS", str(min(4, os.cpu_count() or 1))))
+EXPORT_MAX_CONCURRENT = max(1, int(os.environ.get("EXPORT_MAX_CONCURRENT", "1")))
+EXPORT_WAIT_SECONDS = float(os.environ.get("EXPORT_WAIT_SECONDS", "10"))
+CHUNK_SIZE = int(os.environ.get("ZIP_CHUNK_MB", "16")) * 1024 * 1024
+COMPRESS_LEVEL = 6
+# Abaixo disso não compensa subir o pool de processos
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+STORED_EXT = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".zip", ".gz", ".bz2", ".xz", ".7z"}
+_COPY_BUF = 1024 * 1024
+
+LOCK_DIR = None
+_local_slots = threading.BoundedSemaphore(EXPORT_MAX_CONCURRENT)
+
+
+class ExportBusy(Exception):
+    """Todas as vagas de exportação estão ocupadas."""
+
+
+def init_app(app, data_dir):
+    global LOCK_DIR
+    LOCK_DIR = os.path.join(data_dir, "locks")
+    app.extensions["parallel_zip"] = LOCK_DIR
+
+
+@contextmanager
+def export_slot(wait=None):
+    """Reserva uma das EXPORT_MAX_CONCURRENT vagas globais (levanta ExportBusy)."""
+    wait = EXPORT_WAIT_SECONDS if wait is None else wait
+    deadline = time.monotonic() + wait
+    if fcntl is None or LOCK_DIR is None:
+        if not _local_slots.acquire(timeout=wait):
+            raise ExportBusy()
+        try:
+            yield
+        finally:
+            _local_slots.release()
+        return
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    while True:
+        for i in range(EXPORT_MAX_CONCURRENT):
+            f = open(os.path.join(LOCK_DIR, f"export-{i}.lock"), "a")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                continue
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+                f.close()
+            return
+        if time.monotonic() >= deadline:
+            raise ExportBusy()
+        time.sleep(0.25)
+
+
+# --- CRC32 de pedaços comprimidos em paralelo (crc32_combine do zlib)
+def _gf2_times(mat, vec):
+    s = 0
+    i = 0
+    while vec:
+        if vec & 1:
+            s ^= mat[i]
+        vec >>= 1
+        i += 1
+    return s
+
+
+def _gf2_square(mat):
+    return [_gf2_times(mat, mat[n]) for n in range(32)]
+
+
+def crc32_combine(crc1, crc2, len2):
+    if len2 == 0:
+        return crc1
+    odd = [0xEDB88320] + [1 << n for n in range(31)]
+    even = _gf2_square(odd)
+    odd = _gf2_square(even)
+    while True:
+        even = _gf2_square(odd)
+        if len2 & 1:
+            crc1 = _gf2_times(even, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+        odd = _gf2_square(even)
+        if len2 & 1:
+            crc1 = _gf2_times(odd, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+    return crc1 ^ crc2
+
+
+def _compress_chunk(path, offset, length, level, final, tmp_dir):
+    """Roda no pool: devolve (arquivo temporário ou None, bytes lidos, tamanho comprimido, crc)."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+    crc = zlib.crc32(data)
+    if level is None:
+        return None, len(data), len(data), crc
+    co = zlib.compressobj(level, zlib.DEFLATED, -15)
+    fd, tmp = tempfile.mkstemp(dir=tmp_dir, suffix=".deflate")
+    with os.fdopen(fd, "wb") as out:
+        out.write(co.compress(data))
+        out.write(co.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH))
+        csize = out.tell()
+    return tmp, len(data), csize, crc
+
+
+class _InlineExecutor:
+    def submit(self, fn, *args):
+        fut = Future()
+        try:
+            fut.set_result(fn(*args))
+        except BaseException as e:
+            fut.set_exception(e)
+        return fut
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def _executor(total_bytes):
+    if ZIP_WORKERS <= 1 or total_bytes < PARALLEL_MIN_BYTES:
+        return _InlineExecutor(), 1
+    methods = multiprocessing.get_all_start_methods()
+    # forkserver evita fork de um worker web com threads em andamento
+    ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else None)
+    return ProcessPoolExecutor(max_workers=ZIP_WORKERS, mp_context=ctx), ZIP_WORKERS
+
+
+def _dos_datetime(mtime):
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+class _ZipWriter:
+    """Escreve cabeçalhos ZIP (com ZIP64 quando necessário) para dados já comprimidos."""
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.entries = []
+
+    def add(self, arcname, method, crc, csize, usize, mtime, write_data):
+        name = arcname.replace(os.sep, "/").encode("utf-8")
+        flags = 0 if name.isascii() else 0x800
+        offset = self.fp.tell()
+        big = csize >= zipfile.ZIP64_LIMIT or usize >= zipfile.ZIP64_LIMIT
+        extra = struct.pack("<HHQQ", 1, 16, usize, csize) if big else b""
+        version = 45 if big else (20 if method == zipfile.ZIP_DEFLATED else 10)
+        dtime, ddate = _dos_datetime(mtime)
+        self.fp.write(struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, version, flags, method, dtime, ddate, crc,
+            0xFFFFFFFF if big else csize, 0xFFFFFFFF if big else usize, len(name), len(extra),
+        ))
+        self.fp.write(name)
+        self.fp.write(extra)
+        write_data(self.fp)
+        self.entries.append((name, flags, method, dtime, ddate, crc, csize, usize, offset, version))
+
+    def close(self):
+        cd_start = self.fp.tell()
+        for name, flags, method, dtime, ddate, crc, csize, usize, offset, version in self.entries:
+            fields = []
+            if usize >= zipfile.ZIP64_LIMIT:
+                fields.append(usize)
+            if csize >= zipfile.ZIP64_LIMIT:
+                fields.append(csize)
+            if offset >= zipfile.ZIP64_LIMIT:
+                fields.append(offset)
+            extra = struct.pack(f"<HH{len(fields)}Q", 1, 8 * len(fields), *fields) if fields else b""
+            if fields:
+                version = 45
+            self.fp.write(struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014B50, (3 << 8) | 45, version, flags, method, dtime, ddate, crc,
+                csize if csize < zipfile.ZIP64_LIMIT else 0xFFFFFFFF,
+                usize if usize < zipfile.ZIP64_LIMIT else 0xFFFFFFFF,
+                len(name), len(extra), 0, 0, 0, 0o100644 << 16,
+                offset if offset < zipfile.ZIP64_LIMIT else 0xFFFFFFFF,
+            ))
+            self.fp.write(name)
+            self.fp.write(extra)
+        cd_size = self.fp.tell() - cd_start
+        count = len(self.entries)
+        if count >= 0xFFFF or cd_start >= zipfile.ZIP64_LIMIT or cd_size >= zipfile.ZIP64_LIMIT:
+            eocd64 = self.fp.tell()
+            self.fp.write(struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count, cd_size, cd_start))
+            self.fp.write(struct.pack("<IIQI", 0x07064B50, 0, eocd64, 1))
+        self.fp.write(struct.pack(
+            "<IHHHHIIH", 0x06054B50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+            min(cd_size, 0xFFFFFFFF), min(cd_start, 0xFFFFFFFF), 0,
+        ))
+
+
+def _plan(members):
+    """Expande (arcname, caminho|bytes) em membros com a lista de pedaços de cada um."""
+    plan = []
+    total = 0
+    for arcname, src in members:
+        if isinstance(src, bytes):
+            plan.append((arcname, src, None, time.time(), []))
+            continue
+        try:
+            st = os.stat(src)
+        except OSError:
+            continue
+        level = None if os.path.splitext(src.lower())[1] in STORED_EXT else COMPRESS_LEVEL
+        size = st.st_size
+        offsets = list(range(0, size, CHUNK_SIZE)) or [0]
+        chunks = [(src, off, min(CHUNK_SIZE, size - off), level, off + CHUNK_SIZE >= size) for off in offsets]
+        plan.append((arcname, src, level, st.st_mtime, chunks))
+        total += size
+    return plan, total
+
+
+def _copy_range(src, dst, offset, length):
+    with open(src, "rb") as f:
+        f.seek(offset)
+        while length > 0:
+            buf = f.read(min(_COPY_BUF, length))
+            if not buf:
+                break
+            dst.write(buf)
+            length -= len(buf)
+
+
+def build_zip(out_path, members):
+    """Grava em `out_path` um ZIP com `members` [(arcname, caminho ou bytes)].
+
+    O arquivo é escrito como `out_path + '.part'` e renomeado no fim. Chame
+    dentro de `export_slot()` para respeitar o limite global de exportações.
+    """
+    plan, total = _plan(members)
+    tmp_dir = os.path.dirname(os.path.abspath(out_path))
+    executor, workers = _executor(total)
+    jobs = deque(chunk for member in plan for chunk in member[4])
+    pending = deque()
+    window = workers * 2
+
+    def _fill():
+        # Limita pedaços adiantados para não acumular temporários no disco
+        while jobs and len(pending) < window:
+            pending.append(executor.submit(_compress_chunk, *jobs.popleft(), tmp_dir))
+
+    spooled = set()
+    part_path = out_path + ".part"
+    try:
+        with open(part_path, "wb") as fp:
+            zw = _ZipWriter(fp)
+            for arcname, src, level, mtime, chunks in plan:
+                if not chunks:
+                    co = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -15)
+                    packed = co.compress(src) + co.flush()
+                    zw.add(arcname, zipfile.ZIP_DEFLATED, zlib.crc32(src), len(packed), len(src), mtime,
+                           lambda f, packed=packed: f.write(packed))
+                    continue
+                results = []
+                for _ in chunks:
+                    _fill()
+                    results.append(pending.popleft().result())
+                    if results[-1][0]:
+                        spooled.add(results[-1][0])
+                _fill()
+                usize = sum(r[1] for r in results)
+                csize = sum(r[2] for r in results)
+                crc = results[0][3]
+                for r in results[1:]:
+                    crc = crc32_combine(crc, r[3], r[1])
+                if level is None:
+                    def write_data(f, src=src, usize=usize):
+                        _copy_range(src, f, 0, usize)
+                    method = zipfile.ZIP_STORED
+                else:
+                    def write_data(f, results=results):
+                        for tmp, *_ in results:
+                            with open(tmp, "rb") as t:
+                                shutil.copyfileobj(t, f, _COPY_BUF)
+                            os.remove(tmp)
+                            spooled.discard(tmp)
+                    method = zipfile.ZIP_DEFLATED
+                zw.add(arcname, method, crc, csize, usize, mtime, write_data)
+            zw.close()
+        os.replace(part_path, out_path)
+    except BaseException:
+        for fut in pending:
+            fut.cancel()
+        executor.shutdown(wait=True, cancel_futures=True)
+        for fut in pending:
+            if fut.done() and not fut.cancelled() and fut.exception() is None and fut.result()[0]:
+                spooled.add(fut.result()[0])
+        for path in spooled | {part_path}:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        raise
+    executor.shutdown(wait=True)
+    return out_path
@@ -0,0 +1,130 @@
+
+"""Política de hash de senhas.
+
+- PASSWORD_HASH_METHOD: método do werkzeug, ex. "scrypt", "scrypt:16384:8:1",
+  "pbkdf2:sha256:600000" (padrão: "scrypt").
+- PASSWORD_HASH_WORKERS: máximo de hashes simultâneos por processo (padrão 2).
+- LOGIN_MAX_FAILURES / LOGIN_WINDOW_SECONDS: falhas permitidas por IP e por
+  usuário dentro da janela antes de recusar sem calcular hash (padrão 10 / 300).
+  O IP é o do cliente (X-Forwarded-For via ProxyFix, ver PROXY_FIX_X_FOR no app).
+- LOGIN_MAX_TRACKED: chaves (IP/usuário) guardadas no máximo; as expiradas são
+  varridas a cada janela e, passando do limite, as mais antigas saem (padrão 10000).
+- LOGIN_FASTPATH_TTL: segundos em que um login já verificado pode ser
+  reconfirmado com HMAC em memória em vez do KDF (padrão 300; 0 desliga).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+
+HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "2"))
+LOGIN_MAX_FAILURES = int(os.environ.get("LOGIN_MAX_FAILURES", "10"))
+LOGIN_WINDOW_SECONDS = int(os.environ.get("LOGIN_WINDOW_SECONDS", "300"))
+FASTPATH_TTL = int(os.environ.get("LOGIN_FASTPATH_TTL", "300"))
+LOGIN_MAX_TRACKED = int(os.environ.get("LOGIN_MAX_TRACKED", "10000"))
+
+# hashlib.scrypt/pbkdf2_hmac liberam o GIL; o pool limita quantos rodam ao mesmo tempo
+_pool = ThreadPoolExecutor(max_workers=max(1, HASH_WORKERS), thread_name_prefix="pwhash")
+
+
+def _normalize(method):
+    name, *args = method.split(":")
+    if name == "scrypt":
+        n, r, p = args if len(args) == 3 else ("32768", "8", "1")
+        return f"scrypt:{n}:{r}:{p}"
+    if name == "pbkdf2":
+        hash_name = args[0] if args else "sha256"
+        iterations = args[1] if len(args) > 1 else str(DEFAULT_PBKDF2_ITERATIONS)
+        return f"pbkdf2:{hash_name}:{iterations}"
+    return method
+
+
+CURRENT_METHOD = _normalize(HASH_METHOD)
+
+
+def hash_password(password):
+    return _pool.submit(generate_password_hash, password, CURRENT_METHOD).result()
+
+
+def needs_rehash(stored_hash):
+    return stored_hash.split("$", 1)[0] != CURRENT_METHOD
+
+
+# --- Fast path: logins recentes reconfirmados por HMAC (chave só em memória)
+_fast_key = secrets.token_bytes(32)
+_fast_cache = {}
+_fast_lock = threading.Lock()
+
+
+def _fast_digest(stored_hash, password):
+    return hmac.new(_fast_key, stored_hash.encode() + b"\0" + password.encode(), hashlib.sha256).digest()
+
+
+def verify_password(stored_hash, password):
+    """Confere a senha; retorna (ok, precisa_rehash)."""
+    if FASTPATH_TTL > 0:
+        digest = _fast_digest(stored_hash, password)
+        with _fast_lock:
+            hit = _fast_cache.get(stored_hash)
+        if hit and hit[1] > time.monotonic() and hmac.compare_digest(hit[0], digest):
+            return True, needs_rehash(stored_hash)
+    ok = _pool.submit(check_password_hash, stored_hash, password).result()
+    if ok and FASTPATH_TTL > 0:
+        with _fast_lock:
+            if len(_fast_cache) > 10000:
+                _fast_cache.clear()
+            _fast_cache[stored_hash] = (digest, time.monotonic() + FASTPATH_TTL)
+    return ok, ok and needs_rehash(stored_hash)
+
+
+# --- Throttling de tentativas de login (por processo)
+_failures = {}
+_fail_lock = threading.Lock()
+_last_sweep = 0.0
+
+
+def _recent(key, now):
+    stamps = [t for t in _failures.get(key, ()) if now - t < LOGIN_WINDOW_SECONDS]
+    if stamps:
+        _failures[key] = stamps
+    else:
+        _failures.pop(key, None)
+    return stamps
+
+
+def login_throttled(ip, username):
+    """True se o IP ou o usuário excedeu LOGIN_MAX_FAILURES na janela."""
+    now = time.monotonic()
+    with _fail_lock:
+        return any(len(_recent(k, now)) >= LOGIN_MAX_FAILURES for k in (("ip", ip), ("user", username)))
+
+
+def _sweep(now):
+    """Tira chaves sem falhas na janela; acima de LOGIN_MAX_TRACKED, as mais antigas."""
+    global _last_sweep
+    if now - _last_sweep >= LOGIN_WINDOW_SECONDS or len(_failures) > LOGIN_MAX_TRACKED:
+        _last_sweep = now
+        for k in [k for k, stamps in _failures.items() if now - stamps[-1] >= LOGIN_WINDOW_SECONDS]:
+            del _failures[k]
+    # dict mantém a ordem de inserção: as primeiras chaves são as mais antigas
+    while len(_failures) > LOGIN_MAX_TRACKED:
+        del _failures[next(iter(_failures))]
+
+
+def record_login_failure(ip, username):
+    now = time.monotonic()
+    with _fail_lock:
+        for k in (("ip", ip), ("user", username)):
+            _failures.setdefault(k, []).append(now)
+        _sweep(now)
+
+
+def clear_login_failures(username):
+    # Falhas do IP continuam contando (vários usuários atrás do mesmo NAT)
+    with _fail_lock:
+        _failures.pop(("user", username), None)
@@ -0,0 +1,158 @@
+
+"""Progresso por mapa de trabalho: contadores mantidos por triggers do SQLite.
+
+`work_map_progress` guarda, por mapa, registros, fusões, rascunhos x lançados,
+dispositivos distintos e a última atividade. Os triggers em `records` atualizam
+as contagens em toda inserção, exclusão e mudança de status/mapa/fusões/dispositivo
+(formulário, sync offline, importação, lançamento em lote), então ler o progresso
+é uma busca pela chave primária.
+
+Dispositivos distintos usam uma contagem de referência em `work_map_devices`.
+`flask --app app rebuild-workmap-progress` recalcula tudo a partir de `records`
+(incluindo os registros arquivados, ver archive.py).
+"""
+from contextlib import closing
+
+import click
+
+import archive
+
+_DRAFT = "(NEW.status IS NOT 'launched')"
+_LAUNCHED = "(NEW.status IS 'launched')"
+
+
+def _add(row, last_activity):
+    """Statements que somam a linha `row` (NEW) ao seu mapa."""
+    draft = _DRAFT.replace("NEW", row)
+    launched = _LAUNCHED.replace("NEW", row)
+    return f"""
+        INSERT INTO work_map_progress (work_map_id, records, fusions, drafts, launched, last_activity)
+        SELECT {row}.work_map_id, 1, COALESCE({row}.fusion_count, 0), {draft}, {launched}, {last_activity}
+        WHERE {row}.work_map_id IS NOT NULL
+        ON CONFLICT(work_map_id) DO UPDATE SET
+            records = records + 1,
+            fusions = fusions + excluded.fusions,
+            drafts = drafts + excluded.drafts,
+            launched = launched + excluded.launched,
+            last_activity = max(COALESCE(last_activity, ''), COALESCE(excluded.last_activity, ''));
+        INSERT INTO work_map_devices (work_map_id, device_id, n)
+        SELECT {row}.work_map_id, {row}.device_id, 1
+        WHERE {row}.work_map_id IS NOT NULL AND {row}.device_id IS NOT NULL
+        ON CONFLICT(work_map_id, device_id) DO UPDATE SET n = n + 1;
+    """
+
+
+def _sub(row):
+    """Statements que tiram a linha `row` (OLD) do seu mapa."""
+    draft = _DRAFT.replace("NEW", row)
+    launched = _LAUNCHED.replace("NEW", row)
+    return f"""
+        UPDATE work_map_progress SET
+            records = records - 1,
+            fusions = fusions - COALESCE({row}.fusion_count, 0),
+            drafts = drafts - {draft},
+            launched = launched - {launched}
+        WHERE work_map_id = {row}.work_map_id;
+        UPDATE work_map_devices SET n = n - 1
+        WHERE work_map_id = {row}.work_map_id AND device_id = {row}.device_id;
+        DELETE FROM work_map_devices
+        WHERE work_map_id = {row}.work_map_id AND device_id = {row}.device_id AND n <= 0;
+    """
+
+
+def ensure_progress_schema(db):
+    """Cria tabelas e triggers; na primeira vez popula na MESMA transação.
+
+    Se a criação for interrompida, nada fica gravado e a próxima inicialização
+    refaz tudo (nunca sobra uma tabela vazia marcada como pronta).
+    """
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        exists = db.execute("SELECT 1 FROM sqlite_master WHERE name='work_map_progress'").fetchone()
+        if not exists:
+            db.execute("""CREATE TABLE work_map_progress (
+                work_map_id INTEGER PRIMARY KEY,
+                records INTEGER NOT NULL DEFAULT 0,
+                fusions INTEGER NOT NULL DEFAULT 0,
+                drafts INTEGER NOT NULL DEFAULT 0,
+                launched INTEGER NOT NULL DEFAULT 0,
+                devices INTEGER NOT NULL DEFAULT 0,
+                last_activity DATETIME
+            )""")
+            db.execute("""CREATE TABLE work_map_devices (
+                work_map_id INTEGER NOT NULL,
+                device_id INTEGER NOT NULL,
+                n INTEGER NOT NULL,
+                PRIMARY KEY (work_map_id, device_id)
+            ) WITHOUT ROWID""")
+            db.execute("""CREATE TRIGGER work_map_devices_ai AFTER INSERT ON work_map_devices BEGIN
+                UPDATE work_map_progress SET devices = devices + 1 WHERE work_map_id = new.work_map_id;
+            END""")
+            db.execute("""CREATE TRIGGER work_map_devices_ad AFTER DELETE ON work_map_devices BEGIN
+                UPDATE work_map_progress SET devices = devices - 1 WHERE work_map_id = old.work_map_id;
+            END""")
+            db.execute(f"""CREATE TRIGGER records_progress_ai AFTER INSERT ON records BEGIN
+                {_add("new", "new.created_at")}
+            END""")
+            db.execute(f"""CREATE TRIGGER records_progress_ad AFTER DELETE ON records BEGIN
+                {_sub("old")}
+            END""")
+            db.execute(f"""CREATE TRIGGER records_progress_au
+                AFTER UPDATE OF status, work_map_id, fusion_count, device_id ON records BEGIN
+                {_sub("old")}
+                {_add("new", "CURRENT_TIMESTAMP")}
+            END""")
+            db.execute("""CREATE TRIGGER work_maps_progress_ad AFTER DELETE ON work_maps BEGIN
+                DELETE FROM work_map_devices WHERE work_map_id = old.id;
+                DELETE FROM work_map_progress WHERE work_map_id = old.id;
+            END""")
+            rebuild_progress(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def rebuild_progress(db):
+    """Recalcula os contadores de todos os mapas (corrige qualquer desvio)."""
+    db.execute("DELETE FROM work_map_devices")
+    db.execute("DELETE FROM work_map_progress")
+    db.execute("""
+        INSERT INTO work_map_progress (work_map_id, records, fusions, drafts, launched, devices, last_activity)
+        SELECT work_map_id, COUNT(*), COALESCE(SUM(fusion_count), 0),
+               SUM(status IS NOT 'launched'), SUM(status IS 'launched'), 0, MAX(created_at)
+        FROM records WHERE work_map_id IS NOT NULL
+        GROUP BY work_map_id
+    """)
+    # Cada linha inserida aqui incrementa `devices` pelo trigger work_map_devices_ai
+    db.execute("""
+        INSERT INTO work_map_devices (work_map_id, device_id, n)
+        SELECT work_map_id, device_id, COUNT(*)
+        FROM records WHERE work_map_id IS NOT NULL AND device_id IS NOT NULL
+        GROUP BY work_map_id, device_id
+    """)
+
+
+def progress_for(db, work_map_ids):
+    """{work_map_id: linha de work_map_progress} para os mapas pedidos."""
+    ids = [i for i in work_map_ids if i is not None]
+    if not ids:
+        return {}
+    rows = db.execute(
+        f"SELECT * FROM work_map_progress WHERE work_map_id IN ({','.join('?' * len(ids))})", ids
+    ).fetchall()
+    return {r["work_map_id"]: r for r in rows}
+
+
+def init_app(app, get_db, ensure_schema):
+    @app.cli.command("rebuild-workmap-progress")
+    def rebuild_workmap_progress_command():
+        """Recalcula os contadores de progresso por mapa de trabalho."""
+        ensure_schema()
+        with closing(get_db()) as db:
+            # Registros arquivados continuam contando no progresso do mapa
+            archive.attach_for_reports(db)
+            with db:
+                rebuild_progress(db)
+            n = db.execute("SELECT COUNT(*) FROM work_map_progress").fetchone()[0]
+        click.echo(f"Progresso recalculado: {n} mapa(s).")
@@ -0,0 +1,193 @@
+
+"""Réplica somente leitura do app.db para relatórios e exportações.
+
+Uma thread por worker acorda a cada REPLICA_REFRESH_SECONDS; o worker que pegar
+o lock DATA_DIR/locks/replica.lock copia o app.db com a API de backup do
+SQLite para REPLICA_PATH (padrão DATA_DIR/replica.db). A cópia é feita num
+arquivo temporário e trocada com os.replace, então o arquivo da réplica nunca
+muda depois de publicado: as conexões abrem com `mode=ro&immutable=1` (sem
+locks nem verificação de mudanças) e um cache de páginas grande
+(REPLICA_CACHE_MB). Se o app.db não mudou desde a última cópia, só o horário
+da réplica é renovado.
+
+A cópia é feita em passos de REPLICA_STEP_PAGES páginas, soltando o lock de
+leitura entre eles para o `/new` continuar gravando; se as escritas fizerem a
+cópia recomeçar mais de REPLICA_MAX_RESTARTS vezes, ela é abandonada e
+tentada no próximo ciclo.
+
+`connect()` devolve None quando a réplica está desligada (REPLICA_ENABLED=0),
+não existe ou tem mais de REPLICA_MAX_AGE segundos; aí o chamador lê o app.db.
+O horário da cópia (mtime do arquivo) aparece nas páginas como indicador de
+atualização.
+"""
+from contextlib import closing
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: cada worker copia por conta própria
+    fcntl = None
+
+REPLICA_ENABLED = os.environ.get("REPLICA_ENABLED", "1") == "1"
+REFRESH_SECONDS = float(os.environ.get("REPLICA_REFRESH_SECONDS", "60"))
+MAX_AGE_SECONDS = float(os.environ.get("REPLICA_MAX_AGE", "300"))
+CACHE_MB = int(os.environ.get("REPLICA_CACHE_MB", "64"))
+STEP_PAGES = int(os.environ.get("REPLICA_STEP_PAGES", "1024"))
+MAX_RESTARTS = int(os.environ.get("REPLICA_MAX_RESTARTS", "5"))
+
+
+class _Restarted(Exception):
+    """Escritas no app.db fizeram a cópia recomeçar vezes demais."""
+
+
+class Replica:
+    def __init__(self):
+        self.path = None
+        self.db_path = None
+        self.lock_dir = None
+        self.connect_db = None
+        self.registry = None
+        self.lock = threading.Lock()
+        self._pid = None
+
+    def init_app(self, app, data_dir, db_path, connect_db):
+        """`connect_db(alvo, **kwargs)` abre conexões como o get_db do app."""
+        self.path = os.environ.get("REPLICA_DB_PATH", os.path.join(data_dir, "replica.db"))
+        self.db_path = db_path
+        self.lock_dir = os.path.join(data_dir, "locks")
+        self.connect_db = connect_db
+        self.registry = app.extensions.get("metrics")
+        app.extensions["replica"] = self
+
+    # ----- leitura -----
+
+    def taken_at(self):
+        """Horário (epoch) da cópia atual, ou None se não houver réplica utilizável."""
+        if not REPLICA_ENABLED or self.path is None:
+            return None
+        self.ensure_started()
+        try:
+            taken = os.path.getmtime(self.path)
+        except OSError:
+            return None
+        return taken if time.time() - taken <= MAX_AGE_SECONDS else None
+
+    def connect(self):
+        """Conexão somente leitura na réplica, ou None (usar o app.db)."""
+        if self.taken_at() is None:
+            return None
+        try:
+            conn = self.connect_db(f"file:{self.path}?mode=ro&immutable=1", uri=True)
+        except sqlite3.Error:
+            return None
+        conn.execute(f"PRAGMA cache_size = -{CACHE_MB * 1024}")
+        return conn
+
+    def status(self):
+        """Para o indicador nas páginas: {"replica", "as_of", "age_seconds"}."""
+        taken = self.taken_at()
+        if taken is None:
+            return {"replica": False, "as_of": None, "age_seconds": 0}
+        return {
+            "replica": True,
+            "as_of": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(taken)),
+            "age_seconds": int(time.time() - taken),
+        }
+
+    # ----- atualização -----
+
+    def ensure_started(self):
+        # Uma thread por processo (workers forkados a partir do master recriam a sua)
+        if self._pid == os.getpid():
+            return
+        with self.lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._loop, name="replica-refresh", daemon=True).start()
+
+    def _loop(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print("replica refresh failed:", e)
+            time.sleep(REFRESH_SECONDS)
+
+    def _changed_since(self, taken):
+        for p in (self.db_path, self.db_path + "-wal"):
+            try:
+                if os.path.getmtime(p) >= taken:
+                    return True
+            except OSError:
+                pass
+        return False
+
+    def refresh(self, force=False):
+        """Copia o app.db se a réplica estiver velha; só um worker por vez."""
+        if fcntl is None:
+            return self._refresh(force)
+        os.makedirs(self.lock_dir, exist_ok=True)
+        with open(os.path.join(self.lock_dir, "replica.lock"), "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return False  # outro worker está copiando
+            try:
+                return self._refresh(force)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refresh(self, force):
+        now = time.time()
+        try:
+            taken = os.path.getmtime(self.path)
+        except OSError:
+            taken = None
+        if not force and taken is not None:
+            if now - taken < REFRESH_SECONDS * 0.9:
+                return False  # outro worker acabou de copiar
+            if not self._changed_since(taken):
+                os.utime(self.path, (now, now))
+                return False
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        restarts = [0, None]
+
+        def progress(status, remaining, total):
+            # remaining subindo = página alterada por uma escrita, cópia recomeçou
+            if restarts[1] is not None and remaining > restarts[1]:
+                restarts[0] += 1
+                if restarts[0] > MAX_RESTARTS:
+                    raise _Restarted()
+            restarts[1] = remaining
+
+        started = time.time()
+        try:
+            with closing(sqlite3.connect(self.db_path)) as src, closing(sqlite3.connect(tmp)) as dst:
+                src.backup(dst, pages=STEP_PAGES, progress=progress, sleep=0.005)
+            # mtime = início da cópia: nenhuma escrita posterior está nela
+            os.utime(tmp, (started, started))
+            os.replace(tmp, self.path)
+        except _Restarted:
+            self._count("restarted")
+            return False
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self._count("copied")
+        return True
+
+    def _count(self, result):
+        if self.registry is not None:
+            self.registry.incr("splice_replica_refresh_total", result=result)
+
+
+replica = Replica()
+
+
+def init_app(app, data_dir, db_path, connect_db):
+    replica.init_app(app, data_dir, db_path, connect_db)
+    return replica
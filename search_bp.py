@@ -0,0 +1,111 @@
+
+from flask import Blueprint, render_template, request, jsonify, url_for
+from contextlib import closing
+import re
+
+import click
+
+import app as app_module
+from app import get_db, admin_required, ensure_schema, rebuild_search_index
+
+search_bp = Blueprint("search_bp", __name__, url_prefix="/admin/search", cli_group=None)
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+SEARCH_FIELDS = ("device_name", "username", "status", "work_map")
+_re_token = re.compile(r"\w+", re.UNICODE)
+
+
+def build_match(q, field=None):
+    """Converte o texto digitado numa expressão MATCH do FTS5 com prefixo.
+
+    Cada palavra vira uma frase com `*` no fim ("OTE-12" -> "ote 12"*), e as
+    palavras são combinadas com AND. Devolve None se não sobrar nenhum termo.
+    """
+    phrases = []
+    for word in q.split():
+        tokens = _re_token.findall(word)
+        if tokens:
+            phrases.append('"' + " ".join(tokens) + '"*')
+    if not phrases:
+        return None
+    expr = " AND ".join(phrases)
+    if field in SEARCH_FIELDS:
+        expr = f"{field} : ({expr})"
+    return expr
+
+
+def search_records(db, q, field=None, before=None, limit=PAGE_SIZE):
+    """Uma página de registros que casam com `q`, do mais novo para o mais antigo.
+
+    Paginação por chave (`before=<último id>`); devolve (linhas, próximo cursor ou None).
+    """
+    params = []
+    if app_module.SEARCH_FTS:
+        match = build_match(q, field)
+        if match is None:
+            return [], None
+        inner = "SELECT rowid FROM records_fts WHERE records_fts MATCH ?"
+        params.append(match)
+        if before:
+            inner += " AND rowid < ?"; params.append(before)
+        inner += " ORDER BY rowid DESC LIMIT ?"
+    else:
+        inner = "SELECT id FROM records WHERE device_name LIKE ? ESCAPE '\\'"
+        params.append(q.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        if before:
+            inner += " AND id < ?"; params.append(before)
+        inner += " ORDER BY id DESC LIMIT ?"
+    params.append(limit + 1)
+    rows = db.execute(
+        f"""
+        SELECT r.id, r.device_name, r.fusion_count, r.created_at, r.status, u.username, m.title AS work_map
+        FROM records r
+        LEFT JOIN users u ON u.id = r.user_id
+        LEFT JOIN work_maps m ON m.id = r.work_map_id
+        WHERE r.id IN ({inner})
+        ORDER BY r.id DESC
+        """,
+        params,
+    ).fetchall()
+    cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+    return rows[:limit], cursor
+
+
+@search_bp.route("/")
+@admin_required
+def index():
+    """Busca por dispositivo, autor, status ou título do mapa (`?q=OTE-12&field=&before=`).
+
+    `?format=json` devolve {"results": [...], "next": cursor}.
+    """
+    q = request.args.get("q", "").strip()
+    field = request.args.get("field") or None
+    before = request.args.get("before", type=int)
+    limit = min(max(request.args.get("limit", PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    rows, cursor = [], None
+    if q:
+        with closing(get_db()) as db:
+            rows, cursor = search_records(db, q, field, before, limit)
+    if request.args.get("format") == "json":
+        return jsonify({
+            "results": [dict(r, url=url_for("view_record", record_id=r["id"])) for r in rows],
+            "next": cursor,
+        })
+    return render_template(
+        "admin_search.html", q=q, field=field or "", fields=SEARCH_FIELDS,
+        results=rows, next_cursor=cursor, fts=app_module.SEARCH_FTS,
+    )
+
+
+@search_bp.cli.command("rebuild-search-index")
+def rebuild_search_index_command():
+    """Recria o índice FTS5 de registros a partir das tabelas."""
+    ensure_schema()
+    if not app_module.SEARCH_FTS:
+        raise click.ClickException("FTS5 não disponível neste SQLite.")
+    with closing(get_db()) as db:
+        with db:
+            rebuild_search_index(db)
+        n = db.execute("SELECT COUNT(*) FROM records_fts").fetchone()[0]
+    click.echo(f"Índice de busca recriado: {n} registros.")
@@ -0,0 +1,180 @@
+
+"""Profiler de SQL opcional (SQL_PROFILE=1 ou ligado em /admin/sql-profile).
+
+Agrupa as queries por fingerprint normalizado (literais viram ?), soma chamadas,
+tempo total/máximo e linhas devolvidas, e guarda o EXPLAIN QUERY PLAN de cada
+fingerprint que passar de SQL_SLOW_MS ou que faça SCAN de tabela.
+Funciona em cima das conexões instrumentadas de metrics.py.
+
+"Zerar" vale para todos os workers: grava o horário em
+DATA_DIR/sqlprofile/RESET, e cada worker descarta o que acumulou antes dele na
+próxima gravação do seu snapshot.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+SLOW_MS = float(os.environ.get("SQL_SLOW_MS", "100"))
+MAX_FINGERPRINTS = 2000
+_EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT", "REPLACE")
+
+_re_string = re.compile(r"'(?:[^']|'')*'")
+_re_number = re.compile(r"\b\d+(?:\.\d+)?\b")
+_re_in_list = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_re_or_chain = re.compile(r"(\b[\w.]+\s*=\s*\?)(?:\s+OR\s+\1)+", re.IGNORECASE)
+_re_space = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    fp = _re_string.sub("?", sql)
+    fp = _re_number.sub("?", fp)
+    fp = _re_space.sub(" ", fp).strip()
+    fp = _re_in_list.sub("(?+)", fp)
+    fp = _re_or_chain.sub(r"\1 OR ...", fp)
+    return fp
+
+
+class Profiler:
+    def __init__(self, snapshot_dir):
+        self.enabled = os.environ.get("SQL_PROFILE", "0") == "1"
+        self.snapshot_dir = snapshot_dir
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.last_flush = 0.0
+        self.reset_seen = time.time()
+
+    def _entry(self, fp):
+        st = self.stats.get(fp)
+        if st is None:
+            if len(self.stats) >= MAX_FINGERPRINTS:
+                return None
+            st = self.stats[fp] = {
+                "sql": fp, "calls": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "rows": 0, "plan": None, "scan": False, "slow": False, "explained": False,
+            }
+        return st
+
+    def observe(self, cursor, sql, params, elapsed):
+        fp = fingerprint(sql)
+        ms = elapsed * 1000
+        with self.lock:
+            st = self._entry(fp)
+            if st is None:
+                return None
+            st["calls"] += 1
+            st["total_ms"] += ms
+            st["max_ms"] = max(st["max_ms"], ms)
+            slow_now = ms >= SLOW_MS and not st["slow"]
+            explain = not st["explained"] or slow_now
+            st["explained"] = True
+            if slow_now:
+                st["slow"] = True
+        if explain and sql.lstrip().upper().startswith(_EXPLAINABLE):
+            plan = self._explain(cursor.connection, sql, params)
+            with self.lock:
+                st["plan"] = plan
+                st["scan"] = any(d.startswith("SCAN") and "CONSTANT ROW" not in d for d in plan)
+        if time.monotonic() - self.last_flush > 5:
+            self.flush()
+        return fp
+
+    def add_rows(self, fp, n):
+        with self.lock:
+            st = self.stats.get(fp)
+            if st is not None:
+                st["rows"] += n
+
+    @staticmethod
+    def _explain(conn, sql, params):
+        try:
+            # Cursor base (não instrumentado) para não entrar em recursão
+            cur = conn.cursor(sqlite3.Cursor)
+            return [row[3] for row in cur.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+        except sqlite3.Error as e:
+            return [f"explain failed: {e}"]
+
+    def _reset_epoch(self):
+        try:
+            return os.path.getmtime(os.path.join(self.snapshot_dir, "RESET"))
+        except OSError:
+            return 0.0
+
+    def reset(self):
+        """Zera as estatísticas de todos os workers."""
+        now = time.time()
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            with open(os.path.join(self.snapshot_dir, "RESET"), "w") as f:
+                f.write(str(now))
+            os.utime(os.path.join(self.snapshot_dir, "RESET"), (now, now))
+        except OSError:
+            pass
+        with self.lock:
+            self.stats.clear()
+            self.reset_seen = now
+        self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            path = os.path.join(self.snapshot_dir, f"{os.getpid()}.json")
+            epoch = self._reset_epoch()
+            with self.lock:
+                if epoch > self.reset_seen:
+                    # Outro worker zerou: o que foi acumulado até aqui é descartado
+                    self.stats.clear()
+                    self.reset_seen = epoch
+                data = json.dumps(list(self.stats.values()))
+            with open(path + ".tmp", "w") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            pass
+
+    def report(self, order="total_ms"):
+        """Estatísticas somadas de todos os workers, ordenadas por `order` (desc)."""
+        with self.lock:
+            merged = {fp: dict(st) for fp, st in self.stats.items()}
+        me = f"{os.getpid()}.json"
+        epoch = self._reset_epoch()
+        try:
+            for name in os.listdir(self.snapshot_dir):
+                if name == me or not name.endswith(".json"):
+                    continue
+                if os.path.getmtime(os.path.join(self.snapshot_dir, name)) < epoch:
+                    continue  # snapshot de antes do último "zerar"
+                with open(os.path.join(self.snapshot_dir, name)) as f:
+                    for st in json.load(f):
+                        acc = merged.get(st["sql"])
+                        if acc is None:
+                            merged[st["sql"]] = st
+                            continue
+                        acc["calls"] += st["calls"]
+                        acc["total_ms"] += st["total_ms"]
+                        acc["rows"] += st["rows"]
+                        acc["max_ms"] = max(acc["max_ms"], st["max_ms"])
+                        acc["scan"] = acc["scan"] or st["scan"]
+                        acc["slow"] = acc["slow"] or st["slow"]
+                        acc["plan"] = acc["plan"] or st["plan"]
+        except (OSError, ValueError):
+            pass
+        rows = list(merged.values())
+        for st in rows:
+            st["avg_ms"] = st["total_ms"] / st["calls"] if st["calls"] else 0.0
+            st.pop("explained", None)
+        rows.sort(key=lambda st: st.get(order, 0), reverse=True)
+        return rows
+
+
+profiler = None
+
+
+def init_app(app, data_dir):
+    global profiler
+    profiler = Profiler(os.path.join(data_dir, "sqlprofile"))
+    app.extensions["sqlprofile"] = profiler
+    return profiler
@@ -0,0 +1,94 @@
+// Cliente do upload em pedaços (/api/uploads): envia o arquivo em fatias de
+// tamanho fixo, retoma do offset informado pelo servidor e confere o SHA-256 no fim.
+(function (root) {
+  async function sha256Hex(file) {
+    if (!(root.crypto && root.crypto.subtle) || file.size > 512 * 1024 * 1024) return null;
+    const digest = await root.crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+  }
+
+  async function json(res) {
+    const data = await res.json().catch(() => ({}));
+    if (!res.ok && res.status !== 409) throw new Error(data.error || ('HTTP ' + res.status));
+    return data;
+  }
+
+  function storageKey(target, file) {
+    return 'splice-upload:' + target + ':' + file.name + ':' + file.size + ':' + file.lastModified;
+  }
+
+  // opts: {target, title?, record_id?, onProgress?(sent, total)}
+  async function upload(file, opts) {
+    const key = storageKey(opts.target, file);
+    const sha256 = await sha256Hex(file);
+    let state = null;
+    const saved = root.localStorage && localStorage.getItem(key);
+    if (saved) {
+      const res = await fetch('/api/uploads/' + saved, { credentials: 'same-origin' });
+      if (res.ok) state = await res.json();
+    }
+    if (!state || state.complete) {
+      state = await json(await fetch('/api/uploads', {
+        method: 'POST',
+        credentials: 'same-origin',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ target: opts.target, filename: file.name, size: file.size, sha256,
+                               title: opts.title, record_id: opts.record_id }),
+      }));
+      if (root.localStorage) localStorage.setItem(key, state.upload_id);
+    }
+    let offset = state.offset;
+    let failures = 0;
+    while (offset < file.size) {
+      const end = Math.min(offset + state.chunk_size, file.size);
+      try {
+        const res = await fetch('/api/uploads/' + state.upload_id + '?offset=' + offset, {
+          method: 'PUT', credentials: 'same-origin', body: file.slice(offset, end),
+        });
+        const data = await json(res);
+        offset = data.offset;
+        failures = 0;
+      } catch (e) {
+        if (++failures > 5) throw e;
+        await new Promise(r => setTimeout(r, 1000 * failures));
+        const res = await fetch('/api/uploads/' + state.upload_id, { credentials: 'same-origin' });
+        if (res.ok) offset = (await res.json()).offset;
+      }
+      if (opts.onProgress) opts.onProgress(offset, file.size);
+    }
+    const done = await fetch('/api/uploads/' + state.upload_id + '/complete', {
+      method: 'POST', credentials: 'same-origin',
+      headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ sha256 }),
+    });
+    const result = await done.json().catch(() => ({}));
+    if (!done.ok) throw new Error(result.error || ('HTTP ' + done.status));
+    if (root.localStorage) localStorage.removeItem(key);
+    return result;
+  }
+
+  // Liga um <form> com <input type=file> ao upload em pedaços; sem JS o POST normal continua valendo.
+  function attach(form, opts) {
+    form.addEventListener('submit', async ev => {
+      const input = form.querySelector('input[type=file]');
+      const file = input && input.files[0];
+      if (!file || !root.fetch) return;
+      ev.preventDefault();
+      const progress = form.querySelector('progress');
+      const button = form.querySelector('button[type=submit], button:not([type])');
+      if (button) button.disabled = true;
+      if (progress) progress.style.display = '';
+      try {
+        const extra = opts.fields ? opts.fields(form) : {};
+        await upload(file, Object.assign({ target: opts.target, onProgress: (s, t) => {
+          if (progress) { progress.max = t; progress.value = s; }
+        } }, extra));
+        window.location.reload();
+      } catch (e) {
+        if (typeof showToast === 'function') showToast('Falha no envio: ' + e.message + ' (tente de novo para retomar)', 'danger');
+        if (button) button.disabled = false;
+      }
+    });
+  }
+
+  root.ChunkedUpload = { upload, attach };
+})(window);
@@ -0,0 +1,125 @@
+// Fila offline de registros (IndexedDB), usada pela página /new e pelo service worker.
+// Cada registro e cada foto levam um client_id (chave de idempotência): reenvios
+// após falha de rede nunca duplicam dados no servidor.
+(function (root) {
+  const DB_NAME = 'splice-offline';
+  const STORE = 'queue';
+  const BATCH = 50;
+  const PERMANENT = [400, 404, 410, 413, 415, 422];
+  let running = null;
+
+  function openDb() {
+    return new Promise((resolve, reject) => {
+      const req = indexedDB.open(DB_NAME, 1);
+      req.onupgradeneeded = () => req.result.createObjectStore(STORE, { keyPath: 'client_id' });
+      req.onsuccess = () => resolve(req.result);
+      req.onerror = () => reject(req.error);
+    });
+  }
+
+  function withStore(mode, fn) {
+    return openDb().then(db => new Promise((resolve, reject) => {
+      const tx = db.transaction(STORE, mode);
+      const req = fn(tx.objectStore(STORE));
+      tx.oncomplete = () => resolve(req ? req.result : undefined);
+      tx.onerror = () => reject(tx.error);
+    }));
+  }
+
+  function uuid() {
+    if (root.crypto && root.crypto.randomUUID) return root.crypto.randomUUID();
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+  }
+
+  const all = () => withStore('readonly', s => s.getAll());
+  const save = item => withStore('readwrite', s => s.put(item));
+  const drop = id => withStore('readwrite', s => s.delete(id));
+
+  function enqueue(fields, files) {
+    const item = {
+      client_id: uuid(),
+      device_name: fields.device_name,
+      fusion_count: fields.fusion_count,
+      work_map_id: fields.work_map_id,
+      created_at: new Date().toISOString().slice(0, 19).replace('T', ' '),
+      record_id: null,
+      error: null,
+      photos: Array.from(files || []).map(f => ({ client_id: uuid(), name: f.name, blob: f, done: false })),
+    };
+    return save(item).then(() => item);
+  }
+
+  async function pushRecords(items) {
+    for (let i = 0; i < items.length; i += BATCH) {
+      const batch = items.slice(i, i + BATCH);
+      const res = await fetch('/api/sync/records', {
+        method: 'POST',
+        credentials: 'same-origin',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ records: batch.map(r => ({
+          client_id: r.client_id, device_name: r.device_name, fusion_count: r.fusion_count,
+          work_map_id: r.work_map_id, created_at: r.created_at,
+        })) }),
+      });
+      if (!res.ok || res.redirected) throw new Error('sync ' + res.status);
+      const data = await res.json();
+      for (const r of data.results) {
+        const item = batch.find(b => b.client_id === r.client_id);
+        if (!item) continue;
+        if (r.record_id) item.record_id = r.record_id;
+        else item.error = r.error || 'erro';
+        await save(item);
+      }
+    }
+  }
+
+  async function pushPhotos(item) {
+    for (const p of item.photos) {
+      if (p.done) continue;
+      const fd = new FormData();
+      fd.append('photo', p.blob, p.name);
+      const res = await fetch(`/api/sync/records/${item.record_id}/photos`, {
+        method: 'POST',
+        credentials: 'same-origin',
+        headers: { 'Idempotency-Key': p.client_id },
+        body: fd,
+      });
+      // Redirecionado = sessão expirou (login): tenta de novo depois, como pushRecords
+      if (res.redirected) throw new Error('foto ' + res.status);
+      if (res.ok || res.status === 409) {
+        p.done = true;
+      } else if (PERMANENT.includes(res.status)) {
+        // 4xx definitivos (registro sumiu, tamanho, tipo): reenviar não adianta, segue para a próxima
+        p.done = true;
+        p.error = res.status;
+      } else {
+        throw new Error('foto ' + res.status);
+      }
+      await save(item);
+    }
+    const failed = item.photos.filter(p => p.error);
+    if (failed.length) {
+      item.error = failed.length + ' foto(s) recusada(s): ' + failed.map(p => p.name + ' (' + p.error + ')').join(', ');
+      await save(item);
+    } else {
+      await drop(item.client_id);
+    }
+  }
+
+  async function run() {
+    const items = await all();
+    await pushRecords(items.filter(i => !i.record_id && !i.error));
+    for (const item of await all()) {
+      if (item.record_id && !item.error) await pushPhotos(item);
+    }
+    return (await all()).filter(i => !i.error).length;
+  }
+
+  // Devolve quantos itens continuam pendentes; chamadas concorrentes compartilham a mesma execução
+  function flush() {
+    if (!running) running = run().finally(() => { running = null; });
+    return running;
+  }
+
+  root.SpliceQueue = { enqueue, flush, all, drop };
+})(self);
@@ -0,0 +1,46 @@
+// Service worker do formulário de registro: mantém /new disponível offline
+// e envia a fila (offline-queue.js) quando a conexão volta.
+importScripts('/static/offline-queue.js');
+
+const CACHE = 'splice-shell-v2';
+const SHELL = ['/new', '/static/style.css', '/static/offline-queue.js'];
+
+self.addEventListener('install', event => {
+  event.waitUntil(caches.open(CACHE).then(cache =>
+    Promise.all(SHELL.map(url => cache.add(url).catch(() => null)))
+  ).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', event => {
+  event.waitUntil(caches.keys().then(keys =>
+    Promise.all(keys.filter(k => k !== CACHE).map(k => caches.delete(k)))
+  ).then(() => self.clients.claim()));
+});
+
+self.addEventListener('fetch', event => {
+  const req = event.request;
+  if (req.method !== 'GET') return;
+  const url = new URL(req.url);
+  if (url.origin !== self.location.origin) return;
+  if (req.mode === 'navigate' && url.pathname === '/new') {
+    // Rede primeiro (mapas atualizados); cache só sem sinal
+    event.respondWith(fetch(req).then(res => {
+      if (res.ok && !res.redirected) caches.open(CACHE).then(c => c.put('/new', res.clone()));
+      return res;
+    }).catch(() => caches.match('/new')));
+  } else if (url.pathname.startsWith('/static/')) {
+    // URLs com ?v=<hash> são imutáveis: guarda pela URL completa e, sem rede,
+    // aceita qualquer versão já guardada do mesmo arquivo
+    event.respondWith(caches.match(req).then(hit => hit || fetch(req).then(res => {
+      if (res.ok && url.searchParams.has('v')) {
+        const copy = res.clone();
+        caches.open(CACHE).then(c => c.put(req, copy));
+      }
+      return res;
+    }).catch(() => caches.match(req, {ignoreSearch: true}))));
+  }
+});
+
+self.addEventListener('sync', event => {
+  if (event.tag === 'splice-sync') event.waitUntil(self.SpliceQueue.flush());
+});
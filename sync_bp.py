@@ -0,0 +1,149 @@
+
+from flask import Blueprint, current_app, request, session, jsonify, send_from_directory
+from werkzeug.utils import secure_filename
+from contextlib import closing
+from datetime import datetime
+import os
+import sqlite3
+
+from app import (
+    get_db, login_required, get_user_accessible_maps,
+    UPLOAD_FOLDER, ALLOWED_EXTENSIONS, MAX_FILES_PER_RECORD,
+)
+from devices import device_id
+import live
+
+sync_bp = Blueprint("sync_bp", __name__)
+
+MAX_SYNC_BATCH = 200
+
+
+def _client_ts(value):
+    # Horário de criação no aparelho (UTC); inválido => horário do servidor
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("T", " ").replace("Z", "")).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+
+
+def _lookup_key(db, user_id, key):
+    return db.execute(
+        "SELECT kind, target_id FROM sync_keys WHERE user_id=? AND key=?", (user_id, key)
+    ).fetchone()
+
+
+def _remember_key(db, user_id, key, kind, target_id):
+    db.execute(
+        "INSERT INTO sync_keys (user_id, key, kind, target_id) VALUES (?, ?, ?, ?)",
+        (user_id, key, kind, target_id),
+    )
+
+
+@sync_bp.route("/api/sync/records", methods=["POST"])
+@login_required
+def sync_records():
+    """Recebe um lote de registros criados offline.
+
+    Corpo: {"records": [{"client_id", "device_name", "fusion_count", "work_map_id", "created_at"?}]}
+    Cada `client_id` é a chave de idempotência: reenviar o mesmo lote devolve os
+    mesmos ids com status "duplicate" em vez de criar registros repetidos.
+    """
+    payload = request.get_json(silent=True) or {}
+    items = payload.get("records")
+    if not isinstance(items, list):
+        return jsonify({"error": "records deve ser uma lista"}), 400
+    if len(items) > MAX_SYNC_BATCH:
+        return jsonify({"error": f"máximo de {MAX_SYNC_BATCH} registros por lote"}), 413
+
+    user_id = session["user_id"]
+    is_admin = bool(session.get("is_admin"))
+    allowed_maps = {m["id"] for m in get_user_accessible_maps(user_id)}
+    results = []
+    with closing(get_db()) as db:
+        with db:
+            for item in items:
+                item = item if isinstance(item, dict) else {}
+                key = str(item.get("client_id") or "").strip()
+                device_name = str(item.get("device_name") or "").strip()
+                fusion_count = str(item.get("fusion_count", "")).strip()
+                work_map_id = item.get("work_map_id")
+                if not key:
+                    results.append({"client_id": key, "status": "error", "error": "client_id obrigatório"})
+                    continue
+                seen = _lookup_key(db, user_id, key)
+                if seen:
+                    results.append({"client_id": key, "status": "duplicate", "record_id": seen["target_id"]})
+                    continue
+                if not device_name or not fusion_count.isdigit():
+                    results.append({"client_id": key, "status": "error", "error": "dispositivo ou nº de fusões inválido"})
+                    continue
+                try:
+                    work_map_id = int(work_map_id)
+                except (TypeError, ValueError):
+                    results.append({"client_id": key, "status": "error", "error": "mapa de trabalho obrigatório"})
+                    continue
+                if not is_admin and work_map_id not in allowed_maps:
+                    results.append({"client_id": key, "status": "error", "error": "sem acesso ao mapa de trabalho"})
+                    continue
+                cur = db.execute(
+                    "INSERT INTO records (user_id, device_name, device_id, fusion_count, created_at, status, work_map_id) "
+                    "VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), 'draft', ?)",
+                    (user_id, device_name, device_id(db, device_name), int(fusion_count),
+                     _client_ts(item.get("created_at")), work_map_id),
+                )
+                _remember_key(db, user_id, key, "record", cur.lastrowid)
+                live.publish_record(db, "record", cur.lastrowid)
+                results.append({"client_id": key, "status": "created", "record_id": cur.lastrowid})
+    return jsonify({"results": results})
+
+
+@sync_bp.route("/api/sync/records/<int:record_id>/photos", methods=["POST"])
+@login_required
+def sync_photo(record_id):
+    """Envia UMA foto por requisição, com chave em `Idempotency-Key`.
+
+    Falhas de rede custam no máximo uma foto; reenvios da mesma chave não duplicam.
+    """
+    user_id = session["user_id"]
+    key = (request.headers.get("Idempotency-Key") or request.form.get("client_id") or "").strip()
+    if not key:
+        return jsonify({"error": "Idempotency-Key obrigatório"}), 400
+    with closing(get_db()) as db:
+        seen = _lookup_key(db, user_id, key)
+        if seen:
+            return jsonify({"status": "duplicate", "photo_id": seen["target_id"]})
+        rec = db.execute("SELECT id FROM records WHERE id=? AND user_id=?", (record_id, user_id)).fetchone()
+        if not rec:
+            return jsonify({"error": "registro não encontrado"}), 404
+        count = db.execute("SELECT COUNT(1) FROM photos WHERE record_id=?", (record_id,)).fetchone()[0]
+        if count >= MAX_FILES_PER_RECORD:
+            return jsonify({"error": f"máximo de {MAX_FILES_PER_RECORD} fotos por registro"}), 409
+        f = request.files.get("photo")
+        if not f or not f.filename:
+            return jsonify({"error": "arquivo ausente"}), 400
+        ext = f.filename.rsplit(".", 1)[-1].lower() if "." in f.filename else ""
+        if ext not in ALLOWED_EXTENSIONS:
+            return jsonify({"error": "tipo de arquivo não permitido"}), 415
+        safe = secure_filename(f"{record_id}_{key[:12]}_{f.filename}")
+        f.save(os.path.join(UPLOAD_FOLDER, safe))
+        try:
+            with db:
+                cur = db.execute("INSERT INTO photos (record_id, filename) VALUES (?, ?)", (record_id, safe))
+                _remember_key(db, user_id, key, "photo", cur.lastrowid)
+                live.publish_photo(db, record_id)
+        except sqlite3.IntegrityError:
+            # Outra tentativa com a mesma chave venceu a corrida
+            seen = _lookup_key(db, user_id, key)
+            return jsonify({"status": "duplicate", "photo_id": seen["target_id"] if seen else None})
+    return jsonify({"status": "created", "photo_id": cur.lastrowid}), 201
+
+
+@sync_bp.route("/sw.js")
+def service_worker():
+    # Servido na raiz para que o escopo do service worker cubra /new
+    resp = send_from_directory(current_app.static_folder, "sw.js", mimetype="application/javascript")
+    resp.headers["Service-Worker-Allowed"] = "/"
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
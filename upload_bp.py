@@ -0,0 +1,244 @@
+
+from flask import Blueprint, current_app, request, session, jsonify
+from werkzeug.utils import secure_filename
+from contextlib import closing
+import hashlib
+import os
+import time
+import uuid
+
+from app import (
+    get_db, login_required, UPLOAD_FOLDER, WORKMAP_FOLDER,
+    ALLOWED_EXTENSIONS, MAX_FILES_PER_RECORD,
+)
+from backup_bp import get_backup_dir, ALLOWED_DB_EXT, ALLOWED_ZIP_EXT
+import live
+
+upload_bp = Blueprint("upload_bp", __name__, url_prefix="/api/uploads")
+
+CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_MB", "8")) * 1024 * 1024
+STALE_SESSION_SECONDS = 24 * 3600
+_COPY_BUF = 1024 * 1024
+
+
+def _target_spec(target, filename):
+    """Pasta de destino e validação de extensão por tipo de upload."""
+    ext = os.path.splitext(filename.lower())[1]
+    if target == "backup":
+        ok = ext in (ALLOWED_DB_EXT | ALLOWED_ZIP_EXT)
+        return get_backup_dir(), f"{time.strftime('%Y%m%d-%H%M%S')}__{filename}", ok, True
+    if target == "workmap":
+        return WORKMAP_FOLDER, filename, ext == ".pdf", True
+    if target == "photo":
+        return UPLOAD_FOLDER, filename, ext.lstrip(".") in ALLOWED_EXTENSIONS, False
+    return None, None, False, False
+
+
+def _purge_stale(db):
+    cutoff = time.time() - STALE_SESSION_SECONDS
+    for row in db.execute(
+        "SELECT id, final_path FROM upload_sessions WHERE completed_at IS NULL AND started_at < ?", (cutoff,)
+    ).fetchall():
+        try:
+            os.remove(row["final_path"] + ".part")
+        except OSError:
+            pass
+        db.execute("DELETE FROM upload_sessions WHERE id=?", (row["id"],))
+
+
+def _get_session(db, upload_id):
+    return db.execute(
+        "SELECT * FROM upload_sessions WHERE id=? AND user_id=?", (upload_id, session["user_id"])
+    ).fetchone()
+
+
+def _state(row):
+    return {
+        "upload_id": row["id"],
+        "offset": row["received"],
+        "size": row["total_size"],
+        "chunk_size": CHUNK_SIZE,
+        "complete": row["completed_at"] is not None,
+    }
+
+
+@upload_bp.route("", methods=["POST"])
+@login_required
+def create_upload():
+    """Abre uma sessão de upload.
+
+    Corpo JSON: {"target": "backup"|"workmap"|"photo", "filename", "size", "sha256"?,
+    "title"? (workmap), "record_id"? (photo)}. Os pedaços vão direto para
+    `<destino>.part`; nada é mantido em memória entre requisições.
+    """
+    data = request.get_json(silent=True) or {}
+    target = data.get("target")
+    filename = secure_filename(str(data.get("filename") or ""))
+    try:
+        size = int(data.get("size"))
+    except (TypeError, ValueError):
+        size = -1
+    if not filename or size < 0:
+        return jsonify({"error": "filename e size são obrigatórios"}), 400
+    folder, final_name, ext_ok, admin_only = _target_spec(target, filename)
+    if folder is None:
+        return jsonify({"error": "target inválido"}), 400
+    if not ext_ok:
+        return jsonify({"error": "extensão não permitida"}), 415
+    if admin_only and not session.get("is_admin"):
+        return jsonify({"error": "restrito ao administrador"}), 403
+
+    record_id = data.get("record_id")
+    with closing(get_db()) as db:
+        if target == "photo":
+            rec = db.execute(
+                "SELECT id FROM records WHERE id=? AND user_id=?", (record_id, session["user_id"])
+            ).fetchone()
+            if not rec:
+                return jsonify({"error": "registro não encontrado"}), 404
+            final_name = secure_filename(f"{rec['id']}_{uuid.uuid4().hex[:8]}_{filename}")
+        upload_id = uuid.uuid4().hex
+        final_path = os.path.join(folder, final_name)
+        os.makedirs(folder, exist_ok=True)
+        open(final_path + ".part", "wb").close()
+        with db:
+            _purge_stale(db)
+            db.execute(
+                "INSERT INTO upload_sessions (id, user_id, target, filename, final_path, total_size, received, sha256, title, record_id, started_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?, ?, ?)",
+                (upload_id, session["user_id"], target, final_name, final_path, size,
+                 (data.get("sha256") or "").lower() or None, data.get("title"), record_id, time.time()),
+            )
+        row = _get_session(db, upload_id)
+    return jsonify(_state(row)), 201
+
+
+@upload_bp.route("/<upload_id>", methods=["GET", "HEAD"])
+@login_required
+def upload_status(upload_id):
+    """Consulta de offset para retomar um upload interrompido."""
+    with closing(get_db()) as db:
+        row = _get_session(db, upload_id)
+    if not row:
+        return jsonify({"error": "sessão não encontrada"}), 404
+    resp = jsonify(_state(row))
+    resp.headers["Upload-Offset"] = str(row["received"])
+    return resp
+
+
+@upload_bp.route("/<upload_id>", methods=["PUT", "PATCH"])
+@login_required
+def upload_chunk(upload_id):
+    """Grava um pedaço em `?offset=N` (ou header Upload-Offset), lendo o corpo em streaming.
+
+    Só é aceito offset <= bytes já recebidos, então reenviar o último pedaço é seguro.
+    """
+    offset = request.args.get("offset", type=int)
+    if offset is None:
+        offset = request.headers.get("Upload-Offset", type=int)
+    with closing(get_db()) as db:
+        row = _get_session(db, upload_id)
+        if not row:
+            return jsonify({"error": "sessão não encontrada"}), 404
+        if row["completed_at"] is not None:
+            return jsonify(_state(row)), 409
+        if offset is None or offset < 0 or offset > row["received"]:
+            resp = jsonify({"error": "offset inválido", "offset": row["received"]})
+            resp.headers["Upload-Offset"] = str(row["received"])
+            return resp, 409
+        # Sem Content-Length (chunked) o limite vale para o que for lido do corpo
+        limit = min(CHUNK_SIZE, row["total_size"] - offset)
+        if (request.content_length or 0) > limit:
+            return jsonify({"error": "pedaço maior que o permitido"}), 413
+        written = 0
+        with open(row["final_path"] + ".part", "r+b") as f:
+            f.seek(offset)
+            while written < limit:
+                buf = request.stream.read(min(_COPY_BUF, limit - written))
+                if not buf:
+                    break
+                f.write(buf)
+                written += len(buf)
+        if request.stream.read(1):
+            # `received` não avança: o que foi gravado além dele será sobrescrito
+            return jsonify({"error": "pedaço maior que o permitido"}), 413
+        received = max(row["received"], offset + written)
+        with db:
+            db.execute("UPDATE upload_sessions SET received=? WHERE id=?", (received, upload_id))
+        row = _get_session(db, upload_id)
+    resp = jsonify(_state(row))
+    resp.headers["Upload-Offset"] = str(received)
+    return resp
+
+
+def _sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for buf in iter(lambda: f.read(_COPY_BUF), b""):
+            h.update(buf)
+    return h.hexdigest()
+
+
+@upload_bp.route("/<upload_id>/complete", methods=["POST"])
+@login_required
+def complete_upload(upload_id):
+    """Confere tamanho e SHA-256, publica o arquivo e registra no banco conforme o target."""
+    with closing(get_db()) as db:
+        row = _get_session(db, upload_id)
+        if not row:
+            return jsonify({"error": "sessão não encontrada"}), 404
+        if row["completed_at"] is not None:
+            return jsonify(_state(row))
+        part = row["final_path"] + ".part"
+        if row["received"] != row["total_size"] or os.path.getsize(part) != row["total_size"]:
+            return jsonify({"error": "upload incompleto", "offset": row["received"]}), 409
+        expected = ((request.get_json(silent=True) or {}).get("sha256") or row["sha256"] or "").lower()
+        digest = _sha256_file(part)
+        if expected and digest != expected:
+            # Arquivo corrompido: recomeça do zero
+            open(part, "wb").close()
+            with db:
+                db.execute("UPDATE upload_sessions SET received=0 WHERE id=?", (upload_id,))
+            return jsonify({"error": "checksum não confere", "sha256": digest, "offset": 0}), 422
+
+        result = {"filename": row["filename"], "sha256": digest}
+        with db:
+            if row["target"] == "photo":
+                count = db.execute("SELECT COUNT(1) FROM photos WHERE record_id=?", (row["record_id"],)).fetchone()[0]
+                if count >= MAX_FILES_PER_RECORD:
+                    os.remove(part)
+                    db.execute("DELETE FROM upload_sessions WHERE id=?", (upload_id,))
+                    return jsonify({"error": f"máximo de {MAX_FILES_PER_RECORD} fotos por registro"}), 409
+                os.replace(part, row["final_path"])
+                cur = db.execute("INSERT INTO photos (record_id, filename) VALUES (?, ?)", (row["record_id"], row["filename"]))
+                result["photo_id"] = cur.lastrowid
+                live.publish_photo(db, row["record_id"])
+            elif row["target"] == "workmap":
+                os.replace(part, row["final_path"])
+                cur = db.execute(
+                    "INSERT INTO work_maps (title, filename) VALUES (?, ?)",
+                    (row["title"] or "Mapa de Trabalho", row["filename"]),
+                )
+                result["work_map_id"] = cur.lastrowid
+            else:
+                os.replace(part, row["final_path"])
+            db.execute("UPDATE upload_sessions SET completed_at=?, sha256=? WHERE id=?", (time.time(), digest, upload_id))
+    current_app.logger.info("Upload %s concluído: %s (%s bytes)", upload_id, row["filename"], row["total_size"])
+    return jsonify(result)
+
+
+@upload_bp.route("/<upload_id>", methods=["DELETE"])
+@login_required
+def abort_upload(upload_id):
+    with closing(get_db()) as db:
+        row = _get_session(db, upload_id)
+        if not row:
+            return jsonify({"error": "sessão não encontrada"}), 404
+        if row["completed_at"] is None:
+            try:
+                os.remove(row["final_path"] + ".part")
+            except OSError:
+                pass
+        with db:
+            db.execute("DELETE FROM upload_sessions WHERE id=?", (upload_id,))
+    return "", 204